@@ -1,9 +1,25 @@
+import time
+STARTED = time.perf_counter()   # the startup report (StartupTimer) counts from here
 import tkinter as tk
 from tkinter import messagebox, ttk, filedialog
-import pyodbc
-import csv
+import bisect
+import copy
 import datetime
-import unittest
+import functools
+import json
+import os
+import queue
+import sqlite3
+import sys
+import threading
+from array import array
+from collections import Counter, defaultdict, deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+# csv, re, hashlib, uuid and urllib.parse are imported where they are used and
+# asyncio on first use (see _DeferredModule); the tests live in
+# test_school_management.py. The desktop app starts without the API's, the
+# importers' and the tests' modules.
 
 CONN_STR = (
     r"Driver={ODBC Driver 17 for SQL Server};"
@@ -13,68 +29,1329 @@ CONN_STR = (
 )
 
 
-def get_connection():
-    return pyodbc.connect(CONN_STR, autocommit=True)
+class _DeferredModule:
+    # stands in for a module until its first attribute lookup, which imports it
+    # and rebinds the global name to the real module
+    def __init__(self, name):
+        self._name = name
 
-def setup_database():
-    conn = get_connection()
-    c = conn.cursor()
-
-    # Students
-    c.execute("""
-    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='students' AND xtype='U')
-    CREATE TABLE students(
-        id INT IDENTITY PRIMARY KEY,
-        name VARCHAR(100),
-        age INT,
-        grade VARCHAR(10)
-    )
-    """)
-
-    c.execute("""
-    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='teachers' AND xtype='U')
-    CREATE TABLE teachers(
-        id INT IDENTITY PRIMARY KEY,
-        name VARCHAR(100),
-        subject VARCHAR(100)
+    def __getattr__(self, attr):
+        import importlib
+        module = importlib.import_module(self._name)
+        globals()[self._name] = module
+        return getattr(module, attr)
+
+
+asyncio = _DeferredModule("asyncio")
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+class PooledConnection:
+    # Thin proxy handed out by ConnectionPool. close() gives the underlying
+    # connection back to the pool instead of closing it.
+    def __init__(self, pool, conn):
+        self._pool = pool
+        self._conn = conn
+        self._saved_autocommit = None
+        self.in_transaction = False
+
+    def __getattr__(self, name):
+        if self._conn is None:
+            raise RuntimeError("connection already returned to the pool")
+        return getattr(self._conn, name)
+
+    def begin(self):
+        # pool connections run in autocommit mode; switch it off until commit/rollback
+        if self._pool.begin is not None:
+            self._saved_autocommit = None
+            self._pool.begin(self._conn)
+            self.in_transaction = True
+            return
+        try:
+            self._saved_autocommit = self._conn.autocommit
+            self._conn.autocommit = False
+        except AttributeError:
+            # sqlite3 before Python 3.12 has no autocommit attribute
+            self._saved_autocommit = None
+            self._conn.execute("BEGIN")
+        self.in_transaction = True
+
+    def commit(self):
+        self._conn.commit()
+        self._end_transaction()
+
+    def rollback(self):
+        try:
+            self._conn.rollback()
+        finally:
+            self._end_transaction()
+
+    def _end_transaction(self):
+        if self.in_transaction:
+            self.in_transaction = False
+            if self._saved_autocommit is not None:
+                self._conn.autocommit = self._saved_autocommit
+
+    def close(self):
+        if self._conn is not None:
+            if self.in_transaction:
+                try:
+                    self.rollback()
+                except Exception:
+                    self.discard()
+                    return
+            conn, self._conn = self._conn, None
+            self._pool.release(conn)
+
+    def discard(self):
+        # drop a connection that is known to be broken
+        if self._conn is not None:
+            conn, self._conn = self._conn, None
+            self._pool.release(conn, broken=True)
+
+
+class ConnectionPool:
+    """Thread-safe bounded pool of DB-API connections.
+
+    factory is any zero-argument callable returning a new connection, so the
+    pool can be pointed at pyodbc, sqlite3 or a fake for benchmarking. begin,
+    if given, opens a transaction on a raw connection (see Backend.begin).
+    """
+
+    def __init__(self, factory, min_size=0, max_size=10, idle_timeout=300.0,
+                 checkout_timeout=30.0, health_check="SELECT 1", health_check_after=1.0, begin=None):
+        if max_size < 1 or min_size < 0 or min_size > max_size:
+            raise ValueError("invalid pool size")
+        self.factory = factory
+        self.begin = begin   # optional callable(conn) that opens a transaction
+        self.min_size = min_size
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self.checkout_timeout = checkout_timeout
+        self.health_check = health_check
+        self.health_check_after = health_check_after
+        self._lock = threading.Condition()
+        self._idle = deque()   # (conn, released_at), most recently used on the right
+        self._size = 0
+        self._closed = False
+        self._stats = {
+            "checkouts": 0, "waits": 0, "wait_time": 0.0, "max_wait": 0.0,
+            "timeouts": 0, "created": 0, "discarded": 0, "expired": 0, "connect_time": 0.0,
+        }
+
+    def prefill(self):
+        while True:
+            with self._lock:
+                if self._closed or self._size >= self.min_size:
+                    return
+                self._size += 1
+            try:
+                conn = self._create()
+            except Exception:
+                with self._lock:
+                    self._size -= 1
+                    self._lock.notify()
+                raise
+            self.release(conn)
+
+    def acquire(self, timeout=None):
+        timeout = self.checkout_timeout if timeout is None else timeout
+        start = time.monotonic()
+        deadline = start + timeout
+        waited = False
+        while True:
+            conn = None
+            idle_for = 0.0
+            with self._lock:
+                if self._closed:
+                    raise RuntimeError("connection pool is closed")
+                self._expire_idle()
+                if self._idle:
+                    conn, released_at = self._idle.pop()
+                    idle_for = time.monotonic() - released_at
+                elif self._size < self.max_size:
+                    self._size += 1
+                else:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats["timeouts"] += 1
+                        raise PoolTimeout(f"no connection available within {timeout:.1f}s")
+                    waited = True
+                    self._lock.wait(remaining)
+                    continue
+
+            if conn is None:
+                try:
+                    conn = self._create()
+                except Exception:
+                    with self._lock:
+                        self._size -= 1
+                        self._lock.notify()
+                    raise
+            elif idle_for >= self.health_check_after and not self._healthy(conn):
+                self._drop(conn)
+                continue
+
+            wait = time.monotonic() - start
+            with self._lock:
+                self._stats["checkouts"] += 1
+                if waited:
+                    self._stats["waits"] += 1
+                self._stats["wait_time"] += wait
+                self._stats["max_wait"] = max(self._stats["max_wait"], wait)
+            return PooledConnection(self, conn)
+
+    def release(self, conn, broken=False):
+        if broken:
+            self._drop(conn)
+            return
+        with self._lock:
+            if not self._closed:
+                self._idle.append((conn, time.monotonic()))
+                self._lock.notify()
+                return
+            self._size -= 1
+        self._close_quietly(conn)
+
+    def close(self):
+        with self._lock:
+            self._closed = True
+            idle = [c for c, _ in self._idle]
+            self._idle.clear()
+            self._size -= len(idle)
+            self._lock.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self):
+        with self._lock:
+            data = dict(self._stats)
+            data["size"] = self._size
+            data["idle"] = len(self._idle)
+            data["in_use"] = self._size - len(self._idle)
+        data["avg_wait"] = data["wait_time"] / data["checkouts"] if data["checkouts"] else 0.0
+        data["avg_connect"] = data["connect_time"] / data["created"] if data["created"] else 0.0
+        return data
+
+    def _create(self):
+        t0 = time.perf_counter()
+        conn = self.factory()
+        with self._lock:
+            self._stats["created"] += 1
+            self._stats["connect_time"] += time.perf_counter() - t0
+        return conn
+
+    def _healthy(self, conn):
+        if not self.health_check:
+            return True
+        try:
+            c = conn.cursor()
+            c.execute(self.health_check)
+            c.fetchall()
+            return True
+        except Exception:
+            return False
+
+    def _drop(self, conn):
+        with self._lock:
+            self._size -= 1
+            self._stats["discarded"] += 1
+            self._lock.notify()
+        self._close_quietly(conn)
+
+    def _expire_idle(self):
+        # called with the lock held; oldest idle connections sit on the left
+        if self.idle_timeout is None:
+            return
+        now = time.monotonic()
+        while self._idle and self._size > self.min_size:
+            conn, released_at = self._idle[0]
+            if now - released_at < self.idle_timeout:
+                break
+            self._idle.popleft()
+            self._size -= 1
+            self._stats["expired"] += 1
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+class Backend:
+    """Storage engine behind School and setup_database.
+
+    Holds the connection factory, the schema migrations and the few pieces of
+    SQL that differ between engines (row limits, generated ids, RETURNING).
+    """
+
+    name = None
+    # schema version setup_database last saw as current; later calls skip the check
+    checked_version = None
+
+    def connect(self):
+        raise NotImplementedError
+
+    # None: PooledConnection toggles the driver's autocommit attribute
+    begin = None
+
+    def migrations(self):
+        # [(version, description, [SQL string or callable(cursor), ...])], ascending
+        raise NotImplementedError
+
+    def migrating(self, conn, active):
+        # hook around a migration run (e.g. to relax foreign key enforcement)
+        pass
+
+    def limit(self, sql, params, n):
+        # returns (sql, params) selecting at most n rows
+        raise NotImplementedError
+
+    def insert(self, c, table, columns, values):
+        # inserts one row and returns its generated id
+        raise NotImplementedError
+
+    def bump_version(self, c, table):
+        raise NotImplementedError
+
+    def used_bytes(self, c, tables):
+        # storage in use by the given tables (with their indexes), or None if unknown
+        return None
+
+    def savepoint(self, c, name):
+        c.execute(f"SAVEPOINT {name}")
+
+    def release_savepoint(self, c, name):
+        c.execute(f"RELEASE SAVEPOINT {name}")
+
+    def rollback_to_savepoint(self, c, name):
+        c.execute(f"ROLLBACK TO SAVEPOINT {name}")
+        self.release_savepoint(c, name)
+
+    def month_key(self, column):
+        # SQL for the yyyymm integer of a DATE column
+        raise NotImplementedError
+
+    def add_counts(self, c, table, keys, rows):
+        # rows of (key..., present, total): add the counts to the row with that key, creating it
+        raise NotImplementedError
+
+    def archive_table(self, table):
+        # where archived academic years of a student child table live
+        return f"{table}_archive"
+
+    def rebuild_attendance_rollups(self, c, include_archive=True):
+        # recompute attendance_monthly and attendance_daily_grade from attendance
+        # (the rollups cover archived years too; readers filter by date)
+        marks = "attendance"
+        if include_archive:
+            marks = (f"(SELECT student_id, date, present FROM attendance UNION ALL "
+                     f"SELECT student_id, date, present FROM {self.archive_table('attendance')})")
+        month = self.month_key("a.date")
+        present = "SUM(CASE WHEN a.present=1 THEN 1 ELSE 0 END)"
+        c.execute("DELETE FROM attendance_monthly")
+        c.execute(f"INSERT INTO attendance_monthly(student_id, month, present, total) "
+                  f"SELECT a.student_id, {month}, {present}, COUNT(*) "
+                  f"FROM {marks} a JOIN students s ON s.id = a.student_id GROUP BY a.student_id, {month}")
+        c.execute("DELETE FROM attendance_daily_grade")
+        c.execute(f"INSERT INTO attendance_daily_grade(grade, date, present, total) "
+                  f"SELECT COALESCE(s.grade, ''), a.date, {present}, COUNT(*) "
+                  f"FROM {marks} a JOIN students s ON s.id = a.student_id GROUP BY COALESCE(s.grade, ''), a.date")
+
+    def select_many(self, c, queries):
+        # [(sql, params), ...] -> [rows, ...]; an embedded database has no round trip to save
+        results = []
+        for sql, params in queries:
+            c.execute(sql, params)
+            results.append(c.fetchall())
+        return results
+
+
+class SqlServerBackend(Backend):
+    name = "mssql"
+
+    def __init__(self, conn_str=CONN_STR):
+        self.conn_str = conn_str
+
+    def connect(self):
+        import pyodbc
+        return pyodbc.connect(self.conn_str, autocommit=True)
+
+    def limit(self, sql, params, n):
+        assert sql.startswith("SELECT ")
+        return "SELECT TOP (?) " + sql[len("SELECT "):], [int(n)] + list(params)
+
+    def insert(self, c, table, columns, values):
+        c.execute(f"INSERT INTO {table}({', '.join(columns)}) OUTPUT INSERTED.id "
+                  f"VALUES({','.join('?' * len(columns))})", values)
+        return c.fetchone()[0]
+
+    def bump_version(self, c, table):
+        c.execute("UPDATE table_versions SET version = version + 1 OUTPUT INSERTED.version WHERE name=?",
+                  (table,))
+        return c.fetchone()[0]
+
+    def savepoint(self, c, name):
+        c.execute(f"SAVE TRANSACTION {name}")
+
+    def release_savepoint(self, c, name):
+        pass   # SQL Server savepoints end with the transaction
+
+    def rollback_to_savepoint(self, c, name):
+        c.execute(f"ROLLBACK TRANSACTION {name}")
+
+    def month_key(self, column):
+        return f"(YEAR({column}) * 100 + MONTH({column}))"
+
+    def add_counts(self, c, table, keys, rows):
+        on = " AND ".join(f"t.{k} = s.{k}" for k in keys)
+        c.executemany(
+            f"MERGE {table} WITH (HOLDLOCK) AS t "
+            f"USING (SELECT {', '.join(f'? AS {k}' for k in keys)}, ? AS present, ? AS total) AS s ON {on} "
+            f"WHEN MATCHED THEN UPDATE SET present = t.present + s.present, total = t.total + s.total "
+            f"WHEN NOT MATCHED THEN INSERT ({', '.join(keys)}, present, total) "
+            f"VALUES ({', '.join(f's.{k}' for k in keys)}, s.present, s.total);", rows)
+
+    def select_many(self, c, queries):
+        # one batch to the server, read back as one result set per statement
+        c.execute("SET NOCOUNT ON; " + "; ".join(sql for sql, _ in queries),
+                  [p for _, params in queries for p in params])
+        results = [c.fetchall()]
+        while c.nextset():
+            results.append(c.fetchall())
+        return results
+
+    def used_bytes(self, c, tables):
+        try:
+            c.execute("SELECT SUM(used_page_count) * 8192 FROM sys.dm_db_partition_stats WHERE object_id IN ("
+                      + ",".join("OBJECT_ID(?)" for _ in tables) + ")", list(tables))
+            return c.fetchone()[0]
+        except Exception:
+            return None   # needs VIEW DATABASE STATE
+
+    def migrations(self):
+        return [
+            (1, "base tables, version counters and search indexes", [self._baseline]),
+            (2, "indexes on the student_id of fees and performance", [
+                """
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='ix_fees_student')
+                CREATE INDEX ix_fees_student ON fees(student_id) INCLUDE (amount, paid, due_date)
+                """,
+                """
+                IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='ix_performance_student')
+                CREATE INDEX ix_performance_student ON performance(student_id) INCLUDE (subject, marks)
+                """,
+            ]),
+            (3, "one attendance row per student and day; foreign keys to students", [
+                # keep the latest mark when a day was recorded more than once
+                """
+                WITH ranked AS (
+                    SELECT ROW_NUMBER() OVER (PARTITION BY student_id, date ORDER BY id DESC) AS rn
+                    FROM attendance
+                )
+                DELETE FROM ranked WHERE rn > 1
+                """,
+                """
+                IF EXISTS (SELECT * FROM sys.indexes WHERE name='ix_attendance_student_date')
+                DROP INDEX ix_attendance_student_date ON attendance
+                """,
+                "CREATE UNIQUE INDEX ux_attendance_student_date ON attendance(student_id, date) INCLUDE (present)",
+                # WITH NOCHECK: rows orphaned before this migration are left for the sweeper
+                "ALTER TABLE attendance WITH NOCHECK ADD CONSTRAINT fk_attendance_student "
+                "FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE",
+                "ALTER TABLE fees WITH NOCHECK ADD CONSTRAINT fk_fees_student "
+                "FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE",
+                "ALTER TABLE performance WITH NOCHECK ADD CONSTRAINT fk_performance_student "
+                "FOREIGN KEY (student_id) REFERENCES students(id) ON DELETE CASCADE",
+            ]),
+            (4, "attendance rollups per student and month and per grade and day", [
+                """
+                CREATE TABLE attendance_monthly(
+                    student_id INT NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+                    month INT NOT NULL,
+                    present INT NOT NULL,
+                    total INT NOT NULL,
+                    PRIMARY KEY (student_id, month)
+                )
+                """,
+                """
+                CREATE TABLE attendance_daily_grade(
+                    grade VARCHAR(10) NOT NULL,
+                    date DATE NOT NULL,
+                    present INT NOT NULL,
+                    total INT NOT NULL,
+                    PRIMARY KEY (grade, date)
+                )
+                """,
+                "CREATE INDEX ix_attendance_daily_grade_date ON attendance_daily_grade(date) INCLUDE (present, total)",
+                lambda c: self.rebuild_attendance_rollups(c, include_archive=False),
+            ]),
+            (5, "academic years on performance; archive tables for closed years", [
+                "ALTER TABLE performance ADD academic_year INT NULL",
+                # rows from before this migration are taken to belong to the current year
+                lambda c: c.execute("UPDATE performance SET academic_year = ? WHERE academic_year IS NULL",
+                                    (academic_year(),)),
+                "CREATE INDEX ix_performance_year ON performance(academic_year)",
+                "CREATE INDEX ix_attendance_date ON attendance(date)",
+                """
+                CREATE TABLE attendance_archive(
+                    id INT PRIMARY KEY,
+                    student_id INT NOT NULL,
+                    date DATE NOT NULL,
+                    present BIT
+                )
+                """,
+                "CREATE INDEX ix_attendance_archive_student ON attendance_archive(student_id, date) INCLUDE (present)",
+                """
+                CREATE TABLE fees_archive(
+                    id INT PRIMARY KEY,
+                    student_id INT NOT NULL,
+                    amount FLOAT,
+                    paid BIT,
+                    due_date DATE
+                )
+                """,
+                "CREATE INDEX ix_fees_archive_student ON fees_archive(student_id) INCLUDE (amount, paid, due_date)",
+                """
+                CREATE TABLE performance_archive(
+                    id INT PRIMARY KEY,
+                    student_id INT NOT NULL,
+                    subject VARCHAR(50),
+                    marks FLOAT,
+                    academic_year INT
+                )
+                """,
+                "CREATE INDEX ix_performance_archive_student ON performance_archive(student_id) INCLUDE (subject, marks)",
+                ARCHIVE_LOG_DDL,
+            ]),
+            (6, "idempotency keys of writes synced from terminal journals", [APPLIED_WRITES_DDL]),
+        ]
+
+    def _baseline(self, c):
+        # IF NOT EXISTS so databases created before migrations existed are adopted as-is
+        c.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='schema_version' AND xtype='U')
+        CREATE TABLE schema_version(
+            version INT PRIMARY KEY,
+            description VARCHAR(200),
+            applied_at DATETIME2 NOT NULL DEFAULT SYSDATETIME()
+        )
+        """)
+
+        # Students
+        c.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='students' AND xtype='U')
+        CREATE TABLE students(
+            id INT IDENTITY PRIMARY KEY,
+            name VARCHAR(100),
+            age INT,
+            grade VARCHAR(10)
+        )
+        """)
+
+        c.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='teachers' AND xtype='U')
+        CREATE TABLE teachers(
+            id INT IDENTITY PRIMARY KEY,
+            name VARCHAR(100),
+            subject VARCHAR(100)
+        )
+        """)
+
+        c.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='attendance' AND xtype='U')
+        CREATE TABLE attendance(
+            id INT IDENTITY PRIMARY KEY,
+            student_id INT,
+            date DATE,
+            present BIT
+        )
+        """)
+
+        c.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='fees' AND xtype='U')
+        CREATE TABLE fees(
+            id INT IDENTITY PRIMARY KEY,
+            student_id INT,
+            amount FLOAT,
+            paid BIT,
+            due_date DATE
+        )
+        """)
+
+        c.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='performance' AND xtype='U')
+        CREATE TABLE performance(
+            id INT IDENTITY PRIMARY KEY,
+            student_id INT,
+            subject VARCHAR(50),
+            marks FLOAT
+        )
+        """)
+
+        # Version counters used by School caches to spot writes from other clients
+        c.execute("""
+        IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='table_versions' AND xtype='U')
+        CREATE TABLE table_versions(
+            name VARCHAR(50) PRIMARY KEY,
+            version BIGINT NOT NULL
+        )
+        """)
+        for table in ("students", "teachers"):
+            c.execute("IF NOT EXISTS (SELECT * FROM table_versions WHERE name=?) "
+                      "INSERT INTO table_versions(name, version) VALUES(?, 0)", (table, table))
+
+        # Student search by name prefix and by grade
+        c.execute("""
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='ix_students_name')
+        CREATE INDEX ix_students_name ON students(name) INCLUDE (age, grade)
+        """)
+        c.execute("""
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='ix_students_grade')
+        CREATE INDEX ix_students_grade ON students(grade, name) INCLUDE (age)
+        """)
+
+        # Per-student attendance lookups and aggregates seek on (student_id, date)
+        c.execute("""
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='ix_attendance_student_date')
+        CREATE INDEX ix_attendance_student_date ON attendance(student_id, date) INCLUDE (present)
+        """)
+
+        # Unpaid/overdue fee scans only touch the unpaid slice of the ledger
+        c.execute("""
+        IF NOT EXISTS (SELECT * FROM sys.indexes WHERE name='ix_fees_paid_due')
+        CREATE INDEX ix_fees_paid_due ON fees(paid, due_date) INCLUDE (student_id, amount)
+        """)
+
+    # SQL Server DDL is transactional, so each migration commits or rolls back whole
+
+
+class SqliteBackend(Backend):
+    """Embedded single-file database for local runs, benchmarks and small campuses."""
+
+    name = "sqlite"
+
+    PRAGMAS = (
+        "PRAGMA journal_mode=WAL",      # readers never block the writer
+        "PRAGMA synchronous=NORMAL",    # fsync at checkpoints only; safe with WAL
+        "PRAGMA foreign_keys=ON",
+        "PRAGMA temp_store=MEMORY",
+        "PRAGMA cache_size=-20000",     # ~20 MB page cache per connection
+        "PRAGMA mmap_size=268435456",
     )
-    """)
-
-    c.execute("""
-    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='attendance' AND xtype='U')
-    CREATE TABLE attendance(
-        id INT IDENTITY PRIMARY KEY,
-        student_id INT,
-        date DATE,
-        present BIT
+
+    # closed academic years go to a second file next to the database, attached as
+    # "archive", so the hot file (and its cache and backups) stays small
+    ARCHIVE_DDL = (
+        "CREATE TABLE IF NOT EXISTS archive.attendance(id INTEGER PRIMARY KEY, student_id INT NOT NULL, "
+        "date DATE NOT NULL, present BIT)",
+        "CREATE INDEX IF NOT EXISTS archive.ix_attendance_student ON attendance(student_id, date, present)",
+        "CREATE TABLE IF NOT EXISTS archive.fees(id INTEGER PRIMARY KEY, student_id INT NOT NULL, amount FLOAT, "
+        "paid BIT, due_date DATE)",
+        "CREATE INDEX IF NOT EXISTS archive.ix_fees_student ON fees(student_id)",
+        "CREATE TABLE IF NOT EXISTS archive.performance(id INTEGER PRIMARY KEY, student_id INT NOT NULL, "
+        "subject TEXT, marks FLOAT, academic_year INT)",
+        "CREATE INDEX IF NOT EXISTS archive.ix_performance_student ON performance(student_id)",
     )
-    """)
-
-    c.execute("""
-    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='fees' AND xtype='U')
-    CREATE TABLE fees(
-        id INT IDENTITY PRIMARY KEY,
-        student_id INT,
-        amount FLOAT,
-        paid BIT,
-        due_date DATE
+
+    def __init__(self, path="school.db", busy_timeout=30.0, cached_statements=256):
+        self.path = path
+        self.archive_path = path if path == ":memory:" else os.path.splitext(path)[0] + "-archive.db"
+        self._archive_checked = False
+        self.busy_timeout = busy_timeout
+        self.cached_statements = cached_statements
+        sqlite3.register_adapter(datetime.date, datetime.date.isoformat)
+        sqlite3.register_converter("DATE", lambda b: _iso_date(b.decode()))
+
+    def connect(self):
+        # isolation_level=None: autocommit like the pyodbc connections; BEGIN is explicit.
+        # cached_statements keeps compiled statements per connection, so the pool
+        # reuses prepared statements across School calls.
+        conn = sqlite3.connect(self.path, timeout=self.busy_timeout, isolation_level=None,
+                               detect_types=sqlite3.PARSE_DECLTYPES, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        for pragma in self.PRAGMAS:
+            conn.execute(pragma)
+        conn.execute("ATTACH DATABASE ? AS archive", (self.archive_path,))
+        # the archive file's tables only need checking once (every time in memory)
+        if not self._archive_checked:
+            for ddl in self.ARCHIVE_DDL:
+                conn.execute(ddl)
+            self._archive_checked = self.archive_path != ":memory:"
+        return conn
+
+    def archive_table(self, table):
+        return f"archive.{table}"
+
+    @staticmethod
+    def begin(conn):
+        conn.execute("BEGIN")
+
+    def limit(self, sql, params, n):
+        return sql + " LIMIT ?", list(params) + [int(n)]
+
+    def insert(self, c, table, columns, values):
+        c.execute(f"INSERT INTO {table}({', '.join(columns)}) VALUES({','.join('?' * len(columns))})", values)
+        return c.lastrowid
+
+    def bump_version(self, c, table):
+        c.execute("UPDATE table_versions SET version = version + 1 WHERE name=? RETURNING version", (table,))
+        return c.fetchone()[0]
+
+    def used_bytes(self, c, tables):
+        # whole file minus free pages; deleted rows go to the freelist for reuse
+        page_size = c.execute("PRAGMA page_size").fetchone()[0]
+        pages = c.execute("PRAGMA page_count").fetchone()[0]
+        free = c.execute("PRAGMA freelist_count").fetchone()[0]
+        return (pages - free) * page_size
+
+    def month_key(self, column):
+        return f"CAST(strftime('%Y%m', {column}) AS INTEGER)"
+
+    def add_counts(self, c, table, keys, rows):
+        c.executemany(
+            f"INSERT INTO {table}({', '.join(keys)}, present, total) VALUES({','.join('?' * (len(keys) + 2))}) "
+            f"ON CONFLICT({', '.join(keys)}) DO UPDATE SET "
+            f"present = present + excluded.present, total = total + excluded.total", rows)
+
+    def migrating(self, conn, active):
+        # table rebuilds copy rows that may predate the foreign keys; the pragma
+        # is ignored inside a transaction, so it is switched around the whole run
+        conn.execute("PRAGMA foreign_keys=" + ("OFF" if active else "ON"))
+
+    def migrations(self):
+        return [
+            (1, "base tables, version counters and search indexes", [self._baseline]),
+            (2, "indexes on the student_id of fees and performance", [
+                "CREATE INDEX IF NOT EXISTS ix_fees_student ON fees(student_id)",
+                "CREATE INDEX IF NOT EXISTS ix_performance_student ON performance(student_id)",
+            ]),
+            (3, "one attendance row per student and day; foreign keys to students", [
+                "DELETE FROM attendance WHERE id NOT IN (SELECT MAX(id) FROM attendance GROUP BY student_id, date)",
+                # SQLite cannot add a foreign key to an existing table: rebuild the three child tables
+                lambda c: self._rebuild(c, "attendance", """
+                    CREATE TABLE attendance(
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        student_id INT REFERENCES students(id) ON DELETE CASCADE,
+                        date DATE,
+                        present BIT
+                    )""", "id, student_id, date, present"),
+                "CREATE UNIQUE INDEX ux_attendance_student_date ON attendance(student_id, date)",
+                lambda c: self._rebuild(c, "fees", """
+                    CREATE TABLE fees(
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        student_id INT REFERENCES students(id) ON DELETE CASCADE,
+                        amount FLOAT,
+                        paid BIT,
+                        due_date DATE
+                    )""", "id, student_id, amount, paid, due_date"),
+                "CREATE INDEX ix_fees_paid_due ON fees(paid, due_date, student_id, amount)",
+                "CREATE INDEX ix_fees_student ON fees(student_id)",
+                lambda c: self._rebuild(c, "performance", """
+                    CREATE TABLE performance(
+                        id INTEGER PRIMARY KEY AUTOINCREMENT,
+                        student_id INT REFERENCES students(id) ON DELETE CASCADE,
+                        subject TEXT,
+                        marks FLOAT
+                    )""", "id, student_id, subject, marks"),
+                "CREATE INDEX ix_performance_student ON performance(student_id)",
+            ]),
+            (4, "attendance rollups per student and month and per grade and day", [
+                """
+                CREATE TABLE attendance_monthly(
+                    student_id INT NOT NULL REFERENCES students(id) ON DELETE CASCADE,
+                    month INT NOT NULL,
+                    present INT NOT NULL,
+                    total INT NOT NULL,
+                    PRIMARY KEY (student_id, month)
+                ) WITHOUT ROWID
+                """,
+                """
+                CREATE TABLE attendance_daily_grade(
+                    grade TEXT NOT NULL,
+                    date DATE NOT NULL,
+                    present INT NOT NULL,
+                    total INT NOT NULL,
+                    PRIMARY KEY (grade, date)
+                ) WITHOUT ROWID
+                """,
+                "CREATE INDEX ix_attendance_daily_grade_date ON attendance_daily_grade(date)",
+                lambda c: self.rebuild_attendance_rollups(c, include_archive=False),
+            ]),
+            # the archive tables themselves are in the attached archive file (see connect)
+            (5, "academic years on performance; archive tables for closed years", [
+                "ALTER TABLE performance ADD COLUMN academic_year INT",
+                lambda c: c.execute("UPDATE performance SET academic_year = ? WHERE academic_year IS NULL",
+                                    (academic_year(),)),
+                "CREATE INDEX ix_performance_year ON performance(academic_year)",
+                "CREATE INDEX ix_attendance_date ON attendance(date)",
+                ARCHIVE_LOG_DDL,
+            ]),
+            (6, "idempotency keys of writes synced from terminal journals", [APPLIED_WRITES_DDL]),
+        ]
+
+    @staticmethod
+    def _rebuild(c, table, ddl, columns):
+        # drops the table's indexes too; the migration recreates the ones it needs
+        c.execute(f"ALTER TABLE {table} RENAME TO {table}_old")
+        c.execute(ddl)
+        c.execute(f"INSERT INTO {table}({columns}) SELECT {columns} FROM {table}_old")
+        c.execute(f"DROP TABLE {table}_old")
+
+    def _baseline(self, c):
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version(
+            version INTEGER PRIMARY KEY,
+            description TEXT,
+            applied_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP
+        )
+        """)
+        # name is NOCASE like the default SQL Server collation, which also lets
+        # LIKE 'prefix%' use ix_students_name
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS students(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT COLLATE NOCASE,
+            age INT,
+            grade TEXT
+        )
+        """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS teachers(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT COLLATE NOCASE,
+            subject TEXT
+        )
+        """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS attendance(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INT,
+            date DATE,
+            present BIT
+        )
+        """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS fees(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INT,
+            amount FLOAT,
+            paid BIT,
+            due_date DATE
+        )
+        """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS performance(
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            student_id INT,
+            subject TEXT,
+            marks FLOAT
+        )
+        """)
+        c.execute("""
+        CREATE TABLE IF NOT EXISTS table_versions(
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL
+        )
+        """)
+        c.executemany("INSERT OR IGNORE INTO table_versions(name, version) VALUES(?, 0)",
+                      [("students",), ("teachers",)])
+        c.execute("CREATE INDEX IF NOT EXISTS ix_students_name ON students(name, age, grade)")
+        c.execute("CREATE INDEX IF NOT EXISTS ix_students_grade ON students(grade, name, age)")
+        c.execute("CREATE INDEX IF NOT EXISTS ix_attendance_student_date ON attendance(student_id, date, present)")
+        c.execute("CREATE INDEX IF NOT EXISTS ix_fees_paid_due ON fees(paid, due_date, student_id, amount)")
+
+
+def backend_from_env():
+    # SCHOOL_DB=sqlite:path/to/school.db runs everything on the embedded engine
+    url = os.environ.get("SCHOOL_DB", "")
+    if url.startswith("sqlite:"):
+        return SqliteBackend(url[len("sqlite:"):] or "school.db")
+    return SqlServerBackend(url or CONN_STR)
+
+
+backend = backend_from_env()
+pool = ConnectionPool(backend.connect, begin=backend.begin)
+
+
+def configure_backend(new_backend, **pool_options):
+    global backend, pool
+    pool.close()
+    backend = new_backend
+    pool = ConnectionPool(backend.connect, begin=backend.begin, **pool_options)
+    return pool
+
+
+def configure_pool(factory=None, **options):
+    # replace the global pool, e.g. configure_pool(lambda: sqlite3.connect(path), max_size=4)
+    global pool
+    pool.close()
+    if factory is None:
+        factory = backend.connect
+        options.setdefault("begin", backend.begin)
+    pool = ConnectionPool(factory, **options)
+    return pool
+
+
+@contextmanager
+def scratch_database(path, **pool_options):
+    # point the module at a throwaway SQLite database (benchmarks), then put the
+    # previous backend and pool back as they were, still open
+    global backend, pool
+    saved = backend, pool
+    backend = SqliteBackend(path)
+    pool = ConnectionPool(backend.connect, begin=backend.begin, **pool_options)
+    try:
+        yield pool
+    finally:
+        pool.close()
+        backend, pool = saved
+
+
+_pinned = threading.local()
+
+
+class PinnedConnection:
+    """The connection of the transaction open on this thread, as seen by get_connection().
+
+    close() leaves it open, and begin/commit/rollback map to a savepoint, so code
+    written for a connection of its own also works inside transaction().
+    """
+
+    def __init__(self, conn):
+        self._conn = conn
+        self._savepoints = []
+        self.in_transaction = True
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def begin(self):
+        _pinned.savepoints += 1
+        name = f"sp_{_pinned.savepoints}"
+        backend.savepoint(self._conn.cursor(), name)
+        self._savepoints.append(name)
+
+    def commit(self):
+        if self._savepoints:
+            backend.release_savepoint(self._conn.cursor(), self._savepoints.pop())
+
+    def rollback(self):
+        if self._savepoints:
+            backend.rollback_to_savepoint(self._conn.cursor(), self._savepoints.pop())
+
+    def close(self):
+        while self._savepoints:
+            self.rollback()
+
+
+@contextmanager
+def transaction():
+    """Run everything inside the block on one connection and commit it once.
+
+    get_connection() on this thread returns the same connection until the block
+    ends; an exception rolls the whole block back. Nested blocks are savepoints.
+    """
+    # instrumented connections handed out in this block are finished when it ends
+    stack = getattr(_pinned, "instrumented", None)
+    if stack is None:
+        stack = _pinned.instrumented = []
+    opened = []
+    stack.append(opened)
+    try:
+        with _transaction() as conn:
+            yield conn
+    finally:
+        stack.pop()
+        for conn in opened:
+            conn.finish()
+
+
+@contextmanager
+def _transaction():
+    outer = getattr(_pinned, "conn", None)
+    if outer is not None:
+        inner = PinnedConnection(outer)
+        inner.begin()
+        try:
+            yield inner
+        except BaseException:
+            inner.rollback()
+            raise
+        inner.commit()
+        return
+    conn = pool.acquire()
+    try:
+        conn.begin()
+        _pinned.conn = conn
+        _pinned.savepoints = 0
+        try:
+            yield PinnedConnection(conn)
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
+    finally:
+        _pinned.conn = None
+        conn.close()
+
+
+class QueryStats:
+    """Opt-in instrumentation of School's database work (see get_connection).
+
+    While enabled, every connection handed out by get_connection() is tagged with
+    the operation that asked for it (the calling School method) and its cursors
+    time each execute and fetch. Per operation it keeps the call count, a latency
+    histogram (checkout to close), connection checkout time, execute and fetch
+    time and rows fetched. Statements slower than slow_ms go to a bounded slow
+    query log with parameter values redacted to their types. rendered() takes UI
+    callback times, so a slow screen can be split into connecting, executing and
+    drawing. When disabled, get_connection() costs one attribute check more.
+    """
+
+    BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+    def __init__(self, slow_ms=100.0, slow_log_size=200):
+        self.enabled = False
+        self.slow_ms = slow_ms
+        self.lock = threading.Lock()
+        self.slow = deque(maxlen=slow_log_size)
+        self.operations = {}
+        self.render = {}
+
+    def enable(self, slow_ms=None):
+        if slow_ms is not None:
+            self.slow_ms = slow_ms
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def reset(self):
+        with self.lock:
+            self.operations = {}
+            self.render = {}
+            self.slow.clear()
+
+    def _op(self, op):
+        # called with the lock held
+        entry = self.operations.get(op)
+        if entry is None:
+            entry = self.operations[op] = {
+                "calls": 0, "total_ms": 0.0, "max_ms": 0.0, "histogram": [0] * (len(self.BUCKETS_MS) + 1),
+                "checkouts": 0, "checkout_ms": 0.0, "statements": 0, "execute_ms": 0.0, "fetch_ms": 0.0,
+                "rows": 0}
+        return entry
+
+    def checkout(self, op, seconds):
+        with self.lock:
+            entry = self._op(op)
+            entry["checkouts"] += 1
+            entry["checkout_ms"] += seconds * 1000
+
+    def finished(self, op, seconds):
+        ms = seconds * 1000
+        with self.lock:
+            entry = self._op(op)
+            entry["calls"] += 1
+            entry["total_ms"] += ms
+            entry["max_ms"] = max(entry["max_ms"], ms)
+            entry["histogram"][bisect.bisect_left(self.BUCKETS_MS, ms)] += 1
+
+    def executed(self, op, sql, params, seconds):
+        with self.lock:
+            entry = self._op(op)
+            entry["statements"] += 1
+            entry["execute_ms"] += seconds * 1000
+        if seconds * 1000 >= self.slow_ms:
+            self._log_slow(op, "execute", sql, params, seconds, None)
+
+    def fetched(self, op, sql, params, seconds, rows):
+        with self.lock:
+            entry = self._op(op)
+            entry["fetch_ms"] += seconds * 1000
+            entry["rows"] += rows
+        if seconds * 1000 >= self.slow_ms:
+            self._log_slow(op, "fetch", sql, params, seconds, rows)
+
+    def rendered(self, label, seconds):
+        # DbExecutor stall_hook: time a UI-thread callback spent drawing results
+        if not self.enabled:
+            return
+        with self.lock:
+            entry = self.render.setdefault(label, {"calls": 0, "total_ms": 0.0, "max_ms": 0.0})
+            entry["calls"] += 1
+            entry["total_ms"] += seconds * 1000
+            entry["max_ms"] = max(entry["max_ms"], seconds * 1000)
+
+    def _log_slow(self, op, phase, sql, params, seconds, rows):
+        self.slow.append({"at": datetime.datetime.now().isoformat(timespec="seconds"), "operation": op,
+                          "phase": phase, "ms": seconds * 1000, "sql": " ".join(str(sql).split()),
+                          "params": self.redact(params), "rows": rows})
+
+    @staticmethod
+    def redact(params):
+        # values can be names, fees or marks; keep only their shape
+        if params is None:
+            return None
+        if isinstance(params, (list, tuple)):
+            return [type(p).__name__ for p in params]
+        return type(params).__name__
+
+    def snapshot(self):
+        labels = [f"<={b}ms" for b in self.BUCKETS_MS] + [f">{self.BUCKETS_MS[-1]}ms"]
+        with self.lock:
+            operations = {op: dict(entry, histogram=dict(zip(labels, entry["histogram"])))
+                          for op, entry in self.operations.items()}
+            render = {label: dict(entry) for label, entry in self.render.items()}
+            slow = list(self.slow)
+        return {"enabled": self.enabled, "slow_ms": self.slow_ms, "operations": operations,
+                "render": render, "slow": slow, "pool": pool.stats()}
+
+    def report(self):
+        # plain-text summary for the diagnostics window and the console
+        data = self.snapshot()
+        lines = [f"Instrumentation {'on' if data['enabled'] else 'off'}, slow query threshold {data['slow_ms']:.0f} ms",
+                 "",
+                 f"{'operation':<32}{'calls':>7}{'avg ms':>9}{'max ms':>9}{'checkout':>10}{'execute':>10}"
+                 f"{'fetch':>10}{'rows':>9}"]
+        for op, e in sorted(data["operations"].items(), key=lambda item: -item[1]["total_ms"]):
+            avg = e["total_ms"] / e["calls"] if e["calls"] else 0.0
+            lines.append(f"{op:<32}{e['calls']:>7}{avg:>9.2f}{e['max_ms']:>9.2f}{e['checkout_ms']:>10.1f}"
+                         f"{e['execute_ms']:>10.1f}{e['fetch_ms']:>10.1f}{e['rows']:>9}")
+        if data["render"]:
+            lines += ["", f"{'UI callback':<32}{'calls':>7}{'avg ms':>9}{'max ms':>9}"]
+            for label, e in sorted(data["render"].items(), key=lambda item: -item[1]["total_ms"]):
+                lines.append(f"{label:<32}{e['calls']:>7}{e['total_ms'] / e['calls']:>9.2f}{e['max_ms']:>9.2f}")
+        p = data["pool"]
+        lines += ["", f"Pool: {p['size']} open, {p['in_use']} in use, {p['created']} created "
+                      f"(avg connect {p['avg_connect'] * 1000:.1f} ms), avg wait {p['avg_wait'] * 1000:.2f} ms, "
+                      f"{p['timeouts']} timeouts"]
+        if data["slow"]:
+            lines += ["", "Slow queries (newest last):"]
+            for s in data["slow"][-20:]:
+                lines.append(f"  {s['at']} {s['operation']} {s['phase']} {s['ms']:.1f} ms: {s['sql'][:120]} "
+                             f"{s['params'] or ''}")
+        return "\n".join(lines)
+
+
+class InstrumentedConnection:
+    # what get_connection() returns while query_stats is enabled
+    def __init__(self, conn, op):
+        self._conn = conn
+        self._op = op
+        self._started = time.perf_counter()
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+    def cursor(self):
+        return InstrumentedCursor(self._conn.cursor(), self._op)
+
+    def close(self):
+        self._conn.close()
+        self.finish()
+
+    def finish(self):
+        # once per connection: at close(), or when the transaction() block it
+        # was taken in ends (School's write methods never close theirs)
+        if self._started is not None:
+            query_stats.finished(self._op, time.perf_counter() - self._started)
+            self._started = None
+
+
+class InstrumentedCursor:
+    def __init__(self, cursor, op):
+        object.__setattr__(self, "_cursor", cursor)
+        object.__setattr__(self, "_op", op)
+        object.__setattr__(self, "_last", (None, None))
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+    def __setattr__(self, name, value):
+        # e.g. fast_executemany belongs on the driver cursor
+        setattr(self._cursor, name, value)
+
+    def __iter__(self):
+        while True:
+            rows = self.fetchmany(1000)
+            if not rows:
+                return
+            yield from rows
+
+    def execute(self, sql, *params):
+        t0 = time.perf_counter()
+        try:
+            self._cursor.execute(sql, *params)
+        finally:
+            values = params[0] if len(params) == 1 and isinstance(params[0], (list, tuple)) else params
+            object.__setattr__(self, "_last", (sql, values))
+            query_stats.executed(self._op, sql, values, time.perf_counter() - t0)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        t0 = time.perf_counter()
+        try:
+            self._cursor.executemany(sql, seq_of_params)
+        finally:
+            object.__setattr__(self, "_last", (sql, None))
+            query_stats.executed(self._op, sql, None, time.perf_counter() - t0)
+        return self
+
+    def _fetch(self, method, *args):
+        t0 = time.perf_counter()
+        result = method(*args)
+        rows = 0 if result is None else 1 if method == self._cursor.fetchone else len(result)
+        query_stats.fetched(self._op, *self._last, time.perf_counter() - t0, rows)
+        return result
+
+    def fetchone(self):
+        return self._fetch(self._cursor.fetchone)
+
+    def fetchmany(self, size=1):
+        return self._fetch(self._cursor.fetchmany, size)
+
+    def fetchall(self):
+        return self._fetch(self._cursor.fetchall)
+
+
+query_stats = QueryStats()
+if os.environ.get("SCHOOL_PROFILE"):
+    # SCHOOL_PROFILE=<slow query threshold in ms>
+    query_stats.enable(float(os.environ["SCHOOL_PROFILE"]))
+
+
+def get_connection(op=None):
+    # op: the operation query_stats files this connection under (default: the caller)
+    conn = getattr(_pinned, "conn", None)
+    if not query_stats.enabled:
+        return pool.acquire() if conn is None else PinnedConnection(conn)
+    op = op or sys._getframe(1).f_code.co_name
+    t0 = time.perf_counter()
+    pinned = conn is not None
+    conn = pool.acquire() if conn is None else PinnedConnection(conn)
+    query_stats.checkout(op, time.perf_counter() - t0)
+    wrapped = InstrumentedConnection(conn, op)
+    if pinned:
+        _pinned.instrumented[-1].append(wrapped)
+    return wrapped
+
+def schema_version(c):
+    try:
+        c.execute("SELECT MAX(version) FROM schema_version")
+    except Exception:
+        return 0   # no schema_version table yet
+    return c.fetchone()[0] or 0
+
+
+def setup_database():
+    """Bring the schema up to date; returns the schema version.
+
+    When the database is already current this is a single query: no DDL or
+    existence checks run on a normal startup, and none at all once this backend
+    has been checked in this process. Otherwise every pending migration
+    runs in its own transaction and is recorded in schema_version.
+    """
+    migrations = backend.migrations()
+    target = migrations[-1][0]
+    if backend.checked_version == target:
+        return target
+    conn = get_connection()
+    try:
+        c = conn.cursor()
+        current = schema_version(c)
+        if current >= target:
+            backend.checked_version = target
+            return current
+        backend.migrating(conn, True)
+        try:
+            for version, description, steps in migrations:
+                if version <= current:
+                    continue
+                conn.begin()
+                try:
+                    for step in steps:
+                        if callable(step):
+                            step(c)
+                        else:
+                            c.execute(step)
+                    c.execute("INSERT INTO schema_version(version, description) VALUES(?,?)",
+                              (version, description))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                current = version
+        finally:
+            backend.migrating(conn, False)
+        backend.checked_version = current
+        return current
+    finally:
+        conn.close()
+
+@functools.lru_cache(maxsize=4096)
+def _iso_date(text):
+    # a school year has a few hundred distinct days, so nearly every parse is a cache hit
+    try:
+        return datetime.date.fromisoformat(text)
+    except ValueError:
+        # fromisoformat wants zero padding; keep accepting 2024-1-5
+        return datetime.datetime.strptime(text, "%Y-%m-%d").date()
+
+
+def parse_date(value):
+    # 'YYYY-MM-DD' strings become dates; dates (and None) pass through
+    if isinstance(value, str):
+        return _iso_date(value.strip())
+    return value
+
+
+ACADEMIC_YEAR_START_MONTH = 8   # academic years run August to July
+
+
+def academic_year(day=None):
+    # the academic year a date falls in, named after the calendar year it starts in
+    day = parse_date(day) or datetime.date.today()
+    return day.year if day.month >= ACADEMIC_YEAR_START_MONTH else day.year - 1
+
+
+def academic_year_bounds(year):
+    # [first day, first day of the next year)
+    return (datetime.date(year, ACADEMIC_YEAR_START_MONTH, 1),
+            datetime.date(year + 1, ACADEMIC_YEAR_START_MONTH, 1))
+
+
+# progress of School.archive_year, one row per (year, table); see there
+ARCHIVE_LOG_DDL = """
+    CREATE TABLE archive_log(
+        academic_year INT NOT NULL,
+        table_name VARCHAR(50) NOT NULL,
+        rows_moved BIGINT NOT NULL,
+        finished_at VARCHAR(30),
+        PRIMARY KEY (academic_year, table_name)
     )
-    """)
-
-    c.execute("""
-    IF NOT EXISTS (SELECT * FROM sysobjects WHERE name='performance' AND xtype='U')
-    CREATE TABLE performance(
-        id INT IDENTITY PRIMARY KEY,
-        student_id INT,
-        subject VARCHAR(50),
-        marks FLOAT
+"""
+
+# idempotency keys of journaled writes already applied (see JournalSyncer)
+APPLIED_WRITES_DDL = """
+    CREATE TABLE applied_writes(
+        write_key VARCHAR(64) PRIMARY KEY,
+        applied_at VARCHAR(30) NOT NULL
     )
-    """)
+"""
 
-    conn.commit()
-    conn.close()
 
+# Record classes use __slots__: no per-instance __dict__, so bulk lists of them stay small
 class Student:
+    __slots__ = ("id", "name", "age", "grade")
+
     def __init__(self, name, age, grade, student_id=None):
         self.id = student_id
         self.name = name
@@ -82,22 +1359,25 @@ class Student:
         self.grade = grade
 
 class Teacher:
+    __slots__ = ("id", "name", "subject")
+
     def __init__(self, name, subject, teacher_id=None):
         self.id = teacher_id
         self.name = name
         self.subject = subject
 
 class AttendanceRecord:
+    __slots__ = ("id", "student_id", "date", "present")
+
     def __init__(self, student_id, date, present, record_id=None):
         self.id = record_id
         self.student_id = int(student_id)
-        if isinstance(date, str):
-            self.date = datetime.datetime.strptime(date, "%Y-%m-%d").date()
-        else:
-            self.date = date
+        self.date = parse_date(date)
         self.present = bool(present)
 
 class FeeRecord:
+    __slots__ = ("id", "student_id", "amount", "paid", "due_date")
+
     def __init__(self, student_id, amount, paid=False, due_date=None, fee_id=None):
         self.id = fee_id
         self.student_id = int(student_id)
@@ -106,210 +1386,2812 @@ class FeeRecord:
         if due_date is None:
             self.due_date = datetime.date.today()
         else:
-            if isinstance(due_date, str):
-                self.due_date = datetime.datetime.strptime(due_date, "%Y-%m-%d").date()
-            else:
-                self.due_date = due_date
+            self.due_date = parse_date(due_date)
 
-    def is_overdue(self):
-        return (not self.paid) and (self.due_date < datetime.date.today())
+    def is_overdue(self, as_of=None):
+        return (not self.paid) and (self.due_date < (as_of or datetime.date.today()))
 
 class Performance:
-    def __init__(self, student_id, subject, marks, perf_id=None):
+    __slots__ = ("id", "student_id", "subject", "marks", "academic_year")
+
+    def __init__(self, student_id, subject, marks, perf_id=None, academic_year=None):
         self.id = perf_id
         self.student_id = int(student_id)
         self.subject = subject
         self.marks = float(marks)
+        self.academic_year = None if academic_year in (None, "") else int(academic_year)
+
+    def calculate_grade(self, scale=None):
+        return (scale or DEFAULT_GRADE_SCALE).grade(self.marks)
+
+
+class AttendanceBatch:
+    """Attendance marks as parallel typed arrays: student ids, day ordinals, present flags.
+
+    13 bytes a mark instead of a record object, so a year of attendance for a
+    few thousand students is a few tens of MB at most. Iterating yields
+    (student_id, date, present) tuples, ready for executemany.
+    """
+
+    __slots__ = ("student_ids", "days", "present")
+
+    def __init__(self, rows=()):
+        self.student_ids = array("q")
+        self.days = array("i")
+        self.present = array("b")
+        self.extend(rows)
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def __iter__(self):
+        dates = {}
+        for sid, day, present in zip(self.student_ids, self.days, self.present):
+            date = dates.get(day)
+            if date is None:
+                date = dates[day] = datetime.date.fromordinal(day)
+            yield sid, date, present
+
+    def append(self, student_id, date, present):
+        self.student_ids.append(int(student_id))
+        self.days.append(parse_date(date).toordinal())
+        self.present.append(1 if present else 0)
+
+    def extend(self, rows):
+        # (student_id, date, present) rows or AttendanceRecords
+        add_id, add_day, add_present = self.student_ids.append, self.days.append, self.present.append
+        ordinals = {}
+        for row in rows:
+            if isinstance(row, AttendanceRecord):
+                sid, date, present = row.student_id, row.date, row.present
+            else:
+                sid, date, present = row
+            day = ordinals.get(date)
+            if day is None:
+                day = ordinals[date] = parse_date(date).toordinal()
+            add_id(int(sid))
+            add_day(day)
+            add_present(1 if present else 0)
+
+    def records(self):
+        return [AttendanceRecord(sid, date, present) for sid, date, present in self]
+
+    def stats(self):
+        # {student_id: (total, present, percentage)}
+        return attendance_stats_from_rows(zip(self.student_ids, self.present))
+
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.student_ids, self.days, self.present))
+
+
+class FeeBatch:
+    """Fees as parallel typed arrays: student ids, amounts, paid flags, due-day ordinals."""
+
+    __slots__ = ("student_ids", "amounts", "paid", "due_days")
+
+    def __init__(self, rows=()):
+        self.student_ids = array("q")
+        self.amounts = array("d")
+        self.paid = array("b")
+        self.due_days = array("i")
+        self.extend(rows)
+
+    def __len__(self):
+        return len(self.student_ids)
+
+    def __iter__(self):
+        # (student_id, amount, paid, due_date)
+        dates = {}
+        for sid, amount, paid, day in zip(self.student_ids, self.amounts, self.paid, self.due_days):
+            date = dates.get(day)
+            if date is None:
+                date = dates[day] = datetime.date.fromordinal(day)
+            yield sid, amount, paid, date
+
+    def append(self, student_id, amount, paid, due_date):
+        self.student_ids.append(int(student_id))
+        self.amounts.append(float(amount))
+        self.paid.append(1 if paid else 0)
+        self.due_days.append(parse_date(due_date).toordinal())
+
+    def extend(self, rows):
+        # (student_id, amount, paid, due_date) rows or FeeRecords
+        append = self.append
+        for row in rows:
+            if isinstance(row, FeeRecord):
+                append(row.student_id, row.amount, row.paid, row.due_date)
+            else:
+                append(*row)
+
+    def nbytes(self):
+        return sum(a.itemsize * len(a) for a in (self.student_ids, self.amounts, self.paid, self.due_days))
+
+
+class GradeScale:
+    """Letter grades from a boundary table: [(lowest mark, letter), ...] plus a fallback.
+
+    Grading is a binary search over the sorted lower bounds, so whole columns of
+    marks can be graded (or counted per letter) without an if/elif per row.
+    """
+
+    def __init__(self, boundaries=((90, "A+"), (80, "A"), (70, "B"), (60, "C"), (50, "D")), fallback="F"):
+        pairs = sorted(boundaries)
+        self.bounds = [b for b, _ in pairs]
+        self.letters = [fallback] + [letter for _, letter in pairs]
+
+    def grade(self, marks):
+        return self.letters[bisect.bisect_right(self.bounds, marks)]
+
+    def grade_many(self, marks):
+        bounds, letters, find = self.bounds, self.letters, bisect.bisect_right
+        return [letters[find(bounds, m)] for m in marks]
+
+    def distribution(self, sorted_marks):
+        # letter -> count for an ascending sequence, using one bisect per boundary
+        cuts = [0] + [bisect.bisect_left(sorted_marks, b) for b in self.bounds] + [len(sorted_marks)]
+        return {letter: cuts[i + 1] - cuts[i] for i, letter in enumerate(self.letters)}
+
+
+DEFAULT_GRADE_SCALE = GradeScale()
+
+
+def percentile(sorted_values, pct):
+    # linear interpolation between closest ranks
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * pct / 100.0
+    lo = int(k)
+    hi = min(lo + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def class_performance_analytics(grades, student_ids, subjects, marks, scale=DEFAULT_GRADE_SCALE):
+    """Class/subject statistics from column-oriented performance data.
+
+    grades, student_ids, subjects and marks are parallel sequences (one entry per
+    performance row). Returns (groups, ranks):
+      groups[(grade, subject)] = {count, mean, median, p25, p75, p90, min, max, distribution}
+      ranks[student_id] = (grade, rank, class size, average marks)
+    Ranks are by average marks within the class grade; ties share a rank.
+    """
+    # one pass over the columns: marks by class grade and subject, and each
+    # student's total and class grade; the row counts per student come from
+    # Counter, which counts in C. Grouping under one (grade, subject) key, or
+    # ranking with a single sort over every student, measured slower: a key tuple
+    # per row, and tuple compares on the grade, cost more than they save.
+    by_grade = defaultdict(lambda: defaultdict(list))
+    totals = defaultdict(float)
+    student_grade = {}
+    for g, sid, subj, m in zip(grades, student_ids, subjects, marks):
+        by_grade[g][subj].append(m)
+        totals[sid] += m
+        student_grade[sid] = g
+    counts = Counter(student_ids)
+
+    # letter tallies come from the sorted marks, one bisect per boundary per group
+    # (cheaper than a bisect per row inside the loop above)
+    groups = {}
+    for g, by_subject in by_grade.items():
+        for subj, values in by_subject.items():
+            values.sort()
+            groups[(g, subj)] = {
+                "count": len(values),
+                "mean": sum(values) / len(values),
+                "median": percentile(values, 50),
+                "p25": percentile(values, 25),
+                "p75": percentile(values, 75),
+                "p90": percentile(values, 90),
+                "min": values[0],
+                "max": values[-1],
+                "distribution": scale.distribution(values),
+            }
+
+    by_class = defaultdict(list)
+    for sid, total in totals.items():
+        by_class[student_grade[sid]].append((total / counts[sid], sid))
+    ranks = {}
+    for g, entries in by_class.items():
+        # plain tuple sort, no key function; tied averages share a rank whatever
+        # their order
+        entries.sort(reverse=True)
+        size = len(entries)
+        rank = 0
+        previous = None
+        for position, (avg, sid) in enumerate(entries, 1):
+            if avg != previous:
+                rank, previous = position, avg
+            ranks[sid] = (g, rank, size, avg)
+    return groups, ranks
+
+
+def parse_bool(value):
+    text = str(value).strip().lower()
+    if text in ("1", "true", "yes", "y", "paid"):
+        return True
+    if text in ("", "0", "false", "no", "n", "unpaid"):
+        return False
+    raise ValueError(f"not a yes/no value: {value!r}")
+
+
+class CsvSource:
+    """Streams rows of a CSV file as (line_no, dict) without loading the file.
+
+    fraction tracks how much of the file has been consumed, for progress bars.
+    """
+
+    def __init__(self, path, encoding="utf-8-sig"):
+        self.path = path
+        self.encoding = encoding
+        self.size = os.path.getsize(path)
+        self.consumed = 0
+
+    @property
+    def fraction(self):
+        return min(1.0, self.consumed / self.size) if self.size else 1.0
+
+    def rows(self, required=()):
+        import csv
+
+        with open(self.path, newline="", encoding=self.encoding) as f:
+            reader = csv.DictReader(self._lines(f))
+            missing = [col for col in required if col not in (reader.fieldnames or ())]
+            if missing:
+                raise ValueError(f"{os.path.basename(self.path)}: missing column(s) {', '.join(missing)}")
+            for row in reader:
+                yield reader.line_num, row
+
+    def _lines(self, f):
+        for line in f:
+            self.consumed += len(line)
+            yield line
+
+
+# kind -> (required CSV columns, row -> record, INSERT statement, record -> parameters).
+# Records are built with the normal constructors so imports validate like the forms do.
+IMPORT_SPECS = {
+    "students": (("name", "age", "grade"),
+                 lambda r: Student(r["name"], r["age"], r["grade"]),
+                 "INSERT INTO students(name, age, grade) VALUES(?,?,?)",
+                 lambda s: (s.name, s.age, s.grade)),
+    "fees": (("student_id", "amount", "due_date"),
+             lambda r: FeeRecord(r["student_id"], r["amount"], parse_bool(r.get("paid") or ""), r["due_date"]),
+             "INSERT INTO fees(student_id, amount, paid, due_date) VALUES(?,?,?,?)",
+             lambda f: (f.student_id, f.amount, int(f.paid), f.due_date)),
+    "performance": (("student_id", "subject", "marks"),
+                    lambda r: Performance(r["student_id"], r["subject"], r["marks"],
+                                          academic_year=r.get("academic_year")),
+                    "INSERT INTO performance(student_id, subject, marks, academic_year) VALUES(?,?,?,?)",
+                    lambda p: (p.student_id, p.subject, p.marks, p.academic_year or academic_year())),
+}
+
+
+class ImportResult:
+    def __init__(self, kind, max_errors=1000):
+        self.kind = kind
+        self.max_errors = max_errors
+        self.rows_read = 0
+        self.inserted = 0
+        self.failed = 0
+        self.errors = []    # (line_no, message), first max_errors only
+        self.seconds = 0.0
+
+    def error(self, line_no, message):
+        self.failed += 1
+        if len(self.errors) < self.max_errors:
+            self.errors.append((line_no, message))
+
+    def summary(self):
+        return (f"{self.kind}: {self.inserted} imported, {self.failed} rejected "
+                f"of {self.rows_read} rows in {self.seconds:.1f}s")
+
+
+def _shard_path(path, grade, taken):
+    # path_grade-<g>.csv, or path_ungraded.csv for a NULL grade. Anything but
+    # letters, digits and '-' is written as _XX (hex of each UTF-8 byte), so two
+    # grades never share a name; taken holds the lower-cased paths handed out so
+    # far, and a name that only differs from one of them in case (the same file
+    # on Windows) gets the grade's hash as well.
+    root, ext = os.path.splitext(path[:-3] if path.endswith(".gz") else path)
+    if grade is None:
+        name = f"{root}_ungraded"
+    else:
+        text = str(grade)
+        safe = "".join(ch if ch.isalnum() or ch == "-" else "".join(f"_{b:02X}" for b in ch.encode())
+                       for ch in text)
+        name = f"{root}_grade-{safe}"
+        if name.lower() in taken:
+            import hashlib
+            name += "-" + hashlib.sha1(text.encode()).hexdigest()[:8]
+    taken.add(name.lower())
+    return name + (ext or ".csv")
+
+
+def _open_export(path, compress):
+    if compress:
+        import gzip
+        if not path.endswith(".gz"):
+            path += ".gz"
+        return gzip.open(path, "wt", newline="", encoding="utf-8")
+    return open(path, "w", newline="", encoding="utf-8")
+
+
+def attendance_stats_from_rows(rows):
+    # In-memory fallback for School.attendance_stats: rows are (student_id, present)
+    # pairs from an already fetched result set. Returns {student_id: (total, present, percentage)}.
+    totals = Counter()
+    presents = Counter()
+    for sid, present in rows:
+        totals[sid] += 1
+        if present:
+            presents[sid] += 1
+    return {sid: (total, presents[sid], presents[sid] / total * 100.0) for sid, total in totals.items()}
+
+
+def build_profile(student, attendance, fees, performance, as_of=None, scale=DEFAULT_GRADE_SCALE):
+    # student row plus its attendance, fee and performance rows (as the view_* methods
+    # return them) -> profile dict with the aggregates the tabs used to query separately
+    as_of = parse_date(as_of) or datetime.date.today()
+    present = sum(1 for r in attendance if r[3])
+    unpaid = [r for r in fees if not r[3]]
+    overdue = [r for r in unpaid if r[4] is not None and r[4] < as_of]
+    marks = [r[3] for r in performance]
+    average = sum(marks) / len(marks) if marks else None
+    return {
+        "student": student,
+        "attendance": attendance,
+        "fees": fees,
+        "performance": performance,
+        "attendance_days": len(attendance),
+        "attendance_present": present,
+        "attendance_percentage": present / len(attendance) * 100.0 if attendance else 0.0,
+        "fees_total": sum(r[2] for r in fees),
+        "fees_unpaid": sum(r[2] for r in unpaid),
+        "fees_overdue": sum(r[2] for r in overdue),
+        "overdue_count": len(overdue),
+        "report": [(r[2], r[3], letter) for r, letter in zip(performance, scale.grade_many(marks))],
+        "average_marks": average,
+        "overall_grade": None if average is None else scale.grade(average),
+    }
+
+
+def escape_like(text):
+    # escape LIKE wildcards; the queries use ESCAPE '\'
+    for ch in ("\\", "%", "_", "["):
+        text = text.replace(ch, "\\" + ch)
+    return text
+
+
+class StudentIndex:
+    """Client-side prefix and trigram index over (id, name, age, grade) rows.
+
+    Used for as-you-type filtering: names starting with the text come first (in
+    name order), followed by names containing it anywhere.
+    """
+
+    def __init__(self, rows=()):
+        self._rows = {}
+        self._names = []                    # sorted (lower name, id)
+        self._trigrams = defaultdict(set)   # trigram -> ids
+        for row in rows:
+            self._rows[row[0]] = tuple(row)
+        self._names = sorted((r[1].lower(), key) for key, r in self._rows.items())
+        for name, key in self._names:
+            for tri in self._trigrams_of(name):
+                self._trigrams[tri].add(key)
+
+    def __len__(self):
+        return len(self._rows)
+
+    def search(self, text=None, grade=None, age_range=None, limit=100):
+        text = (text or "").strip().lower()
+        results = []
+        seen = set()
+        for key in self._prefix_ids(text):
+            if self._matches(key, grade, age_range):
+                results.append(self._rows[key])
+                seen.add(key)
+                if len(results) >= limit:
+                    return results
+        if len(text) >= 3:
+            for key in self._substring_ids(text):
+                if key not in seen and self._matches(key, grade, age_range):
+                    results.append(self._rows[key])
+                    if len(results) >= limit:
+                        break
+        return results
+
+    def _prefix_ids(self, text):
+        i = bisect.bisect_left(self._names, (text,))
+        while i < len(self._names) and self._names[i][0].startswith(text):
+            yield self._names[i][1]
+            i += 1
+
+    def _substring_ids(self, text):
+        candidates = None
+        for tri in self._trigrams_of(text):
+            ids = self._trigrams.get(tri)
+            if not ids:
+                return []
+            candidates = set(ids) if candidates is None else candidates & ids
+        hits = [(self._rows[k][1].lower(), k) for k in candidates if text in self._rows[k][1].lower()]
+        return [k for _, k in sorted(hits)]
+
+    def _matches(self, key, grade, age_range):
+        row = self._rows[key]
+        if grade is not None and row[3] != grade:
+            return False
+        if age_range is not None and not age_range[0] <= row[2] <= age_range[1]:
+            return False
+        return True
+
+    @staticmethod
+    def _trigrams_of(text):
+        return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TableCache:
+    """Id-indexed in-memory copy of one table.
+
+    The copy is tagged with the table's row in table_versions. Writes made
+    through this School update it in place; after ttl seconds the version is
+    re-read from the database and the table reloaded if another client wrote.
+    """
+
+    def __init__(self, table, select_sql, ttl=5.0):
+        self.table = table
+        self.select_sql = select_sql
+        self.ttl = ttl
+        self.lock = threading.RLock()
+        self.version = None
+        self.checked_at = 0.0
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self._rows = {}
+        self._ids = []
+
+    def load(self, version, rows):
+        self._rows = {r[0]: tuple(r) for r in rows}
+        self._ids = sorted(self._rows)
+        self.version = version
+
+    def invalidate(self):
+        with self.lock:
+            self.version = None
+
+    def written(self, version, change):
+        # apply a local write only if nobody else wrote since our last sync
+        with self.lock:
+            if self.version is not None and version == self.version + 1:
+                change(self)
+                self.version = version
+            else:
+                self.version = None
+
+    def put(self, row):
+        key = row[0]
+        if key not in self._rows:
+            bisect.insort(self._ids, key)
+        self._rows[key] = tuple(row)
+
+    def remove(self, key):
+        if self._rows.pop(key, None) is not None:
+            self._ids.pop(bisect.bisect_left(self._ids, key))
+
+    def get(self, key):
+        return self._rows.get(key)
+
+    def page(self, page_size=None, after_id=None):
+        start = bisect.bisect_right(self._ids, after_id or 0)
+        end = None if page_size is None else start + page_size
+        return [self._rows[k] for k in self._ids[start:end]]
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "revalidations": self.revalidations,
+                "rows": len(self._rows), "version": self.version}
+
+
+class School:
+    # tables whose writes are counted in table_versions
+    _VERSIONED = ("students", "teachers")
+    # tables holding per-student rows
+    _STUDENT_CHILDREN = ("attendance", "fees", "performance")
+    # columns copied to the archive tables, and the rows archive_year moves: the
+    # year's attendance, paid fees due in it (unpaid ones stay until settled) and
+    # the year's performance; the parameter is the year's end date, or the year
+    _ARCHIVE_COLUMNS = {
+        "attendance": ("id", "student_id", "date", "present"),
+        "fees": ("id", "student_id", "amount", "paid", "due_date"),
+        "performance": ("id", "student_id", "subject", "marks", "academic_year"),
+    }
+    _ARCHIVE_ROWS = {
+        "attendance": "date < ?",
+        "fees": "due_date < ? AND paid = 1",
+        "performance": "academic_year <= ?",
+    }
+
+    def __init__(self, cache=False, cache_ttl=5.0, include_archive=False):
+        # include_archive: reads cover archived academic years too (see archive_year)
+        self.include_archive = include_archive
+        self.cache_ttl = cache_ttl
+        self._hot_start = (None, None)
+        self._caches = {}
+        if cache:
+            self._caches["students"] = TableCache(
+                "students", "SELECT id, name, age, grade FROM students", cache_ttl)
+            self._caches["teachers"] = TableCache(
+                "teachers", "SELECT id, name, subject FROM teachers", cache_ttl)
+
+    @contextmanager
+    def transaction(self):
+        """Unit of work: School calls made inside the block commit together.
+
+            with school.transaction():
+                sid = school.add_student(s)
+                school.add_fee(FeeRecord(sid, 500))
+        """
+        try:
+            with transaction():
+                yield self
+        except BaseException:
+            # write-through already applied to the caches; drop them
+            for cache in self._caches.values():
+                cache.invalidate()
+            raise
+
+    def cache_stats(self):
+        return {name: cache.stats() for name, cache in self._caches.items()}
+
+    def _cached(self, table, op):
+        # returns the table cache once it is known to be current, or None;
+        # op labels the revalidation query in query_stats
+        cache = self._caches.get(table)
+        if cache is None:
+            return None
+        with cache.lock:
+            now = time.monotonic()
+            if cache.version is not None and now - cache.checked_at < cache.ttl:
+                cache.hits += 1
+                return cache
+            conn = get_connection(op)
+            try:
+                c = conn.cursor()
+                c.execute("SELECT version FROM table_versions WHERE name=?", (table,))
+                version = c.fetchone()[0]
+                if version == cache.version:
+                    cache.hits += 1
+                    cache.revalidations += 1
+                else:
+                    cache.misses += 1
+                    c.execute(cache.select_sql)
+                    cache.load(version, c.fetchall())
+                cache.checked_at = now
+            finally:
+                conn.close()
+            return cache
+
+    def table_version(self, table):
+        # write counter of a _VERSIONED table; a cached read is consistent with it
+        cache = self._cached(table, "table_version")
+        if cache is not None:
+            with cache.lock:
+                return cache.version
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT version FROM table_versions WHERE name=?", (table,))
+        version = c.fetchone()[0]
+        conn.close()
+        return version
+
+    def with_archive(self):
+        # this School, sharing its caches, reading archived academic years as well
+        view = copy.copy(self)
+        view.include_archive = True
+        return view
+
+    def _source(self, table, alias=None):
+        # FROM item for a student child table: its hot rows, or with include_archive
+        # the archived years as well
+        if not self.include_archive:
+            return f"{table} {alias}" if alias else table
+        columns = ", ".join(self._ARCHIVE_COLUMNS[table])
+        return (f"(SELECT {columns} FROM {table} UNION ALL "
+                f"SELECT {columns} FROM {backend.archive_table(table)}) {alias or table}")
+
+    def hot_start(self):
+        # first day still in the hot tables: the end of the last academic year
+        # archive_year finished, or None while nothing is archived
+        value, checked_at = self._hot_start
+        now = time.monotonic()
+        if checked_at is not None and now - checked_at < self.cache_ttl:
+            return value
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT MAX(academic_year) FROM (SELECT academic_year FROM archive_log "
+                  "WHERE finished_at IS NOT NULL GROUP BY academic_year HAVING COUNT(*) = ?) done",
+                  (len(self._STUDENT_CHILDREN),))
+        year = c.fetchone()[0]
+        conn.close()
+        value = academic_year_bounds(year)[1] if year is not None else None
+        self._hot_start = (value, now)
+        return value
+
+    def _check_hot(self, dates):
+        start = self.hot_start()
+        if start is not None:
+            for day in dates:
+                if parse_date(day) < start:
+                    raise ValueError(f"academic year {academic_year(day)} is archived")
+
+    def _written(self, c, table, change):
+        # every client bumps the version so caching clients can see the write
+        version = backend.bump_version(c, table)
+        cache = self._caches.get(table)
+        if cache is not None:
+            cache.written(version, change)
+
+    # STUDENTS
+    def add_student(self, s: Student):
+        conn = get_connection()
+        c = conn.cursor()
+        s.id = backend.insert(c, "students", ("name", "age", "grade"), (s.name, s.age, s.grade))
+        self._written(c, "students", lambda cache: cache.put((s.id, s.name, s.age, s.grade)))
+        conn.close()
+        return s.id
+
+    def enroll_student(self, s: Student, admission_fee=None, fee_due=None, first_day=None):
+        # add the student, the first fee and the first attendance mark as one unit
+        with self.transaction():
+            sid = self.add_student(s)
+            if admission_fee is not None:
+                self.add_fee(FeeRecord(sid, admission_fee, False, fee_due))
+            if first_day is not None:
+                self.add_attendance(AttendanceRecord(sid, first_day, True))
+        return sid
+
+    def view_students(self, page_size=None, after_id=None):
+        # keyset pagination: pass the last id of the previous page as after_id
+        cache = self._cached("students", "view_students")
+        if cache is not None:
+            with cache.lock:
+                return cache.page(page_size, after_id)
+        conn = get_connection()
+        c = conn.cursor()
+        if page_size is None:
+            c.execute("SELECT id, name, age, grade FROM students ORDER BY id")
+        else:
+            c.execute(*backend.limit("SELECT id, name, age, grade FROM students WHERE id > ? ORDER BY id",
+                                     [int(after_id or 0)], page_size))
+        data = c.fetchall()
+        conn.close()
+        return data
+
+    def get_student(self, sid):
+        cache = self._cached("students", "get_student")
+        if cache is not None:
+            with cache.lock:
+                return cache.get(int(sid))
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT id, name, age, grade FROM students WHERE id=?", (int(sid),))
+        row = c.fetchone()
+        conn.close()
+        return row
+
+    def search_students(self, name_prefix=None, grade=None, age_range=None, limit=100):
+        # served by ix_students_name / ix_students_grade; age_range is (min, max) inclusive
+        where = []
+        params = []
+        if name_prefix:
+            where.append("name LIKE ? ESCAPE '\\'")
+            params.append(escape_like(name_prefix) + "%")
+        if grade is not None:
+            where.append("grade = ?")
+            params.append(grade)
+        if age_range is not None:
+            where.append("age BETWEEN ? AND ?")
+            params.extend((int(age_range[0]), int(age_range[1])))
+        sql = "SELECT id, name, age, grade FROM students"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute(*backend.limit(sql + " ORDER BY name, id", params, limit))
+        data = c.fetchall()
+        conn.close()
+        return data
+
+    def view_students_in_grade(self, grade):
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT id, name FROM students WHERE grade=? ORDER BY name", (grade,))
+        data = c.fetchall()
+        conn.close()
+        return data
+
+    def update_student(self, sid, name, age, grade):
+        sid, age = int(sid), int(age)
+        with self.transaction():
+            c = get_connection().cursor()
+            grades = self._grades_of(c, [sid])
+            # a NULL grade rolls up under '' (see rebuild_attendance_rollups)
+            old_grade = (grades[sid] or "") if sid in grades else None
+            c.execute("UPDATE students SET name=?, age=?, grade=? WHERE id=?",
+                      (name, age, grade, sid))
+            if old_grade is not None and old_grade != (grade or ""):
+                # the student's marks now count towards the new grade's daily rollup
+                c.execute("SELECT date, SUM(CASE WHEN present=1 THEN 1 ELSE 0 END), COUNT(*) "
+                          f"FROM {self.with_archive()._source('attendance')} WHERE student_id=? GROUP BY date",
+                          (sid,))
+                daily = {}
+                for date, present, total in c.fetchall():
+                    daily[(old_grade, date)] = [-present, -total]
+                    daily[(grade or "", date)] = [present, total]
+                self._apply_rollup_deltas(c, {}, daily)
+            self._written(c, "students", lambda cache: cache.put((sid, name, age, grade)))
+
+    def delete_student(self, sid):
+        self.delete_students([sid])
+
+    def delete_students(self, sids):
+        # students and their attendance, fees and performance (archived years
+        # included) go in one transaction; returns how many students existed
+        params = [(int(sid),) for sid in sids]
+        if not params:
+            return 0
+        every_year = self.with_archive()
+        with self.transaction():
+            c = get_connection().cursor()
+            # take the students' marks out of the per-grade daily rollup
+            daily = {}
+            for start in range(0, len(params), 500):
+                part = [sid for (sid,) in params[start:start + 500]]
+                c.execute("SELECT COALESCE(s.grade, ''), a.date, SUM(CASE WHEN a.present=1 THEN 1 ELSE 0 END), "
+                          f"COUNT(*) FROM {every_year._source('attendance', 'a')} JOIN students s ON s.id = a.student_id "
+                          f"WHERE a.student_id IN ({','.join('?' * len(part))}) "
+                          "GROUP BY COALESCE(s.grade, ''), a.date", part)
+                for grade, date, present, total in c.fetchall():
+                    counts = daily.setdefault((grade, date), [0, 0])
+                    counts[0] -= present
+                    counts[1] -= total
+            self._apply_rollup_deltas(c, {}, daily)
+            c.executemany("DELETE FROM attendance_monthly WHERE student_id=?", params)
+            for table in self._STUDENT_CHILDREN:
+                c.executemany(f"DELETE FROM {table} WHERE student_id=?", params)
+                c.executemany(f"DELETE FROM {backend.archive_table(table)} WHERE student_id=?", params)
+            deleted = 0
+            for start in range(0, len(params), 500):
+                part = [sid for (sid,) in params[start:start + 500]]
+                c.execute(f"DELETE FROM students WHERE id IN ({','.join('?' * len(part))})", part)
+                deleted += c.rowcount
+
+            def remove_all(cache):
+                for (sid,) in params:
+                    cache.remove(sid)
+            self._written(c, "students", remove_all)
+        return deleted
+
+    def sweep_orphans(self, batch_size=1000, pause=0.05, max_batches=None):
+        """Delete rows whose student no longer exists.
+
+        Covers attendance/fees/performance, their archive tables and the
+        per-student attendance_monthly rollup. attendance_daily_grade is keyed by
+        grade and day, not student: delete_students already takes a student's
+        marks out of it, so it has no orphans to sweep.
+        Works through each table in key order, one short transaction per batch of
+        at most batch_size keys, sleeping pause seconds in between so other
+        writers are never locked out for long. Returns a report of rows removed
+        per table and the storage reclaimed (None if the backend cannot tell).
+        """
+        tables = [(table, "id") for table in self._STUDENT_CHILDREN]
+        tables += [(backend.archive_table(table), "id") for table in self._STUDENT_CHILDREN]
+        tables.append(("attendance_monthly", "student_id"))
+        report = {table: 0 for table, _ in tables}
+        start = time.perf_counter()
+        batches = 0
+        conn = get_connection()
+        try:
+            c = conn.cursor()
+            before = backend.used_bytes(c, list(report))
+            for table, key in tables:
+                last = 0
+                while max_batches is None or batches < max_batches:
+                    c.execute(*backend.limit(
+                        f"SELECT DISTINCT t.{key} FROM {table} t WHERE t.{key} > ? AND NOT EXISTS "
+                        f"(SELECT 1 FROM students s WHERE s.id = t.student_id) ORDER BY t.{key}",
+                        [last], batch_size))
+                    keys = [r[0] for r in c.fetchall()]
+                    if not keys:
+                        break
+                    conn.begin()
+                    for part_start in range(0, len(keys), 500):
+                        part = keys[part_start:part_start + 500]
+                        c.execute(f"DELETE FROM {table} WHERE {key} IN ({','.join('?' * len(part))})", part)
+                        report[table] += c.rowcount
+                    conn.commit()
+                    last = keys[-1]
+                    batches += 1
+                    if pause:
+                        time.sleep(pause)
+            after = backend.used_bytes(c, list(report))
+        finally:
+            conn.close()
+        report["rows"] = sum(report[table] for table, _ in tables)
+        report["bytes_reclaimed"] = before - after if before is not None and after is not None else None
+        report["seconds"] = time.perf_counter() - start
+        return report
+
+    # TEACHERS
+    def add_teacher(self, t: Teacher):
+        conn = get_connection()
+        c = conn.cursor()
+        t.id = backend.insert(c, "teachers", ("name", "subject"), (t.name, t.subject))
+        self._written(c, "teachers", lambda cache: cache.put((t.id, t.name, t.subject)))
+        conn.close()
+        return t.id
+
+    def view_teachers(self, page_size=None, after_id=None):
+        cache = self._cached("teachers", "view_teachers")
+        if cache is not None:
+            with cache.lock:
+                return cache.page(page_size, after_id)
+        conn = get_connection()
+        c = conn.cursor()
+        if page_size is None:
+            c.execute("SELECT id, name, subject FROM teachers ORDER BY id")
+        else:
+            c.execute(*backend.limit("SELECT id, name, subject FROM teachers WHERE id > ? ORDER BY id",
+                                     [int(after_id or 0)], page_size))
+        data = c.fetchall()
+        conn.close()
+        return data
+
+    def get_teacher(self, tid):
+        cache = self._cached("teachers", "get_teacher")
+        if cache is not None:
+            with cache.lock:
+                return cache.get(int(tid))
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT id, name, subject FROM teachers WHERE id=?", (int(tid),))
+        row = c.fetchone()
+        conn.close()
+        return row
+
+    def update_teacher(self, tid, name, subject):
+        tid = int(tid)
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("UPDATE teachers SET name=?, subject=? WHERE id=?", (name, subject, tid))
+        self._written(c, "teachers", lambda cache: cache.put((tid, name, subject)))
+        conn.close()
+
+    def delete_teacher(self, tid):
+        tid = int(tid)
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("DELETE FROM teachers WHERE id=?", (tid,))
+        deleted = c.rowcount
+        self._written(c, "teachers", lambda cache: cache.remove(tid))
+        conn.close()
+        return deleted
+
+    # ATTENDANCE
+    # attendance_monthly (student, yyyymm) and attendance_daily_grade (grade, day)
+    # hold present/total counts. Every write to attendance adjusts them in the same
+    # transaction, so reports read a few rows per month or day instead of every mark;
+    # rebuild_attendance_rollups() recomputes both from scratch.
+    def add_attendance(self, rec: AttendanceRecord):
+        self._check_hot([rec.date])
+        with self.transaction():
+            c = get_connection().cursor()
+            c.execute("INSERT INTO attendance(student_id, date, present) VALUES(?,?,?)",
+                      (rec.student_id, rec.date, int(rec.present)))
+            grade = self._grades_of(c, [rec.student_id]).get(rec.student_id)
+            self._apply_rollup_deltas(c, *self._rollup_deltas(added=[(rec.student_id, rec.date, rec.present, grade)]))
+
+    def add_attendance_bulk(self, records):
+        # one connection, one transaction, one executemany for the whole batch.
+        # A student can only be marked once per day, so re-submitting a roster
+        # replaces the earlier marks for those students and dates.
+        # records is an iterable of AttendanceRecord or an AttendanceBatch.
+        if isinstance(records, AttendanceBatch):
+            latest = {(sid, date): present for sid, date, present in records}
+        else:
+            latest = {(r.student_id, r.date): int(r.present) for r in records}
+        if not latest:
+            return 0
+        self._check_hot({date for _, date in latest})
+        rows = [(sid, date, present) for (sid, date), present in latest.items()]
+        with self.transaction():
+            c = get_connection().cursor()
+            grades = self._grades_of(c, {sid for sid, _ in latest})
+            replaced = self._existing_marks(c, latest)
+            if hasattr(c, "fast_executemany"):
+                c.fast_executemany = True
+            c.executemany("DELETE FROM attendance WHERE student_id=? AND date=?", list(latest))
+            c.executemany("INSERT INTO attendance(student_id, date, present) VALUES(?,?,?)", rows)
+            self._apply_rollup_deltas(c, *self._rollup_deltas(
+                [(sid, date, present, grades.get(sid)) for sid, date, present in replaced],
+                [(sid, date, present, grades.get(sid)) for sid, date, present in rows]))
+        return len(rows)
+
+    @staticmethod
+    def _grades_of(c, student_ids, chunk_size=500):
+        ids = list(student_ids)
+        grades = {}
+        for start in range(0, len(ids), chunk_size):
+            part = ids[start:start + chunk_size]
+            c.execute(f"SELECT id, grade FROM students WHERE id IN ({','.join('?' * len(part))})", part)
+            grades.update(c.fetchall())
+        return grades
+
+    @staticmethod
+    def _existing_marks(c, keys, chunk_size=500):
+        # the (student_id, date, present) rows already stored for these (student_id, date) keys
+        by_date = defaultdict(list)
+        for sid, date in keys:
+            by_date[date].append(sid)
+        found = []
+        for date, sids in by_date.items():
+            for start in range(0, len(sids), chunk_size):
+                part = sids[start:start + chunk_size]
+                c.execute("SELECT student_id, date, present FROM attendance WHERE date = ? "
+                          f"AND student_id IN ({','.join('?' * len(part))})", [date] + part)
+                found.extend(c.fetchall())
+        return found
+
+    @staticmethod
+    def _rollup_deltas(removed=(), added=()):
+        # (student_id, date, present, grade) marks -> count changes for both rollups
+        monthly = {}
+        daily = {}
+        for marks, sign in ((removed, -1), (added, 1)):
+            for sid, date, present, grade in marks:
+                date = parse_date(date)
+                present = sign if present else 0
+                for deltas, key in ((monthly, (sid, date.year * 100 + date.month)), (daily, (grade or "", date))):
+                    counts = deltas.setdefault(key, [0, 0])
+                    counts[0] += present
+                    counts[1] += sign
+        return monthly, daily
+
+    @staticmethod
+    def _apply_rollup_deltas(c, monthly, daily):
+        for table, keys, deltas in (("attendance_monthly", ("student_id", "month"), monthly),
+                                    ("attendance_daily_grade", ("grade", "date"), daily)):
+            rows = [key + tuple(counts) for key, counts in deltas.items() if counts != [0, 0]]
+            if not rows:
+                continue
+            backend.add_counts(c, table, keys, rows)
+            emptied = [key for key, counts in deltas.items() if counts[1] < 0]
+            if emptied:
+                c.executemany(f"DELETE FROM {table} WHERE {keys[0]}=? AND {keys[1]}=? AND total <= 0", emptied)
+
+    def rebuild_attendance_rollups(self):
+        with self.transaction():
+            backend.rebuild_attendance_rollups(get_connection().cursor())
+
+    def archive_year(self, year, batch_size=5000, pause=0.05, max_batches=None):
+        """Move a closed academic year (and anything older) into the archive tables.
+
+        Like sweep_orphans this goes through each table in id order, one short
+        transactions per batch: copy the batch to the archive table, skipping rows
+        already there, commit, then delete from the hot table the rows the archive
+        now holds. Progress is kept in
+        archive_log, so an interrupted run (or max_batches) is finished by calling
+        again, and re-copying a batch after a crash is harmless. Once every table
+        is done, reads that do not ask for the archive start at the next year;
+        the attendance rollups keep counting archived marks.
+        """
+        year = int(year)
+        if year >= academic_year():
+            raise ValueError(f"academic year {year} is not over yet")
+        end = academic_year_bounds(year)[1]
+        report = {table: 0 for table in self._STUDENT_CHILDREN}
+        start = time.perf_counter()
+        batches = 0
+        conn = get_connection()
+        try:
+            c = conn.cursor()
+            c.execute("SELECT table_name, finished_at FROM archive_log WHERE academic_year=?", (year,))
+            logged = dict(c.fetchall())
+            for table in self._STUDENT_CHILDREN:
+                if logged.get(table) is not None:
+                    continue
+                if table not in logged:
+                    c.execute("INSERT INTO archive_log(academic_year, table_name, rows_moved) VALUES(?,?,0)",
+                              (year, table))
+                rows = self._ARCHIVE_ROWS[table]
+                param = year if table == "performance" else end
+                columns = ", ".join(self._ARCHIVE_COLUMNS[table])
+                archive = backend.archive_table(table)
+                while True:
+                    if max_batches is not None and batches >= max_batches:
+                        break
+                    c.execute(*backend.limit(f"SELECT id FROM {table} WHERE {rows} ORDER BY id",
+                                             [param], batch_size))
+                    ids = [r[0] for r in c.fetchall()]
+                    if not ids:
+                        # a row copied but then no longer due to move (a fee marked
+                        # unpaid again) stays hot; drop its copy
+                        c.execute(f"DELETE FROM {archive} WHERE id IN (SELECT id FROM {table})")
+                        c.execute("UPDATE archive_log SET finished_at=? WHERE academic_year=? AND table_name=?",
+                                  (datetime.datetime.now().isoformat(timespec="seconds"), year, table))
+                        break
+                    batch = [ids[0], ids[-1], param]
+                    # the copy commits on its own first: a transaction spanning two
+                    # files is not atomic (SQLite in WAL mode), so rows only leave
+                    # the hot table once the archive holds them
+                    conn.begin()
+                    c.execute(f"INSERT INTO {archive}({columns}) SELECT {columns} FROM {table} t "
+                              f"WHERE id BETWEEN ? AND ? AND {rows} "
+                              f"AND NOT EXISTS (SELECT 1 FROM {archive} x WHERE x.id = t.id)", batch)
+                    conn.commit()
+                    conn.begin()
+                    c.execute(f"DELETE FROM {table} WHERE id BETWEEN ? AND ? AND {rows} "
+                              f"AND EXISTS (SELECT 1 FROM {archive} x WHERE x.id = {table}.id)", batch)
+                    moved = c.rowcount
+                    c.execute("UPDATE archive_log SET rows_moved = rows_moved + ? "
+                              "WHERE academic_year=? AND table_name=?", (moved, year, table))
+                    conn.commit()
+                    report[table] += moved
+                    batches += 1
+                    if pause:
+                        time.sleep(pause)
+            c.execute("SELECT COUNT(*) FROM archive_log WHERE academic_year=? AND finished_at IS NOT NULL", (year,))
+            report["done"] = c.fetchone()[0] == len(self._STUDENT_CHILDREN)
+        finally:
+            conn.close()
+        self._hot_start = (None, None)
+        report["rows"] = sum(report[t] for t in self._STUDENT_CHILDREN)
+        report["seconds"] = time.perf_counter() - start
+        return report
+
+    def grade_attendance(self, grade=None, start_date=None, end_date=None, daily=False):
+        # per-grade attendance from the daily rollup: [(grade, present, total, percentage)],
+        # or with daily=True [(grade, date, present, total, percentage)] by day
+        where = []
+        params = []
+        hot_start = None if self.include_archive else self.hot_start()
+        if hot_start is not None:
+            where.append("date >= ?")
+            params.append(hot_start)
+        if grade is not None:
+            where.append("grade = ?")
+            params.append(grade)
+        if start_date is not None:
+            where.append("date >= ?")
+            params.append(parse_date(start_date))
+        if end_date is not None:
+            where.append("date <= ?")
+            params.append(parse_date(end_date))
+        where = " WHERE " + " AND ".join(where) if where else ""
+        conn = get_connection()
+        c = conn.cursor()
+        if daily:
+            c.execute("SELECT grade, date, present, total FROM attendance_daily_grade" + where +
+                      " ORDER BY grade, date", params)
+        else:
+            c.execute("SELECT grade, SUM(present), SUM(total) FROM attendance_daily_grade" + where +
+                      " GROUP BY grade ORDER BY grade", params)
+        data = c.fetchall()
+        conn.close()
+        return [row + (row[-2] / row[-1] * 100.0 if row[-1] else 0.0,) for row in data]
+
+    def load_attendance(self, start_date=None, end_date=None, grade=None, batch_size=10000):
+        # marks for a period (optionally one grade) streamed into an AttendanceBatch
+        sql = f"SELECT a.student_id, a.date, a.present FROM {self._source('attendance', 'a')}"
+        where = []
+        params = []
+        if grade is not None:
+            sql += " JOIN students s ON s.id = a.student_id"
+            where.append("s.grade = ?")
+            params.append(grade)
+        if start_date is not None:
+            where.append("a.date >= ?")
+            params.append(parse_date(start_date))
+        if end_date is not None:
+            where.append("a.date <= ?")
+            params.append(parse_date(end_date))
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        batch = AttendanceBatch()
+        conn = get_connection()
+        try:
+            c = conn.cursor()
+            c.execute(sql, params)
+            while True:
+                rows = c.fetchmany(batch_size)
+                if not rows:
+                    break
+                batch.extend(rows)
+        finally:
+            conn.close()
+        return batch
+
+    def view_attendance_for_student(self, student_id):
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute(f"SELECT id, student_id, date, present FROM {self._source('attendance')} "
+                  "WHERE student_id=? ORDER BY date", (int(student_id),))
+        data = c.fetchall()
+        conn.close()
+        return data
+
+    def attendance_percentage(self, student_id):
+        # one rollup row per month of history
+        since = self._hot_month()
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT SUM(total), SUM(present) FROM attendance_monthly WHERE student_id=? AND month >= ?",
+                  (int(student_id), since))
+        total, present = c.fetchone()
+        conn.close()
+        if not total:
+            return 0.0
+        return present / total * 100.0
+
+    def _hot_month(self):
+        # smallest attendance_monthly key this School reads
+        start = None if self.include_archive else self.hot_start()
+        return start.year * 100 + start.month if start is not None else 0
+
+    def attendance_stats(self, grade=None, start_date=None, end_date=None):
+        # returns [(student_id, name, grade, total, present, percentage)] for every
+        # student (optionally one grade / date range) from a single grouped query;
+        # all-time stats come from the monthly rollup, date ranges from the marks
+        if start_date is None and end_date is None:
+            sql = ("SELECT s.id, s.name, s.grade, COALESCE(SUM(m.total), 0), COALESCE(SUM(m.present), 0) "
+                   "FROM students s LEFT JOIN attendance_monthly m ON m.student_id = s.id AND m.month >= ?")
+            params = [self._hot_month()]
+            if grade is not None:
+                sql += " WHERE s.grade = ?"
+                params.append(grade)
+            conn = get_connection()
+            c = conn.cursor()
+            c.execute(sql + " GROUP BY s.id, s.name, s.grade ORDER BY s.id", params)
+            data = c.fetchall()
+            conn.close()
+            return [(sid, name, g, total, present, present / total * 100.0 if total else 0.0)
+                    for sid, name, g, total, present in data]
+        join = ""
+        where = ""
+        params = []
+        if start_date is not None:
+            join += " AND a.date >= ?"
+            params.append(parse_date(start_date))
+        if end_date is not None:
+            join += " AND a.date <= ?"
+            params.append(parse_date(end_date))
+        if grade is not None:
+            where = " WHERE s.grade = ?"
+            params.append(grade)
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT s.id, s.name, s.grade, COUNT(a.id), "
+                  "COALESCE(SUM(CASE WHEN a.present=1 THEN 1 ELSE 0 END), 0) "
+                  f"FROM students s LEFT JOIN {self._source('attendance', 'a')} ON a.student_id = s.id" + join + where +
+                  " GROUP BY s.id, s.name, s.grade ORDER BY s.id", params)
+        data = c.fetchall()
+        conn.close()
+        return [(sid, name, g, total, present, present / total * 100.0 if total else 0.0)
+                for sid, name, g, total, present in data]
+
+    # PROFILE
+    def student_profile(self, student_id, as_of=None):
+        # everything the Attendance, Fees and Performance tabs show for one student,
+        # from one connection and one round trip; None if there is no such student
+        return self.student_profiles([student_id], as_of).get(int(student_id))
+
+    def student_profiles(self, student_ids, as_of=None, chunk_size=500):
+        # {student_id: profile} for many students, four IN-list queries per chunk
+        # (4 x 500 parameters stays under SQL Server's 2100 per batch)
+        ids = sorted({int(sid) for sid in student_ids})
+        profiles = {}
+        conn = get_connection()
+        try:
+            c = conn.cursor()
+            for start in range(0, len(ids), chunk_size):
+                part = ids[start:start + chunk_size]
+                marks = ",".join("?" * len(part))
+                students, attendance, fees, performance = backend.select_many(c, [
+                    (f"SELECT id, name, age, grade FROM students WHERE id IN ({marks})", part),
+                    (f"SELECT id, student_id, date, present FROM {self._source('attendance')} "
+                     f"WHERE student_id IN ({marks}) ORDER BY student_id, date", part),
+                    (f"SELECT id, student_id, amount, paid, due_date FROM {self._source('fees')} "
+                     f"WHERE student_id IN ({marks}) ORDER BY student_id, id", part),
+                    (f"SELECT id, student_id, subject, marks FROM {self._source('performance')} "
+                     f"WHERE student_id IN ({marks}) ORDER BY student_id, id", part),
+                ])
+                children = []
+                for rows in (attendance, fees, performance):
+                    by_student = defaultdict(list)
+                    for row in rows:
+                        by_student[row[1]].append(row)
+                    children.append(by_student)
+                for row in students:
+                    profiles[row[0]] = build_profile(row, *(group.get(row[0], []) for group in children), as_of)
+        finally:
+            conn.close()
+        return profiles
+
+    # FEES
+    def add_fee(self, fee: FeeRecord):
+        self._check_hot([fee.due_date])
+        conn = get_connection()
+        c = conn.cursor()
+        fee.id = backend.insert(c, "fees", ("student_id", "amount", "paid", "due_date"),
+                                (fee.student_id, fee.amount, int(fee.paid), fee.due_date))
+        conn.close()
+        return fee.id
+
+    def add_fees_bulk(self, fees):
+        # FeeRecords or a FeeBatch (e.g. a term's fees for a whole grade) in one transaction
+        rows = [(sid, amount, int(paid), due) for sid, amount, paid, due in
+                (fees if isinstance(fees, FeeBatch) else FeeBatch(fees))]
+        if not rows:
+            return 0
+        self._check_hot({row[3] for row in rows})
+        with self.transaction():
+            c = get_connection().cursor()
+            if hasattr(c, "fast_executemany"):
+                c.fast_executemany = True
+            c.executemany("INSERT INTO fees(student_id, amount, paid, due_date) VALUES(?,?,?,?)", rows)
+        return len(rows)
+
+    def view_fees_for_student(self, student_id):
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute(f"SELECT id, student_id, amount, paid, due_date FROM {self._source('fees')} WHERE student_id=?",
+                  (int(student_id),))
+        data = c.fetchall()
+        conn.close()
+        return data
+
+    def set_fee_paid(self, fee_id, paid=True):
+        self.set_fee_paid_many([fee_id], paid)
+
+    def set_fee_paid_many(self, fee_ids, paid=True):
+        # returns how many fees matched; one UPDATE per 500 ids
+        ids = [int(fid) for fid in fee_ids]
+        if not ids:
+            return 0
+        updated = 0
+        with self.transaction():
+            c = get_connection().cursor()
+            for start in range(0, len(ids), 500):
+                part = ids[start:start + 500]
+                c.execute(f"UPDATE fees SET paid=? WHERE id IN ({','.join('?' * len(part))})",
+                          [int(bool(paid))] + part)
+                updated += c.rowcount
+        return updated
+
+    def overdue_fees(self, as_of=None, grade=None, limit=None):
+        # [(fee_id, student_id, name, grade, amount, due_date)], oldest first; seeks ix_fees_paid_due
+        sql = ("SELECT f.id, f.student_id, s.name, s.grade, f.amount, f.due_date "
+               "FROM fees f JOIN students s ON s.id = f.student_id "
+               "WHERE f.paid = 0 AND f.due_date < ?")
+        params = [as_of or datetime.date.today()]
+        if grade is not None:
+            sql += " AND s.grade = ?"
+            params.append(grade)
+        sql += " ORDER BY f.due_date, f.id"
+        if limit is not None:
+            sql, params = backend.limit(sql, params, limit)
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute(sql, params)
+        data = c.fetchall()
+        conn.close()
+        return data
+
+    def outstanding_balance_by_student(self):
+        # [(student_id, unpaid total, unpaid fee count, earliest due date)], largest balance first
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT student_id, SUM(amount), COUNT(*), MIN(due_date) FROM fees WHERE paid = 0 "
+                  "GROUP BY student_id ORDER BY SUM(amount) DESC, student_id")
+        data = c.fetchall()
+        conn.close()
+        return data
+
+    def fee_summary(self, as_of=None):
+        # ledger totals for the Fees dashboard, from one aggregate over the unpaid index
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT COUNT(*), COALESCE(SUM(amount), 0), "
+                  "COALESCE(SUM(CASE WHEN due_date < ? THEN 1 ELSE 0 END), 0), "
+                  "COALESCE(SUM(CASE WHEN due_date < ? THEN amount ELSE 0 END), 0), "
+                  "COUNT(DISTINCT student_id) "
+                  "FROM fees WHERE paid = 0", (as_of or datetime.date.today(),) * 2)
+        unpaid, unpaid_total, overdue, overdue_total, students = c.fetchone()
+        conn.close()
+        return {"unpaid": unpaid, "unpaid_total": unpaid_total, "overdue": overdue,
+                "overdue_total": overdue_total, "students_owing": students}
+
+    # IMPORT
+    def import_csv(self, kind, path, batch_size=1000, progress=None, max_errors=1000):
+        """Stream a CSV file of students, fees or performance rows into the database.
+
+        Rows are validated one at a time and inserted in batches of batch_size,
+        each batch in its own transaction. A row that fails validation or
+        insertion is recorded in the result and the import carries on.
+        progress(fraction, result) is called after every batch.
+        """
+        columns, build, insert_sql, params = IMPORT_SPECS[kind]
+        source = CsvSource(path)
+        result = ImportResult(kind, max_errors)
+        start = time.perf_counter()
+        batch = []
+        try:
+            for line_no, row in source.rows(columns):
+                result.rows_read += 1
+                try:
+                    batch.append((line_no, params(build(row))))
+                except Exception as e:
+                    result.error(line_no, str(e))
+                if len(batch) >= batch_size:
+                    self._import_batch(kind, insert_sql, batch, result)
+                    batch = []
+                    if progress is not None:
+                        progress(source.fraction, result)
+            if batch:
+                self._import_batch(kind, insert_sql, batch, result)
+        finally:
+            result.seconds = time.perf_counter() - start
+        if progress is not None:
+            progress(1.0, result)
+        return result
+
+    def _import_batch(self, kind, insert_sql, batch, result):
+        try:
+            with self.transaction():
+                c = get_connection().cursor()
+                if hasattr(c, "fast_executemany"):
+                    c.fast_executemany = True
+                c.executemany(insert_sql, [p for _, p in batch])
+                if kind in self._VERSIONED:
+                    backend.bump_version(c, kind)
+            result.inserted += len(batch)
+        except Exception:
+            # find the offending rows: one savepoint per row inside one transaction
+            with self.transaction():
+                c = get_connection().cursor()
+                for line_no, p in batch:
+                    try:
+                        with self.transaction():
+                            c.execute(insert_sql, p)
+                        result.inserted += 1
+                    except Exception as e:
+                        result.error(line_no, str(e))
+                if kind in self._VERSIONED:
+                    backend.bump_version(c, kind)
+        cache = self._caches.get(kind)
+        if cache is not None:
+            cache.invalidate()
+
+    # EXPORT
+    def export_performance_csv(self, path, shard_by_grade=False, compress=False, batch_size=5000,
+                               progress=None):
+        """Write every student's performance rows to CSV in one streaming pass.
+
+        One ordered query feeds fetchmany() batches straight to the writer, so
+        memory use does not grow with the school. With shard_by_grade each class
+        grade goes to its own file (path_grade-<g>.csv, path_ungraded.csv for
+        students without one; see _shard_path); compress gzips the output.
+        Returns (rows_written, [file paths]).
+        """
+        import csv
+
+        header = ["Student ID", "Name", "Class", "Subject", "Marks", "Grade"]
+        files = []
+        rows_written = 0
+        out = writer = None
+        current = object()
+        shard_names = set()
+        conn = get_connection()
+        try:
+            c = conn.cursor()
+            c.execute("SELECT s.grade, s.id, s.name, p.subject, p.marks "
+                      f"FROM {self._source('performance', 'p')} JOIN students s ON s.id = p.student_id "
+                      "ORDER BY s.grade, s.id, p.subject")
+            while True:
+                rows = c.fetchmany(batch_size)
+                if not rows:
+                    break
+                letters = DEFAULT_GRADE_SCALE.grade_many([r[4] for r in rows])
+                for row, letter in zip(rows, letters):
+                    if writer is None or (shard_by_grade and row[0] != current):
+                        if out is not None:
+                            out.close()
+                        current = row[0]
+                        target = _shard_path(path, current, shard_names) if shard_by_grade else path
+                        out = _open_export(target, compress)
+                        files.append(out.name)
+                        writer = csv.writer(out)
+                        writer.writerow(header)
+                    writer.writerow([row[1], row[2], row[0], row[3], row[4], letter])
+                rows_written += len(rows)
+                if progress is not None:
+                    progress(rows_written)
+        finally:
+            conn.close()
+            if out is not None:
+                out.close()
+        if not files:
+            out = _open_export(path, compress)
+            csv.writer(out).writerow(header)
+            out.close()
+            files.append(out.name)
+        return rows_written, files
+
+    # PERFORMANCE
+    def add_performance(self, p: Performance):
+        if p.academic_year is None:
+            p.academic_year = academic_year()
+        self._check_hot([academic_year_bounds(p.academic_year)[0]])
+        conn = get_connection()
+        c = conn.cursor()
+        p.id = backend.insert(c, "performance", ("student_id", "subject", "marks", "academic_year"),
+                              (p.student_id, p.subject, p.marks, p.academic_year))
+        conn.close()
+        return p.id
+
+    def view_performance_for_student(self, student_id):
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute(f"SELECT id, student_id, subject, marks FROM {self._source('performance')} WHERE student_id=?",
+                  (int(student_id),))
+        data = c.fetchall()
+        conn.close()
+        return data
+
+    def generate_performance_report(self, student_id):
+        # returns list of (subject, marks, grade)
+        rows = self.view_performance_for_student(student_id)
+        letters = DEFAULT_GRADE_SCALE.grade_many([r[3] for r in rows])
+        return [(r[2], r[3], letter) for r, letter in zip(rows, letters)]
+
+    def performance_analytics(self, grade=None, subject=None, scale=DEFAULT_GRADE_SCALE, batch_size=10000):
+        # one query into parallel columns, then class_performance_analytics
+        sql = ("SELECT s.grade, p.student_id, p.subject, p.marks "
+               f"FROM {self._source('performance', 'p')} JOIN students s ON s.id = p.student_id")
+        where = []
+        params = []
+        if grade is not None:
+            where.append("s.grade = ?")
+            params.append(grade)
+        if subject is not None:
+            where.append("p.subject = ?")
+            params.append(subject)
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        grades, subjects = [], []
+        student_ids, marks = array("q"), array("d")
+        conn = get_connection()
+        try:
+            c = conn.cursor()
+            c.execute(sql, params)
+            while True:
+                rows = c.fetchmany(batch_size)
+                if not rows:
+                    break
+                for g, sid, subj, m in rows:
+                    grades.append(g)
+                    student_ids.append(sid)
+                    subjects.append(subj)
+                    marks.append(m)
+        finally:
+            conn.close()
+        return class_performance_analytics(grades, student_ids, subjects, marks, scale)
+
+school = School(cache=True)
+
+
+class AsyncSchool:
+    """Awaitable School: await aschool.view_fees_for_student(sid) and so on.
+
+    pyodbc has no async API, so each call runs on a bounded thread pool sharing
+    the module connection pool. At most max_pending calls are admitted at once;
+    callers beyond that wait for a slot (backpressure) and every call, queueing
+    included, gives up with asyncio.TimeoutError after timeout seconds. A timed
+    out call is abandoned, not interrupted: its thread finishes the statement.
+    """
+
+    def __init__(self, school, max_workers=8, max_pending=64, timeout=30.0):
+        self.school = school
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="aschool")
+        self._slots = asyncio.Semaphore(max_pending)
+        self.calls = 0
+        self.timeouts = 0
+
+    def __getattr__(self, name):
+        method = getattr(self.school, name)
+        if name.startswith("_") or name == "transaction" or not callable(method):
+            raise AttributeError(name)
+
+        async def call(*args, timeout=None, **kwargs):
+            return await self.call(method, *args, timeout=timeout, **kwargs)
+        call.__name__ = name
+        return call
+
+    async def call(self, fn, *args, timeout=None, **kwargs):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + (self.timeout if timeout is None else timeout)
+        self.calls += 1
+        try:
+            await asyncio.wait_for(self._slots.acquire(), deadline - loop.time())
+            try:
+                return await asyncio.wait_for(
+                    loop.run_in_executor(self._executor, lambda: fn(*args, **kwargs)), deadline - loop.time())
+            finally:
+                self._slots.release()
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            raise
+
+    async def in_transaction(self, fn, *args, timeout=None):
+        # fn(school, *args) runs on one worker thread inside school.transaction()
+        def run():
+            with self.school.transaction():
+                return fn(self.school, *args)
+        return await self.call(run, timeout=timeout)
+
+    async def student_overview(self, sid, timeout=None):
+        # the four per-student reads run concurrently on separate connections
+        student, attendance, fees, report = await asyncio.gather(
+            self.get_student(sid, timeout=timeout),
+            self.attendance_percentage(sid, timeout=timeout),
+            self.view_fees_for_student(sid, timeout=timeout),
+            self.generate_performance_report(sid, timeout=timeout))
+        return {"student": student, "attendance_percentage": attendance, "fees": fees, "report": report}
+
+    def stats(self):
+        return {"calls": self.calls, "timeouts": self.timeouts}
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+
+
+# HTTP API
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+def _records(columns, rows):
+    return [dict(zip(columns, row)) for row in rows]
+
+
+def _body_field(body, name, default=...):
+    if not isinstance(body, dict):
+        raise ApiError(400, "expected a JSON object")
+    if name in body:
+        return body[name]
+    if default is ...:
+        raise ApiError(400, f"missing field '{name}'")
+    return default
+
+
+class SchoolApi:
+    """JSON over HTTP/1.1 for School, for staff terminals and the parent portal.
+
+    Every request needs "Authorization: Bearer <token>" with the token the API
+    was started with (401 otherwise). The portal is read-only: PUT, POST and
+    DELETE routes answer 403 unless the API was started with writes=True, and
+    POST /batch then only runs GETs.
+    asyncio handles the sockets; School calls go through an AsyncSchool, whose
+    bounded workers and pending limit cap database load, and a request that
+    cannot be served within timeout gets a 503.
+    Identical GETs in flight at the same time share one database call. GETs of
+    students/teachers carry an ETag built from table_versions, so a conditional
+    GET that matches costs one version lookup and returns 304; other GETs get an
+    ETag hashed from the body. POST /batch runs many requests in one round trip
+    (and one transaction when "atomic" is set). Per-student and report GETs read
+    only the hot academic years unless ?history=1 is given.
+    """
+
+    STATUS = {200: "OK", 201: "Created", 304: "Not Modified", 400: "Bad Request", 401: "Unauthorized",
+              403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed", 409: "Conflict", 413: "Payload Too Large",
+              500: "Internal Server Error", 503: "Service Unavailable"}
+    STUDENT = ("id", "name", "age", "grade")
+    TEACHER = ("id", "name", "subject")
+
+    def __init__(self, school, token, writes=False, max_workers=8, page_size=100, max_page_size=1000,
+                 max_body=8 << 20, max_batch=100, max_pending=256, timeout=30.0):
+        import re
+
+        if not token:
+            raise ValueError("the API needs a token")
+        self.school = school
+        self.token = str(token)
+        self.writes = writes
+        self.history = school.with_archive()
+        self.page_size = page_size
+        self.max_page_size = max_page_size
+        self.max_body = max_body
+        self.max_batch = max_batch
+        self.aschool = AsyncSchool(school, max_workers, max_pending, timeout)
+        self._inflight = {}
+        self.requests = 0
+        self.not_modified = 0
+        self.coalesced = 0
+        # (method, path pattern, handler, versioned table, success status)
+        self._routes = [(method, re.compile(pattern), handler, table, status) for method, pattern, handler, table, status in (
+            ("GET", r"/health", self.health, None, 200),
+            ("GET", r"/stats", self.query_stats, None, 200),
+            ("GET", r"/students", self.list_students, "students", 200),
+            ("POST", r"/students", self.create_student, None, 201),
+            ("GET", r"/students/(\d+)", self.get_student, "students", 200),
+            ("PUT", r"/students/(\d+)", self.update_student, None, 200),
+            ("DELETE", r"/students/(\d+)", self.delete_student, None, 200),
+            ("GET", r"/students/(\d+)/attendance", self.student_attendance, None, 200),
+            ("GET", r"/students/(\d+)/fees", self.student_fees, None, 200),
+            ("GET", r"/students/(\d+)/performance", self.student_performance, None, 200),
+            ("GET", r"/students/(\d+)/profile", self.student_profile, None, 200),
+            ("GET", r"/profiles", self.student_profiles, None, 200),
+            ("GET", r"/teachers", self.list_teachers, "teachers", 200),
+            ("POST", r"/teachers", self.create_teacher, None, 201),
+            ("GET", r"/teachers/(\d+)", self.get_teacher, "teachers", 200),
+            ("PUT", r"/teachers/(\d+)", self.update_teacher, None, 200),
+            ("DELETE", r"/teachers/(\d+)", self.delete_teacher, None, 200),
+            ("POST", r"/attendance", self.mark_attendance, None, 201),
+            ("GET", r"/attendance/stats", self.attendance_stats, None, 200),
+            ("GET", r"/attendance/grades", self.grade_attendance, None, 200),
+            ("POST", r"/fees", self.create_fee, None, 201),
+            ("POST", r"/fees/paid", self.pay_fees, None, 200),
+            ("GET", r"/fees/overdue", self.overdue_fees, None, 200),
+            ("GET", r"/fees/outstanding", self.outstanding_fees, None, 200),
+            ("GET", r"/fees/summary", self.fee_summary, None, 200),
+            ("POST", r"/performance", self.create_performance, None, 201),
+            ("GET", r"/performance/analytics", self.performance_analytics, None, 200),
+        )]
+
+    # dispatch; runs on an executor thread
+    def dispatch(self, method, path, query, body, if_none_match=None):
+        """Returns (status, payload, etag); payload is None for 304."""
+        allowed = False
+        for route_method, pattern, handler, table, status in self._routes:
+            match = pattern.fullmatch(path)
+            if match is None:
+                continue
+            allowed = True
+            if route_method != method:
+                continue
+            if method != "GET" and not self.writes:
+                raise ApiError(403, "this API is read-only")
+            etag = None
+            if table is not None:
+                etag = f'W/"{table}-{self.school.table_version(table)}"'
+                if etag == if_none_match:
+                    return 304, None, etag
+            return status, handler(query, body, *match.groups()), etag
+        raise ApiError(405 if allowed else 404, f"no route for {method} {path}")
+
+    def dispatch_batch(self, body):
+        requests = _body_field(body, "requests")
+        if not isinstance(requests, list) or len(requests) > self.max_batch:
+            raise ApiError(400, f"'requests' must be a list of at most {self.max_batch}")
+        atomic = bool(_body_field(body, "atomic", False))
+        responses = []
+        if atomic:
+            # any failure rolls the whole batch back and fails the request
+            with self.school.transaction():
+                for request in requests:
+                    responses.append(self._batch_one(request))
+            return responses
+        for request in requests:
+            try:
+                responses.append(self._batch_one(request))
+            except Exception as e:
+                status, message = self._error(e)
+                responses.append({"status": status, "body": {"error": message}})
+        return responses
+
+    def _batch_one(self, request):
+        from urllib.parse import urlsplit
+
+        method = str(_body_field(request, "method", "GET")).upper()
+        url = urlsplit(str(_body_field(request, "path")))
+        status, payload, _ = self.dispatch(method, url.path, _query(url.query), request.get("body"))
+        return {"status": status, "body": payload}
+
+    @staticmethod
+    def _error(e):
+        if isinstance(e, ApiError):
+            return e.status, str(e)
+        if isinstance(e, (PoolTimeout, asyncio.TimeoutError)):
+            return 503, "database busy, retry later"
+        if type(e).__name__ == "IntegrityError":
+            return 409, str(e)
+        if isinstance(e, (ValueError, TypeError, KeyError)):
+            return 400, str(e)
+        return 500, type(e).__name__
+
+    def _page(self, query):
+        try:
+            limit = int(query.get("limit", self.page_size))
+            after_id = int(query.get("after_id", 0))
+        except ValueError:
+            raise ApiError(400, "limit and after_id must be integers")
+        return max(1, min(limit, self.max_page_size)), after_id
+
+    @staticmethod
+    def _paged(columns, rows, limit):
+        items = _records(columns, rows)
+        return {"items": items, "next_after_id": items[-1]["id"] if len(items) == limit else None}
+
+    def _reader(self, query):
+        return self.history if parse_bool(query.get("history", "")) else self.school
+
+    def _found(self, columns, row, what):
+        if row is None:
+            raise ApiError(404, f"{what} not found")
+        return dict(zip(columns, row))
+
+    # handlers
+    def health(self, query, body):
+        return {"pool": pool.stats(), "calls": self.aschool.stats(), "requests": self.requests, "not_modified": self.not_modified,
+                "coalesced": self.coalesced}
+
+    def query_stats(self, query, body):
+        return query_stats.snapshot()
+
+    def list_students(self, query, body):
+        limit, after_id = self._page(query)
+        if "q" in query or "grade" in query:
+            rows = self.school.search_students(query.get("q") or None, query.get("grade"), limit=limit)
+            return {"items": _records(self.STUDENT, rows), "next_after_id": None}
+        return self._paged(self.STUDENT, self.school.view_students(limit, after_id), limit)
+
+    def create_student(self, query, body):
+        s = Student(_body_field(body, "name"), _body_field(body, "age"), _body_field(body, "grade"))
+        fee = _body_field(body, "admission_fee", None)
+        sid = self.school.enroll_student(s, None if fee is None else float(fee), _body_field(body, "fee_due", None))
+        return {"id": sid}
+
+    def get_student(self, query, body, sid):
+        return self._found(self.STUDENT, self.school.get_student(sid), "student")
+
+    def update_student(self, query, body, sid):
+        self._found(self.STUDENT, self.school.get_student(sid), "student")
+        self.school.update_student(sid, _body_field(body, "name"), _body_field(body, "age"),
+                                   _body_field(body, "grade"))
+        return {"id": int(sid)}
+
+    def delete_student(self, query, body, sid):
+        if not self.school.delete_students([sid]):
+            raise ApiError(404, "student not found")
+        return {"deleted": 1}
+
+    def student_attendance(self, query, body, sid):
+        return {"items": _records(("id", "student_id", "date", "present"),
+                                  self._reader(query).view_attendance_for_student(sid)),
+                "percentage": self._reader(query).attendance_percentage(sid)}
+
+    def student_fees(self, query, body, sid):
+        return {"items": _records(("id", "student_id", "amount", "paid", "due_date"),
+                                  self._reader(query).view_fees_for_student(sid))}
+
+    def student_performance(self, query, body, sid):
+        return {"items": _records(("subject", "marks", "grade"), self._reader(query).generate_performance_report(sid))}
+
+    def student_profile(self, query, body, sid):
+        profile = self._reader(query).student_profile(sid, query.get("as_of"))
+        if profile is None:
+            raise ApiError(404, "student not found")
+        return self._profile_json(profile)
+
+    def student_profiles(self, query, body):
+        # GET /profiles?ids=1,2,3
+        ids = [i for i in query.get("ids", "").split(",") if i.strip()]
+        if len(ids) > self.max_page_size:
+            raise ApiError(400, f"at most {self.max_page_size} ids per request")
+        profiles = self._reader(query).student_profiles(ids, query.get("as_of"))
+        return {"items": [self._profile_json(p) for p in profiles.values()]}
+
+    def _profile_json(self, profile):
+        return dict(profile, student=dict(zip(self.STUDENT, profile["student"])),
+                    attendance=_records(("id", "student_id", "date", "present"), profile["attendance"]),
+                    fees=_records(("id", "student_id", "amount", "paid", "due_date"), profile["fees"]),
+                    performance=_records(("id", "student_id", "subject", "marks"), profile["performance"]),
+                    report=_records(("subject", "marks", "grade"), profile["report"]))
+
+    def list_teachers(self, query, body):
+        limit, after_id = self._page(query)
+        return self._paged(self.TEACHER, self.school.view_teachers(limit, after_id), limit)
+
+    def create_teacher(self, query, body):
+        return {"id": self.school.add_teacher(Teacher(_body_field(body, "name"), _body_field(body, "subject")))}
+
+    def get_teacher(self, query, body, tid):
+        return self._found(self.TEACHER, self.school.get_teacher(tid), "teacher")
+
+    def update_teacher(self, query, body, tid):
+        self._found(self.TEACHER, self.school.get_teacher(tid), "teacher")
+        self.school.update_teacher(tid, _body_field(body, "name"), _body_field(body, "subject"))
+        return {"id": int(tid)}
+
+    def delete_teacher(self, query, body, tid):
+        if not self.school.delete_teacher(tid):
+            raise ApiError(404, "teacher not found")
+        return {"deleted": 1}
+
+    def mark_attendance(self, query, body):
+        # one mark or a whole roster; re-marking a student for a day replaces the mark
+        marks = body if isinstance(body, list) else [body]
+        records = [AttendanceRecord(_body_field(m, "student_id"), _body_field(m, "date"),
+                                    parse_bool(_body_field(m, "present", True))) for m in marks]
+        return {"count": self.school.add_attendance_bulk(records)}
+
+    def attendance_stats(self, query, body):
+        rows = self._reader(query).attendance_stats(query.get("grade"), query.get("start"), query.get("end"))
+        return {"items": _records(("student_id", "name", "grade", "total", "present", "percentage"), rows)}
+
+    def grade_attendance(self, query, body):
+        daily = parse_bool(query.get("daily", ""))
+        rows = self._reader(query).grade_attendance(query.get("grade"), query.get("start"), query.get("end"), daily)
+        columns = ("grade", "date", "present", "total", "percentage") if daily else \
+            ("grade", "present", "total", "percentage")
+        return {"items": _records(columns, rows)}
+
+    def create_fee(self, query, body):
+        fee = FeeRecord(_body_field(body, "student_id"), _body_field(body, "amount"),
+                        parse_bool(_body_field(body, "paid", False)), _body_field(body, "due_date", None))
+        return {"id": self.school.add_fee(fee)}
+
+    def pay_fees(self, query, body):
+        ids = _body_field(body, "ids")
+        if not isinstance(ids, list):
+            raise ApiError(400, "'ids' must be a list")
+        return {"count": self.school.set_fee_paid_many(ids, parse_bool(_body_field(body, "paid", True)))}
+
+    def overdue_fees(self, query, body):
+        limit = query.get("limit")
+        rows = self.school.overdue_fees(query.get("as_of"), query.get("grade"),
+                                        None if limit is None else min(int(limit), self.max_page_size))
+        return {"items": _records(("id", "student_id", "name", "grade", "amount", "due_date"), rows)}
+
+    def outstanding_fees(self, query, body):
+        return {"items": _records(("student_id", "balance", "fees", "earliest_due"),
+                                  self.school.outstanding_balance_by_student())}
+
+    def fee_summary(self, query, body):
+        return self.school.fee_summary(query.get("as_of"))
+
+    def create_performance(self, query, body):
+        p = Performance(_body_field(body, "student_id"), _body_field(body, "subject"), _body_field(body, "marks"),
+                        academic_year=_body_field(body, "academic_year", None))
+        return {"id": self.school.add_performance(p), "grade": p.calculate_grade()}
+
+    def performance_analytics(self, query, body):
+        groups, ranks = self._reader(query).performance_analytics(query.get("grade"), query.get("subject"))
+        return {"groups": [dict(stats, grade=g, subject=subj) for (g, subj), stats in groups.items()],
+                "ranks": [{"student_id": sid, "grade": g, "rank": rank, "class_size": size, "average": avg}
+                          for sid, (g, rank, size, avg) in ranks.items()]}
+
+    # asyncio side
+    async def respond(self, method, target, headers, raw):
+        """Returns (status, headers, body bytes) for one request."""
+        import hashlib
+        from urllib.parse import urlsplit
+
+        self.requests += 1
+        url = urlsplit(target)
+        try:
+            body = json.loads(raw) if raw else None
+        except ValueError:
+            return self._encode(400, {"error": "request body is not valid JSON"})
+        call = self.aschool.call
+        if_none_match = headers.get("if-none-match")
+        try:
+            if method == "POST" and url.path == "/batch":
+                return self._encode(200, await call(self.dispatch_batch, body))
+            if method != "GET":
+                status, payload, etag = await call(self.dispatch, method, url.path, _query(url.query), body)
+                return self._encode(status, payload)
+            # identical GETs already in flight share one database call
+            key = (target, if_none_match)
+            future = self._inflight.get(key)
+            if future is None:
+                future = asyncio.ensure_future(call(self.dispatch, method, url.path, _query(url.query), None,
+                                                    if_none_match))
+                self._inflight[key] = future
+                future.add_done_callback(lambda _: self._inflight.pop(key, None))
+            else:
+                self.coalesced += 1
+            status, payload, etag = await asyncio.shield(future)
+        except Exception as e:
+            status, message = self._error(e)
+            return self._encode(status, {"error": message})
+        if status == 304:
+            self.not_modified += 1
+            return 304, {"ETag": etag}, b""
+        response = self._encode(status, payload)
+        if etag is None:
+            etag = 'W/"' + hashlib.sha1(response[2]).hexdigest()[:20] + '"'
+            if etag == if_none_match:
+                self.not_modified += 1
+                return 304, {"ETag": etag}, b""
+        response[1]["ETag"] = etag
+        return response
+
+    def authorized(self, headers):
+        import hmac
+
+        scheme, _, token = headers.get("authorization", "").partition(" ")
+        return scheme.lower() == "bearer" and hmac.compare_digest(token.strip().encode(), self.token.encode())
+
+    @staticmethod
+    def _encode(status, payload):
+        body = json.dumps(payload, default=_json_default, separators=(",", ":")).encode()
+        return status, {"Content-Type": "application/json"}, body
+
+    async def handle(self, reader, writer):
+        # HTTP/1.1 with keep-alive; one request at a time per connection
+        try:
+            while True:
+                try:
+                    request_line = await reader.readline()
+                except asyncio.CancelledError:
+                    # server shutting down with the connection idle between requests;
+                    # a cancellation anywhere else propagates
+                    break
+                if not request_line.strip():
+                    break
+                method, target, version = request_line.decode("latin-1").split()
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get("content-length") or 0)
+                if not self.authorized(headers):
+                    # the body is left unread, so the connection cannot be reused
+                    status, extra, body = self._encode(401, {"error": "missing or wrong API token"})
+                    extra["WWW-Authenticate"] = "Bearer"
+                    keep_alive = False
+                elif length > self.max_body:
+                    status, extra, body = self._encode(413, {"error": "request body too large"})
+                    keep_alive = False
+                else:
+                    raw = await reader.readexactly(length) if length else b""
+                    status, extra, body = await self.respond(method.upper(), target, headers, raw)
+                    connection = headers.get("connection", "").lower()
+                    keep_alive = connection != "close" and (version == "HTTP/1.1" or connection == "keep-alive")
+                head = [f"HTTP/1.1 {status} {self.STATUS.get(status, '')}", f"Content-Length: {len(body)}",
+                        "Connection: " + ("keep-alive" if keep_alive else "close")]
+                head.extend(f"{name}: {value}" for name, value in extra.items())
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + body)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host="127.0.0.1", port=8080):
+        return await asyncio.start_server(self.handle, host, port, limit=1 << 16)
+
+    def close(self):
+        self.aschool.close()
+
+
+def _query(text):
+    from urllib.parse import parse_qs
+
+    return {name: values[0] for name, values in parse_qs(text).items()}
+
+
+async def api_request(reader, writer, method, path, body=None, headers=None, token=None):
+    # minimal keep-alive client, used by the tests and benchmark_api
+    raw = b"" if body is None else json.dumps(body, default=_json_default).encode()
+    head = [f"{method} {path} HTTP/1.1", "Host: localhost", f"Content-Length: {len(raw)}"]
+    if token is not None:
+        head.append(f"Authorization: Bearer {token}")
+    head.extend(f"{name}: {value}" for name, value in (headers or {}).items())
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + raw)
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    response_headers = {}
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        response_headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(response_headers.get("content-length", 0)))
+    return status, response_headers, json.loads(payload) if payload else None
+
+
+def serve(host="127.0.0.1", port=8080, workers=8, writes=False, token=None):
+    # headless alternative to main(): SCHOOL_DB=sqlite:school.db for a local stand-in.
+    # The token comes from SCHOOL_API_TOKEN; without one a random token is made up
+    # and printed for this run.
+    import secrets
+
+    token = token or os.environ.get("SCHOOL_API_TOKEN") or secrets.token_urlsafe(24)
+    setup_database()
+    if pool.max_size < workers:
+        configure_pool(max_size=workers)
+    OrphanSweeper(school).start()
+    api = SchoolApi(school, token, writes=writes, max_workers=workers)
+
+    async def run():
+        server = await api.start(host, port)
+        print(f"School API listening on http://{host}:{port} ({'read-write' if writes else 'read-only'})")
+        if not os.environ.get("SCHOOL_API_TOKEN"):
+            print(f"API token for this run: {token}")
+        async with server:
+            await server.serve_forever()
+    try:
+        asyncio.run(run())
+    finally:
+        api.close()
+
+
+class DbExecutor:
+    """Runs School calls on worker threads and hands results back to the Tk thread.
+
+    submit(fn, *args, key=...) tags a request: a newer request with the same key
+    supersedes the older one (its result is dropped, or it is cancelled if it
+    has not started), and an identical request already in flight is coalesced
+    instead of being run twice. Callbacks always run on the Tk thread.
+    """
+
+    def __init__(self, root, max_workers=4, poll_ms=15, on_busy=None, stall_hook=None):
+        self.root = root
+        self.poll_ms = poll_ms
+        self.on_busy = on_busy        # called with the number of requests in flight
+        self.stall_hook = stall_hook  # called with (label, seconds) for each UI-thread callback
+        self._workers = ThreadPoolExecutor(max_workers, thread_name_prefix="school-db")
+        self._results = queue.SimpleQueue()
+        self._keyed = {}
+        self._polling = False
+        self.in_flight = 0
+        self.stats = {"submitted": 0, "coalesced": 0, "superseded": 0,
+                      "callbacks": 0, "stall_time": 0.0, "max_stall": 0.0}
+
+    def submit(self, fn, *args, on_done=None, on_error=None, key=None):
+        callback = (on_done, on_error)
+        if key is not None:
+            current = self._keyed.get(key)
+            if current is not None:
+                if current.fn == fn and current.args == args:
+                    current.callbacks = [callback]
+                    self.stats["coalesced"] += 1
+                    return current
+                current.superseded = True
+                self.stats["superseded"] += 1
+                if current.future.cancel():
+                    self._finished(current)
+        job = _DbJob(fn, args, key, callback)
+        self.stats["submitted"] += 1
+        self.in_flight += 1
+        if key is not None:
+            self._keyed[key] = job
+        job.future = self._workers.submit(self._run, job)
+        self._busy_changed()
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._drain)
+        return job
+
+    def shutdown(self):
+        self._workers.shutdown(wait=False, cancel_futures=True)
+
+    def monitor_stalls(self, interval_ms=100):
+        # heartbeat on the Tk loop; any lateness is time the UI thread was blocked
+        expected = time.perf_counter() + interval_ms / 1000.0
+
+        def beat():
+            late = time.perf_counter() - expected
+            if late > 0.005:
+                self._record_stall("event-loop", late)
+            self.monitor_stalls(interval_ms)
+
+        self.root.after(interval_ms, beat)
+
+    def _run(self, job):
+        # worker thread: never touch Tk here
+        try:
+            outcome = (job.fn(*job.args), None)
+        except Exception as e:
+            outcome = (None, e)
+        self._results.put((job, outcome))
+
+    def _drain(self):
+        while True:
+            try:
+                job, (value, error) = self._results.get_nowait()
+            except queue.Empty:
+                break
+            self._finished(job)
+            if job.superseded:
+                continue
+            for on_done, on_error in job.callbacks:
+                start = time.perf_counter()
+                try:
+                    if error is not None:
+                        (on_error or self._show_error)(error)
+                    elif on_done is not None:
+                        on_done(value)
+                finally:
+                    self._record_stall(getattr(job.fn, "__name__", "call"), time.perf_counter() - start)
+        if self.in_flight:
+            self.root.after(self.poll_ms, self._drain)
+        else:
+            self._polling = False
+
+    def _finished(self, job):
+        self.in_flight -= 1
+        if job.key is not None and self._keyed.get(job.key) is job:
+            del self._keyed[job.key]
+        self._busy_changed()
+
+    def _busy_changed(self):
+        if self.on_busy is not None:
+            self.on_busy(self.in_flight)
+
+    def _record_stall(self, label, seconds):
+        self.stats["callbacks"] += 1
+        self.stats["stall_time"] += seconds
+        self.stats["max_stall"] = max(self.stats["max_stall"], seconds)
+        if self.stall_hook is not None:
+            self.stall_hook(label, seconds)
+
+    @staticmethod
+    def _show_error(error):
+        messagebox.showerror("Error", str(error))
+
+
+class _DbJob:
+    def __init__(self, fn, args, key, callback):
+        self.fn = fn
+        self.args = args
+        self.key = key
+        self.callbacks = [callback]
+        self.superseded = False
+        self.future = None
+
+
+class OrphanSweeper:
+    """Background thread running School.sweep_orphans every interval seconds."""
+
+    def __init__(self, school, interval=6 * 3600, first_delay=60, on_report=None, **sweep_options):
+        self.school = school
+        self.interval = interval
+        self.first_delay = first_delay
+        self.on_report = on_report
+        self.sweep_options = sweep_options
+        self.last_report = None
+        self.last_error = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="orphan-sweeper", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        delay = self.first_delay
+        while not self._stop.wait(delay):
+            delay = self.interval
+            try:
+                self.last_report = self.school.sweep_orphans(**self.sweep_options)
+                self.last_error = None
+            except Exception as e:
+                self.last_error = e
+                continue
+            if self.on_report is not None:
+                self.on_report(self.last_report)
+
+
+class WriteJournal:
+    """Durable local queue of School writes, for terminals that may lose the server.
+
+    An embedded SQLite file (synchronous=FULL, so an appended write survives a
+    power cut) holding one row per write: a unique idempotency key, the operation
+    and its arguments as JSON, and how syncing it went. JournalSyncer empties it.
+    """
+
+    def __init__(self, path="school-journal.db"):
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=FULL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS journal(
+                id INTEGER PRIMARY KEY,
+                write_key TEXT NOT NULL UNIQUE,
+                op TEXT NOT NULL,
+                args TEXT NOT NULL,
+                created_at TEXT NOT NULL,
+                attempts INT NOT NULL DEFAULT 0,
+                last_error TEXT,
+                conflict INT NOT NULL DEFAULT 0
+            )
+        """)
+
+    def append(self, op, args):
+        import uuid
+
+        key = uuid.uuid4().hex
+        with self._lock:
+            self._conn.execute("INSERT INTO journal(write_key, op, args, created_at) VALUES(?,?,?,?)",
+                               (key, op, json.dumps(args, default=_json_default),
+                                datetime.datetime.now().isoformat(timespec="seconds")))
+        return key
+
+    def pending(self, limit):
+        # [(id, write_key, op, args)] oldest first, conflicts left out
+        with self._lock:
+            return self._conn.execute("SELECT id, write_key, op, args FROM journal WHERE conflict = 0 "
+                                      "ORDER BY id LIMIT ?", (limit,)).fetchall()
+
+    def synced(self, ids):
+        with self._lock:
+            self._conn.executemany("DELETE FROM journal WHERE id=?", [(i,) for i in ids])
+
+    def failed(self, ids, error):
+        with self._lock:
+            self._conn.executemany("UPDATE journal SET attempts = attempts + 1, last_error=? WHERE id=?",
+                                   [(error, i) for i in ids])
+
+    def conflicted(self, errors):
+        # errors: [(id, message)]
+        with self._lock:
+            self._conn.executemany("UPDATE journal SET conflict = 1, attempts = attempts + 1, last_error=? "
+                                   "WHERE id=?", [(message, i) for i, message in errors])
+
+    def conflicts(self):
+        # [(id, op, args, created_at, error)] the central database refused
+        with self._lock:
+            return self._conn.execute("SELECT id, op, args, created_at, last_error FROM journal "
+                                      "WHERE conflict = 1 ORDER BY id").fetchall()
+
+    def counts(self):
+        with self._lock:
+            pending, conflicts = self._conn.execute(
+                "SELECT COALESCE(SUM(1 - conflict), 0), COALESCE(SUM(conflict), 0) FROM journal").fetchone()
+        return {"pending": pending, "conflicts": conflicts}
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+class JournaledSchool:
+    """School whose routine writes are journaled locally and applied later.
+
+    add_attendance(_bulk), add_fee, add_performance and set_fee_paid(_many)
+    validate their input and return once the write is in the WriteJournal;
+    a JournalSyncer applies it to the database. New row ids are not known until
+    then, so add_fee and add_performance return None. Everything else goes
+    straight to school.
+    """
+
+    def __init__(self, school, journal):
+        self.school = school
+        self.journal = journal
+
+    def __getattr__(self, name):
+        return getattr(self.school, name)
+
+    def add_attendance(self, rec: AttendanceRecord):
+        self.add_attendance_bulk([rec])
+
+    def add_attendance_bulk(self, records):
+        if isinstance(records, AttendanceBatch):
+            latest = {(sid, date): present for sid, date, present in records}
+        else:
+            latest = {(r.student_id, r.date): int(r.present) for r in records}
+        if latest:
+            self.journal.append("attendance", [[sid, date, present] for (sid, date), present in latest.items()])
+        return len(latest)
+
+    def add_fee(self, fee: FeeRecord):
+        self.journal.append("fee", [fee.student_id, fee.amount, fee.paid, fee.due_date])
+
+    def add_performance(self, p: Performance):
+        # the year is fixed now, not when the write reaches the server
+        self.journal.append("performance", [p.student_id, p.subject, p.marks, p.academic_year or academic_year()])
+
+    def set_fee_paid(self, fee_id, paid=True):
+        self.set_fee_paid_many([fee_id], paid)
+
+    def set_fee_paid_many(self, fee_ids, paid=True):
+        ids = [int(fid) for fid in fee_ids]
+        if ids:
+            self.journal.append("fees_paid", [ids, bool(paid)])
+        return len(ids)
+
+
+class JournalSyncer:
+    """Background thread applying a WriteJournal to the database in batches.
+
+    Entries go over oldest first, batch_size per transaction, each in a
+    savepoint together with its idempotency key in applied_writes; a key already
+    there (the commit went through but the journal was not updated) is dropped
+    rather than applied twice. A write the database refuses (constraint
+    violation, bad value, archived year) becomes a conflict with its error and
+    does not hold up the rest. Any other failure rolls the batch back and is
+    retried, backing off exponentially up to max_backoff seconds.
+    """
+
+    def __init__(self, journal, school, interval=1.0, batch_size=200, max_backoff=300.0, on_report=None):
+        self.journal = journal
+        self.school = school
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_backoff = max_backoff
+        self.on_report = on_report
+        self.failures = 0
+        self.last_report = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="journal-syncer", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    # DB-API errors about the statement or its values (constraint, truncation,
+    # overflow, unbindable parameter): raised by one entry, they are its fault
+    CONFLICT_ERRORS = ("IntegrityError", "DataError", "ProgrammingError")
+
+    @classmethod
+    def is_conflict(cls, error):
+        # the write is wrong, as opposed to the server being unreachable or busy
+        return type(error).__name__ in cls.CONFLICT_ERRORS or isinstance(error, (ValueError, TypeError, KeyError))
+
+    # DB-API errors about reaching or talking to the server (connect failures,
+    # timeouts, dropped links): nothing is wrong with the writes themselves
+    OFFLINE_ERRORS = ("OperationalError", "InterfaceError")
+
+    @classmethod
+    def is_offline(cls, error):
+        return type(error).__name__ in cls.OFFLINE_ERRORS or \
+            isinstance(error, (PoolTimeout, ConnectionError, TimeoutError))
+
+    @staticmethod
+    def replay(school, op, args):
+        if op == "attendance":
+            school.add_attendance_bulk([AttendanceRecord(sid, date, present) for sid, date, present in args])
+        elif op == "fee":
+            school.add_fee(FeeRecord(*args))
+        elif op == "performance":
+            student_id, subject, marks, year = args
+            school.add_performance(Performance(student_id, subject, marks, academic_year=year))
+        elif op == "fees_paid":
+            school.set_fee_paid_many(*args)
+        else:
+            raise KeyError(f"unknown journaled operation {op!r}")
+
+    def sync(self):
+        """Apply everything pending; returns counts and the error that stopped it, if any."""
+        report = {"applied": 0, "duplicates": 0, "conflicts": 0, "batches": 0, "error": None}
+        while True:
+            batch = self.journal.pending(self.batch_size)
+            if not batch:
+                break
+            try:
+                done, duplicates, conflicts = self._apply(batch)
+            except Exception as e:
+                report["error"] = f"{type(e).__name__}: {e}"
+                self.journal.failed([entry[0] for entry in batch], report["error"])
+                break
+            self.journal.synced(done + duplicates)
+            self.journal.conflicted(conflicts)
+            report["applied"] += len(done)
+            report["duplicates"] += len(duplicates)
+            report["conflicts"] += len(conflicts)
+            report["batches"] += 1
+        report["pending"] = self.journal.counts()["pending"]
+        return report
+
+    def _apply(self, batch):
+        done, duplicates, conflicts = [], [], []
+        now = datetime.datetime.now().isoformat(timespec="seconds")
+        with self.school.transaction():
+            c = get_connection().cursor()
+            c.execute(f"SELECT write_key FROM applied_writes WHERE write_key IN ({','.join('?' * len(batch))})",
+                      [entry[1] for entry in batch])
+            seen = {row[0] for row in c.fetchall()}
+            for entry_id, key, op, args in batch:
+                if key in seen:
+                    duplicates.append(entry_id)
+                    continue
+                try:
+                    with self.school.transaction():
+                        self.replay(self.school, op, json.loads(args))
+                        c.execute("INSERT INTO applied_writes(write_key, applied_at) VALUES(?,?)", (key, now))
+                except Exception as e:
+                    if not self.is_conflict(e):
+                        raise
+                    conflicts.append((entry_id, f"{type(e).__name__}: {e}"))
+                else:
+                    done.append(entry_id)
+        return done, duplicates, conflicts
+
+    def _run(self):
+        delay = self.interval
+        while not self._stop.wait(delay):
+            try:
+                self.last_report = self.sync()
+            except Exception as e:
+                # the journal file itself failed; keep trying
+                self.last_report = {"error": f"{type(e).__name__}: {e}"}
+            if self.last_report["error"]:
+                self.failures += 1
+                delay = min(self.max_backoff, self.interval * 2 ** self.failures)
+            else:
+                self.failures = 0
+                delay = self.interval
+            if self.on_report is not None:
+                self.on_report(self.last_report)
+
+
+class PagedTreeview:
+    """Loads a Treeview page by page (keyset on id) as the user scrolls.
+
+    fetch_page(page_size, after_id) returns rows ordered by id with the id in
+    column 0; fetch_one(id) returns a single row or None. Mutations are applied
+    as row-level diffs instead of clearing and reloading the whole tree. With a
+    DbExecutor the fetches run off the Tk thread and a reload supersedes any
+    page request still in flight. on_page(rows) is called after each page is shown.
+    """
+
+    def __init__(self, tree, fetch_page, fetch_one, page_size=200, prefetch=0.9, on_error=None, db=None,
+                 on_page=None):
+        self.tree = tree
+        self.fetch_page = fetch_page
+        self.fetch_one = fetch_one
+        self.page_size = page_size
+        self.prefetch = prefetch
+        self.on_error = on_error or (lambda e: messagebox.showerror("Error", str(e)))
+        self.db = db
+        self.on_page = on_page
+        self.scrollbar = None
+        self._ids = []      # loaded ids, ascending
+        self._items = {}    # id -> Treeview item
+        self._exhausted = False
+        self._pending = False
+        tree.configure(yscrollcommand=self._on_scroll)
+
+    def attach_scrollbar(self, scrollbar):
+        self.scrollbar = scrollbar
+        scrollbar.configure(command=self.tree.yview)
+
+    @property
+    def last_id(self):
+        return self._ids[-1] if self._ids else 0
+
+    def reload(self):
+        self._request(0, reset=True)
 
-    def calculate_grade(self):
-        # same logic as you had but more granular
-        if self.marks >= 90:
-            return "A+"
-        elif self.marks >= 80:
-            return "A"
-        elif self.marks >= 70:
-            return "B"
-        elif self.marks >= 60:
-            return "C"
-        elif self.marks >= 50:
-            return "D"
-        else:
-            return "F"
+    def load_next_page(self):
+        if self._exhausted:
+            self._pending = False
+            return
+        self._request(self.last_id, reset=False)
 
+    def show_only(self, rows):
+        # replace the content with a fixed result set and stop paging until reload()
+        self._apply_page(rows, reset=True)
+        self._exhausted = True
 
-class School:
-    # STUDENTS
-    def add_student(self, s: Student):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("INSERT INTO students(name, age, grade) VALUES(?,?,?)",
-                  (s.name, s.age, s.grade))
-        conn.close()
+    def load_new(self):
+        # rows appended after the last loaded id (e.g. after an insert)
+        if self._exhausted and not self._pending:
+            self._exhausted = False
+            self.load_next_page()
 
-    def view_students(self):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("SELECT id, name, age, grade FROM students")
-        data = c.fetchall()
-        conn.close()
-        return data
+    def upsert(self, row):
+        key = row[0]
+        if key in self._items:
+            self.tree.item(self._items[key], values=tuple(row))
+        elif self._exhausted or key < self.last_id:
+            pos = bisect.bisect_left(self._ids, key)
+            self._ids.insert(pos, key)
+            self._items[key] = self.tree.insert('', pos, values=tuple(row))
 
-    def update_student(self, sid, name, age, grade):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("UPDATE students SET name=?, age=?, grade=? WHERE id=?",
-                  (name, int(age), grade, int(sid)))
-        conn.close()
+    def remove(self, key):
+        item = self._items.pop(key, None)
+        if item is not None:
+            self.tree.delete(item)
+            self._ids.pop(bisect.bisect_left(self._ids, key))
 
-    def delete_student(self, sid):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("DELETE FROM students WHERE id=?", (int(sid),))
-        conn.close()
+    def refresh_row(self, key):
+        def apply(row):
+            if row is None:
+                self.remove(key)
+            else:
+                self.upsert(row)
+        self._call(self.fetch_one, (key,), apply, self.on_error)
 
-    # TEACHERS
-    def add_teacher(self, t: Teacher):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("INSERT INTO teachers(name, subject) VALUES(?,?)", (t.name, t.subject))
-        conn.close()
+    def _request(self, after_id, reset):
+        self._pending = True
+        self._call(self.fetch_page, (self.page_size, after_id),
+                   lambda rows: self._apply_page(rows, reset), self._page_failed,
+                   key=("page", id(self)))
 
-    def view_teachers(self):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("SELECT id, name, subject FROM teachers")
-        data = c.fetchall()
-        conn.close()
-        return data
+    def _call(self, fn, args, on_done, on_error, key=None):
+        if self.db is not None:
+            self.db.submit(fn, *args, on_done=on_done, on_error=on_error, key=key)
+            return
+        try:
+            result = fn(*args)
+        except Exception as e:
+            on_error(e)
+            return
+        on_done(result)
 
-    def update_teacher(self, tid, name, subject):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("UPDATE teachers SET name=?, subject=? WHERE id=?", (name, subject, int(tid)))
-        conn.close()
+    def _apply_page(self, rows, reset):
+        self._pending = False
+        if reset:
+            children = self.tree.get_children()
+            if children:
+                self.tree.delete(*children)
+            self._ids = []
+            self._items = {}
+        for row in rows:
+            key = row[0]
+            if key in self._items:
+                continue
+            self._items[key] = self.tree.insert('', tk.END, values=tuple(row))
+            self._ids.append(key)
+        self._exhausted = len(rows) < self.page_size
+        if self.on_page is not None:
+            self.on_page(rows)
 
-    def delete_teacher(self, tid):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("DELETE FROM teachers WHERE id=?", (int(tid),))
-        conn.close()
+    def _page_failed(self, error):
+        self._pending = False
+        self._exhausted = True
+        self.on_error(error)
 
-    # ATTENDANCE
-    def add_attendance(self, rec: AttendanceRecord):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("INSERT INTO attendance(student_id, date, present) VALUES(?,?,?)",
-                  (rec.student_id, rec.date, int(rec.present)))
-        conn.close()
+    def _on_scroll(self, first, last):
+        if self.scrollbar is not None:
+            self.scrollbar.set(first, last)
+        if not self._exhausted and not self._pending and float(last) >= self.prefetch:
+            self._pending = True
+            self.tree.after_idle(self.load_next_page)
 
-    def view_attendance_for_student(self, student_id):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("SELECT id, student_id, date, present FROM attendance WHERE student_id=? ORDER BY date",
-                  (int(student_id),))
-        data = c.fetchall()
-        conn.close()
-        return data
 
-    def attendance_percentage(self, student_id):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("SELECT COUNT(*) FROM attendance WHERE student_id=?", (int(student_id),))
-        total = c.fetchone()[0]
-        if total == 0:
-            conn.close()
-            return 0.0
-        c.execute("SELECT COUNT(*) FROM attendance WHERE student_id=? AND present=1", (int(student_id),))
-        present = c.fetchone()[0]
-        conn.close()
-        return present / total * 100.0
+def replace_rows(tree, rows):
+    # swap the whole content of a small Treeview in two Tk calls
+    children = tree.get_children()
+    if children:
+        tree.delete(*children)
+    for values in rows:
+        tree.insert('', tk.END, values=values)
 
-    # FEES
-    def add_fee(self, fee: FeeRecord):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("INSERT INTO fees(student_id, amount, paid, due_date) VALUES(?,?,?,?)",
-                  (fee.student_id, fee.amount, int(fee.paid), fee.due_date))
-        conn.close()
 
-    def view_fees_for_student(self, student_id):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("SELECT id, student_id, amount, paid, due_date FROM fees WHERE student_id=?", (int(student_id),))
-        data = c.fetchall()
-        conn.close()
-        return data
+class StartupTimer:
+    """Milestones of one desktop start, so cold-start time can be tracked.
 
-    def set_fee_paid(self, fee_id, paid=True):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("UPDATE fees SET paid=? WHERE id=?", (int(bool(paid)), int(fee_id)))
-        conn.close()
+    mark(name) notes the time since this file began importing. main() marks the
+    import, the first paint (login window drawn), the login, the main window
+    drawn and its first page of students; log() prints each step to stderr and,
+    with SCHOOL_STARTUP_LOG=path, appends the report to path as a JSON line.
+    The login step is the user typing and is left out of the budget. With
+    from_launch the times count from the process start instead (Linux, 10 ms
+    resolution), the first step covering the interpreter and compiling this file.
+    """
 
-    # PERFORMANCE
-    def add_performance(self, p: Performance):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("INSERT INTO performance(student_id, subject, marks) VALUES(?,?,?)",
-                  (p.student_id, p.subject, p.marks))
-        conn.close()
+    FIRST_PAINT_BUDGET_MS = 300
 
-    def view_performance_for_student(self, student_id):
-        conn = get_connection()
-        c = conn.cursor()
-        c.execute("SELECT id, student_id, subject, marks FROM performance WHERE student_id=?", (int(student_id),))
-        data = c.fetchall()
-        conn.close()
-        return data
+    def __init__(self, started, from_launch=False):
+        self.started = started
+        self.marks = []
+        self.logged = False
+        age = self.process_age() if from_launch else None
+        if age is not None:
+            self.marks.append(("interpreter", started))
+            self.started = time.perf_counter() - age
 
-    def generate_performance_report(self, student_id):
-        # returns list of (subject, marks, grade)
-        rows = self.view_performance_for_student(student_id)
-        report = []
-        for r in rows:
-            perf = Performance(r[1], r[2], r[3], perf_id=r[0])
-            report.append((r[2], r[3], perf.calculate_grade()))
+    @staticmethod
+    def process_age():
+        # seconds since this process started, or None where /proc is not available
+        try:
+            with open("/proc/self/stat") as f:
+                start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+            return time.clock_gettime(time.CLOCK_BOOTTIME) - start_ticks / os.sysconf("SC_CLK_TCK")
+        except (OSError, ValueError, IndexError, AttributeError):
+            return None
+
+    def mark(self, name):
+        self.marks.append((name, time.perf_counter()))
+
+    def mark_drawn(self, widget, name):
+        # Tk redraws when idle; an idle callback queued from the next timer tick
+        # runs after the redraw the widget is waiting for
+        widget.after(0, widget.after_idle, self.mark, name)
+
+    def report(self):
+        steps = {}
+        previous = self.started
+        for name, at in self.marks:
+            steps[name] = {"ms": round((at - self.started) * 1000, 1), "step_ms": round((at - previous) * 1000, 1)}
+            previous = at
+        first_paint = steps.get("first paint", {}).get("ms")
+        return {"at": datetime.datetime.now().isoformat(timespec="seconds"), "steps": steps,
+                "first_paint_ms": first_paint, "budget_ms": self.FIRST_PAINT_BUDGET_MS,
+                "within_budget": first_paint is not None and first_paint <= self.FIRST_PAINT_BUDGET_MS}
+
+    def log(self, path=None):
+        # once per start
+        if self.logged:
+            return None
+        self.logged = True
+        report = self.report()
+        print("startup: " + ", ".join(f"{name} +{step['step_ms']:.0f} ms" for name, step in report["steps"].items()) +
+              f" (first paint {report['first_paint_ms']} ms, budget {self.FIRST_PAINT_BUDGET_MS} ms)", file=sys.stderr)
+        if path:
+            with open(path, "a") as f:
+                f.write(json.dumps(report) + "\n")
         return report
 
-school = School()
+
+startup = StartupTimer(STARTED, from_launch=True)
 
 
 class App:
-    def __init__(self, root):
+    def __init__(self, root, journal=None):
         self.root = root
         self.root.title("School Management System")
+        self.db = DbExecutor(root, on_busy=self.show_busy, stall_hook=query_stats.rendered)
+        self.db.monitor_stalls()   # event-loop lateness shows up as "event-loop" in query_stats
+        # marks, fees and results go through the journal when there is one
+        self.journal = journal
+        self.writes = JournaledSchool(school, journal) if journal is not None else school
+        self.sync_reports = queue.Queue()   # filled by the JournalSyncer thread
         self.create_widgets()
+        if journal is not None:
+            self.show_sync_state()
+        startup.mark_drawn(root, "main window")
+        # normally logged once the first students arrive; don't wait on a dead server
+        root.after(5000, self.startup_done)
+
+    def startup_done(self, rows=None):
+        if not startup.logged:
+            if rows is not None:
+                startup.mark("first page")
+            startup.log(os.environ.get("SCHOOL_STARTUP_LOG"))
 
     def create_widgets(self):
-        notebook = ttk.Notebook(self.root)
-        notebook.pack(expand=True, fill='both')
-
-        # Students tab
-        self.students_frame = ttk.Frame(notebook)
-        notebook.add(self.students_frame, text='Students')
-        self.build_students_tab(self.students_frame)
-
-        # Teachers tab
-        self.teachers_frame = ttk.Frame(notebook)
-        notebook.add(self.teachers_frame, text='Teachers')
-        self.build_teachers_tab(self.teachers_frame)
-
-        # Attendance tab
-        self.attendance_frame = ttk.Frame(notebook)
-        notebook.add(self.attendance_frame, text='Attendance')
-        self.build_attendance_tab(self.attendance_frame)
-
-        # Fees tab
-        self.fees_frame = ttk.Frame(notebook)
-        notebook.add(self.fees_frame, text='Fees')
-        self.build_fees_tab(self.fees_frame)
-
-        # Performance
-        self.perf_frame = ttk.Frame(notebook)
-        notebook.add(self.perf_frame, text='Performance')
-        self.build_performance_tab(self.perf_frame)
-
-   
+        menubar = tk.Menu(self.root)
+        tools = tk.Menu(menubar, tearoff=0)
+        tools.add_command(label="Diagnostics", command=self.show_diagnostics, accelerator="F12")
+        menubar.add_cascade(label="Tools", menu=tools)
+        self.root.config(menu=menubar)
+        self.root.bind("<F12>", lambda e: self.show_diagnostics())
+        self.status = ttk.Label(self.root, text="Ready", anchor='w')
+        self.status.pack(fill='x', side='bottom')
+        self.sync_status = ttk.Label(self.status, text="", anchor='e')
+        self.sync_status.pack(side='right')
+        self.notebook = ttk.Notebook(self.root)
+        self.notebook.pack(expand=True, fill='both')
+
+        # each tab is built, and loads its data, the first time it is shown
+        self._unbuilt_tabs = {}
+        for attr, text, build in (
+                ("students_frame", 'Students', self.build_students_tab),
+                ("teachers_frame", 'Teachers', self.build_teachers_tab),
+                ("attendance_frame", 'Attendance', self.build_attendance_tab),
+                ("fees_frame", 'Fees', self.build_fees_tab),
+                ("perf_frame", 'Performance', self.build_performance_tab),
+                # Profile: one student's attendance, fees and performance together
+                ("profile_frame", 'Profile', self.build_profile_tab)):
+            frame = ttk.Frame(self.notebook)
+            setattr(self, attr, frame)
+            self.notebook.add(frame, text=text)
+            self._unbuilt_tabs[str(frame)] = (build, frame)
+        self.notebook.bind("<<NotebookTabChanged>>", self.build_selected_tab)
+        self.build_selected_tab()
+
+    def build_selected_tab(self, event=None):
+        build, frame = self._unbuilt_tabs.pop(self.notebook.select(), (None, None))
+        if build is not None:
+            build(frame)
+
+    def show_busy(self, count):
+        # in-flight indicator for background database calls
+        if count:
+            self.status.configure(text=f"Working... ({count} request{'s' if count > 1 else ''})")
+            self.root.configure(cursor='watch')
+        else:
+            self.status.configure(text="Ready")
+            self.root.configure(cursor='')
+
+    def show_sync_state(self):
+        applied = conflicts = 0
+        while True:
+            try:
+                report = self.sync_reports.get_nowait()
+            except queue.Empty:
+                break
+            applied += report.get("applied", 0)
+            conflicts += report.get("conflicts", 0)
+        if applied or conflicts:
+            self.refresh_synced_views()
+        if conflicts:
+            messagebox.showwarning("Sync", f"{conflicts} change(s) were rejected by the database "
+                                           "(see Tools > Diagnostics)")
+        counts = self.journal.counts()
+        text = f"{counts['pending']} change(s) waiting to sync" if counts["pending"] else "All changes synced"
+        if counts["conflicts"]:
+            text += f", {counts['conflicts']} rejected (see Tools > Diagnostics)"
+        self.sync_status.configure(text=text)
+        self.root.after(2000, self.show_sync_state)
+
+    def refresh_synced_views(self):
+        # journaled writes reach the database in the background; redraw the lists they touch
+        for entry, view in (("a_sid", self.view_attendance), ("f_sid", self.view_fees),
+                            ("p_sid", self.view_performance)):
+            if hasattr(self, entry) and getattr(self, entry).get().strip():
+                view()
+
+    def saved(self, message):
+        # with a journal the write is only queued here, so don't claim it is in the lists yet
+        if self.journal is not None:
+            message += " (it will show once synced)"
+        messagebox.showinfo("OK", message)
+
+    def show_diagnostics(self):
+        # where the time goes: pool checkout, SQL execute/fetch, drawing the results
+        win = tk.Toplevel(self.root)
+        win.title("Diagnostics")
+        text = tk.Text(win, width=110, height=30, font=("Courier", 9))
+        text.pack(expand=True, fill='both')
+        buttons = ttk.Frame(win)
+        buttons.pack(fill='x')
+        toggle = ttk.Button(buttons)
+        toggle.pack(side='left', padx=5, pady=5)
+
+        def refresh():
+            if not win.winfo_exists():
+                return
+            toggle.configure(text="Disable" if query_stats.enabled else "Enable")
+            text.delete("1.0", tk.END)
+            text.insert(tk.END, query_stats.report())
+            if self.journal is not None:
+                text.insert(tk.END, f"\n\nWrite journal ({self.journal.path}): {self.journal.counts()}\n")
+                for entry_id, op, args, created_at, error in self.journal.conflicts():
+                    text.insert(tk.END, f"  rejected #{entry_id} {created_at} {op} {args}: {error}\n")
+            win.after(1000, refresh)
+
+        def flip():
+            if query_stats.enabled:
+                query_stats.disable()
+            else:
+                query_stats.enable()
+        toggle.configure(command=flip)
+        ttk.Button(buttons, text="Reset", command=query_stats.reset).pack(side='left', padx=5, pady=5)
+        refresh()
+
     def build_students_tab(self, frame):
         lbl_name = ttk.Label(frame, text="Name")
         lbl_name.grid(row=0, column=0, padx=3, pady=3)
@@ -343,47 +4225,94 @@ class App:
         btn_delete = ttk.Button(frame, text="Delete", command=self.delete_student)
         btn_delete.grid(row=3, column=2, padx=5)
 
+        ttk.Label(frame, text="Admission Fee (optional)").grid(row=0, column=3, padx=3, pady=3)
+        self.s_fee = ttk.Entry(frame, width=10)
+        self.s_fee.grid(row=0, column=4, padx=3, pady=3)
+
+        ttk.Label(frame, text="Search name").grid(row=4, column=0, padx=3, pady=3)
+        self.s_search = ttk.Entry(frame)
+        self.s_search.grid(row=4, column=1, padx=3, pady=3)
+        self.s_search.bind('<KeyRelease>', self.filter_students)
+        ttk.Button(frame, text="Import CSV...", command=lambda: self.import_csv("students")).grid(row=4, column=2)
+        self.student_index = None
+
         # Treeview
         cols = ('id', 'name', 'age', 'grade')
         self.tree_students = ttk.Treeview(frame, columns=cols, show='headings')
         for c in cols:
             self.tree_students.heading(c, text=c.title())
-        self.tree_students.grid(row=4, column=0, columnspan=3, pady=10, sticky='nsew')
+        self.tree_students.grid(row=5, column=0, columnspan=3, pady=10, sticky='nsew')
+        sb = ttk.Scrollbar(frame, orient='vertical')
+        sb.grid(row=5, column=3, pady=10, sticky='ns')
+        self.students_view = PagedTreeview(self.tree_students, school.view_students, school.get_student, db=self.db,
+                                           on_page=self.startup_done)
+        self.students_view.attach_scrollbar(sb)
         self.view_students()
 
+    def filter_students(self, event=None):
+        text = self.s_search.get().strip()
+        if not text:
+            self.students_view.reload()
+            return
+        if self.student_index is None:
+            # first keystroke: build the client-side index off the Tk thread
+            def ready(index):
+                self.student_index = index
+                self.filter_students()
+            self.db.submit(lambda: StudentIndex(school.view_students()), on_done=ready, key='student_index')
+            return
+        self.students_view.show_only(self.student_index.search(text, limit=500))
+
+    def students_changed(self, apply):
+        # a student was added/updated/deleted: drop the search index and update the list
+        self.student_index = None
+        if self.s_search.get().strip():
+            self.filter_students()
+        else:
+            apply()
+
     def add_student(self):
         try:
             s = Student(self.s_name.get(), self.s_age.get(), self.s_grade.get())
-            school.add_student(s)
-            messagebox.showinfo("OK", "Student added")
-            self.view_students()
+            fee = self.s_fee.get().strip()
+            fee = float(fee) if fee else None
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+
+        def done(_):
+            messagebox.showinfo("OK", "Student added" if fee is None else "Student added with admission fee")
+            self.students_changed(self.students_view.load_new)
+        # student and admission fee commit together or not at all
+        self.db.submit(school.enroll_student, s, fee, on_done=done)
 
     def view_students(self):
-        for i in self.tree_students.get_children():
-            self.tree_students.delete(i)
-        try:
-            for row in school.view_students():
-                self.tree_students.insert('', tk.END, values=(row[0], row[1], row[2], row[3]))
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.students_view.reload()
 
     def update_student(self):
         try:
-            school.update_student(self.s_id.get(), self.s_name.get(), self.s_age.get(), self.s_grade.get())
-            messagebox.showinfo("OK", "Student updated")
-            self.view_students()
+            sid = int(self.s_id.get())
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+
+        def done(_):
+            messagebox.showinfo("OK", "Student updated")
+            self.students_changed(lambda: self.students_view.refresh_row(sid))
+        self.db.submit(school.update_student, sid, self.s_name.get(), self.s_age.get(), self.s_grade.get(),
+                       on_done=done)
 
     def delete_student(self):
         try:
-            school.delete_student(self.s_id.get())
-            messagebox.showinfo("OK", "Student deleted")
-            self.view_students()
+            sid = int(self.s_id.get())
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+
+        def done(_):
+            messagebox.showinfo("OK", "Student deleted")
+            self.students_changed(lambda: self.students_view.remove(sid))
+        self.db.submit(school.delete_student, sid, on_done=done)
 
     def build_teachers_tab(self, frame):
         ttk.Label(frame, text="Name").grid(row=0, column=0)
@@ -406,41 +4335,46 @@ class App:
         for c in cols:
             self.tree_teachers.heading(c, text=c.title())
         self.tree_teachers.grid(row=4, column=0, columnspan=3, pady=10, sticky='nsew')
+        sb = ttk.Scrollbar(frame, orient='vertical')
+        sb.grid(row=4, column=3, pady=10, sticky='ns')
+        self.teachers_view = PagedTreeview(self.tree_teachers, school.view_teachers, school.get_teacher, db=self.db)
+        self.teachers_view.attach_scrollbar(sb)
         self.view_teachers()
 
     def add_teacher(self):
-        try:
-            t = Teacher(self.t_name.get(), self.t_sub.get())
-            school.add_teacher(t)
+        t = Teacher(self.t_name.get(), self.t_sub.get())
+
+        def done(_):
             messagebox.showinfo("OK", "Teacher added")
-            self.view_teachers()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+            self.teachers_view.load_new()
+        self.db.submit(school.add_teacher, t, on_done=done)
 
     def view_teachers(self):
-        for i in self.tree_teachers.get_children():
-            self.tree_teachers.delete(i)
-        try:
-            for row in school.view_teachers():
-                self.tree_teachers.insert('', tk.END, values=(row[0], row[1], row[2]))
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.teachers_view.reload()
 
     def update_teacher(self):
         try:
-            school.update_teacher(self.t_id.get(), self.t_name.get(), self.t_sub.get())
-            messagebox.showinfo("OK", "Teacher updated")
-            self.view_teachers()
+            tid = int(self.t_id.get())
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+
+        def done(_):
+            messagebox.showinfo("OK", "Teacher updated")
+            self.teachers_view.refresh_row(tid)
+        self.db.submit(school.update_teacher, tid, self.t_name.get(), self.t_sub.get(), on_done=done)
 
     def delete_teacher(self):
         try:
-            school.delete_teacher(self.t_id.get())
-            messagebox.showinfo("OK", "Teacher deleted")
-            self.view_teachers()
+            tid = int(self.t_id.get())
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+
+        def done(_):
+            messagebox.showinfo("OK", "Teacher deleted")
+            self.teachers_view.remove(tid)
+        self.db.submit(school.delete_teacher, tid, on_done=done)
 
     def build_attendance_tab(self, frame):
         ttk.Label(frame, text="Student ID").grid(row=0, column=0)
@@ -465,31 +4399,75 @@ class App:
             self.tree_att.heading(c, text=c.title())
         self.tree_att.grid(row=4, column=0, columnspan=3, pady=10, sticky='nsew')
 
+        # Class roster: mark a whole grade for one date and submit as one batch
+        roster = ttk.LabelFrame(frame, text="Class Roster")
+        roster.grid(row=5, column=0, columnspan=3, pady=5, sticky='nsew')
+        ttk.Label(roster, text="Grade").grid(row=0, column=0)
+        self.r_grade = ttk.Entry(roster)
+        self.r_grade.grid(row=0, column=1)
+        ttk.Button(roster, text="Load Roster", command=self.load_roster).grid(row=0, column=2)
+        ttk.Button(roster, text="All Present", command=lambda: self.set_roster_all(True)).grid(row=0, column=3)
+        ttk.Button(roster, text="Submit Roster", command=self.submit_roster).grid(row=0, column=4)
+
+        cols = ('id', 'name', 'present')
+        self.tree_roster = ttk.Treeview(roster, columns=cols, show='headings', height=8)
+        for c in cols:
+            self.tree_roster.heading(c, text=c.title())
+        self.tree_roster.grid(row=1, column=0, columnspan=5, pady=5, sticky='nsew')
+        # double-click (or space) toggles present/absent for the selected students
+        self.tree_roster.bind('<Double-1>', lambda e: self.toggle_roster())
+        self.tree_roster.bind('<space>', lambda e: self.toggle_roster())
+
     def mark_attendance(self):
         try:
             rec = AttendanceRecord(self.a_sid.get(), self.a_date.get(), bool(self.a_present_var.get()))
-            school.add_attendance(rec)
-            messagebox.showinfo("OK", "Attendance marked")
-            self.view_attendance()
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+
+        def done(_):
+            self.saved("Attendance marked")
+            self.view_attendance()
+        self.db.submit(self.writes.add_attendance, rec, on_done=done)
 
     def view_attendance(self):
-        for i in self.tree_att.get_children():
-            self.tree_att.delete(i)
+        def show(data):
+            replace_rows(self.tree_att, [(r[0], r[1], r[2], bool(r[3])) for r in data])
+        self.db.submit(school.view_attendance_for_student, self.a_sid.get(), on_done=show, key='attendance')
+
+    def load_roster(self):
+        def show(data):
+            replace_rows(self.tree_roster, [(sid, name, "Yes") for sid, name in data])
+        self.db.submit(school.view_students_in_grade, self.r_grade.get(), on_done=show, key='roster')
+
+    def toggle_roster(self):
+        for item in self.tree_roster.selection():
+            sid, name, present = self.tree_roster.item(item)['values']
+            self.tree_roster.item(item, values=(sid, name, "No" if present == "Yes" else "Yes"))
+
+    def set_roster_all(self, present):
+        for item in self.tree_roster.get_children():
+            sid, name, _ = self.tree_roster.item(item)['values']
+            self.tree_roster.item(item, values=(sid, name, "Yes" if present else "No"))
+
+    def submit_roster(self):
         try:
-            data = school.view_attendance_for_student(self.a_sid.get())
-            for r in data:
-                self.tree_att.insert('', tk.END, values=(r[0], r[1], r[2], bool(r[3])))
+            date = self.a_date.get()
+            records = [AttendanceRecord(v[0], date, v[2] == "Yes")
+                       for v in (self.tree_roster.item(i)['values'] for i in self.tree_roster.get_children())]
+            if not records:
+                messagebox.showwarning("Roster", "Load a roster first")
+                return
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+        self.db.submit(self.writes.add_attendance_bulk, records,
+                       on_done=lambda count: self.saved(f"Attendance marked for {count} students"))
 
     def show_attendance_percent(self):
-        try:
-            perc = school.attendance_percentage(self.a_sid.get())
-            messagebox.showinfo("Attendance %", f"{perc:.2f}%")
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.db.submit(school.attendance_percentage, self.a_sid.get(),
+                       on_done=lambda perc: messagebox.showinfo("Attendance %", f"{perc:.2f}%"),
+                       key='attendance_percent')
 
 
     def build_fees_tab(self, frame):
@@ -512,6 +4490,8 @@ class App:
         ttk.Button(frame, text="Add Fee", command=self.add_fee).grid(row=0, column=2)
         ttk.Button(frame, text="View Fees", command=self.view_fees).grid(row=1, column=2)
         ttk.Button(frame, text="Mark Paid", command=self.mark_fee_paid).grid(row=2, column=2)
+        ttk.Button(frame, text="Import CSV...", command=lambda: self.import_csv("fees")).grid(row=3, column=2)
+        ttk.Button(frame, text="Overdue Dashboard", command=self.fees_dashboard).grid(row=3, column=0)
 
         cols = ('id', 'student_id', 'amount', 'paid', 'due_date')
         self.tree_fees = ttk.Treeview(frame, columns=cols, show='headings')
@@ -522,35 +4502,32 @@ class App:
     def add_fee(self):
         try:
             fee = FeeRecord(self.f_sid.get(), self.f_amount.get(), bool(self.f_paid_var.get()), self.f_due.get())
-            school.add_fee(fee)
-            messagebox.showinfo("OK", "Fee record added")
-            self.view_fees()
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+
+        def done(_):
+            self.saved("Fee record added")
+            self.view_fees()
+        self.db.submit(self.writes.add_fee, fee, on_done=done)
 
     def view_fees(self):
-        for i in self.tree_fees.get_children():
-            self.tree_fees.delete(i)
-        try:
-            data = school.view_fees_for_student(self.f_sid.get())
-            for r in data:
-                self.tree_fees.insert('', tk.END, values=(r[0], r[1], r[2], bool(r[3]), r[4]))
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        def show(data):
+            replace_rows(self.tree_fees, [(r[0], r[1], r[2], bool(r[3]), r[4]) for r in data])
+        self.db.submit(school.view_fees_for_student, self.f_sid.get(), on_done=show, key='fees')
 
     def mark_fee_paid(self):
-        try:
-            sel = self.tree_fees.selection()
-            if not sel:
-                messagebox.showwarning("Select", "Select a fee record in the table")
-                return
-            item = self.tree_fees.item(sel[0])
-            fee_id = item['values'][0]
-            school.set_fee_paid(fee_id, True)
-            messagebox.showinfo("OK", "Marked paid")
+        sel = self.tree_fees.selection()
+        if not sel:
+            messagebox.showwarning("Select", "Select a fee record in the table")
+            return
+        item = self.tree_fees.item(sel[0])
+        fee_id = item['values'][0]
+
+        def done(_):
+            self.saved("Marked paid")
             self.view_fees()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+        self.db.submit(self.writes.set_fee_paid, fee_id, True, on_done=done)
 
     
     def build_performance_tab(self, frame):
@@ -569,6 +4546,9 @@ class App:
         ttk.Button(frame, text="Add Performance", command=self.add_performance).grid(row=0, column=2)
         ttk.Button(frame, text="View Performance", command=self.view_performance).grid(row=1, column=2)
         ttk.Button(frame, text="Generate Report", command=self.generate_report).grid(row=2, column=2)
+        ttk.Button(frame, text="Import CSV...", command=lambda: self.import_csv("performance")).grid(row=3, column=2)
+        ttk.Button(frame, text="Export All...", command=self.export_all_reports).grid(row=3, column=1)
+        ttk.Button(frame, text="Class Analytics", command=self.show_analytics).grid(row=3, column=0)
 
         cols = ('id', 'student_id', 'subject', 'marks', 'grade')
         self.tree_perf = ttk.Treeview(frame, columns=cols, show='headings')
@@ -576,30 +4556,84 @@ class App:
             self.tree_perf.heading(c, text=c.title())
         self.tree_perf.grid(row=4, column=0, columnspan=3, pady=10, sticky='nsew')
 
+    def build_profile_tab(self, frame):
+        ttk.Label(frame, text="Student ID").grid(row=0, column=0)
+        self.pr_sid = ttk.Entry(frame)
+        self.pr_sid.grid(row=0, column=1)
+        self.pr_sid.bind("<Return>", lambda e: self.load_profile())
+        ttk.Button(frame, text="Load Profile", command=self.load_profile).grid(row=0, column=2)
+        self.pr_history = tk.BooleanVar(value=False)
+        ttk.Checkbutton(frame, text="Include archived years", variable=self.pr_history).grid(row=0, column=3)
+
+        self.pr_summary = ttk.Label(frame, text="", justify='left')
+        self.pr_summary.grid(row=1, column=0, columnspan=3, sticky='w', padx=5, pady=5)
+
+        self.pr_trees = {}
+        for column, (name, cols) in enumerate((("Attendance", ('date', 'present')),
+                                               ("Fees", ('id', 'amount', 'paid', 'due_date')),
+                                               ("Performance", ('subject', 'marks', 'grade')))):
+            ttk.Label(frame, text=name).grid(row=2, column=column)
+            tree = ttk.Treeview(frame, columns=cols, show='headings', height=15)
+            for c in cols:
+                tree.heading(c, text=c.title())
+                tree.column(c, width=90)
+            tree.grid(row=3, column=column, padx=5, pady=5, sticky='nsew')
+            self.pr_trees[name] = tree
+
+    def load_profile(self):
+        student_id = self.pr_sid.get()
+        source = school.with_archive() if self.pr_history.get() else school
+        self.db.submit(source.student_profile, student_id,
+                       on_done=lambda profile: self.show_profile(student_id, profile), key='profile')
+
+    def show_profile(self, student_id, profile):
+        if profile is None:
+            self.pr_summary.config(text=f"No student with ID {student_id}")
+            for tree in self.pr_trees.values():
+                replace_rows(tree, [])
+            return
+        sid, name, age, grade = profile["student"]
+        average = profile["average_marks"]
+        self.pr_summary.config(text=(
+            f"{name} (ID {sid}), age {age}, grade {grade}\n"
+            f"Attendance: {profile['attendance_present']}/{profile['attendance_days']} days "
+            f"({profile['attendance_percentage']:.1f}%)\n"
+            f"Fees: {profile['fees_total']:.2f} billed, {profile['fees_unpaid']:.2f} unpaid, "
+            f"{profile['fees_overdue']:.2f} overdue ({profile['overdue_count']} fees)\n"
+            "Performance: " + ("no marks yet" if average is None else
+                               f"average {average:.1f} ({profile['overall_grade']})")))
+        replace_rows(self.pr_trees["Attendance"], [(r[2], "Yes" if r[3] else "No") for r in profile["attendance"]])
+        replace_rows(self.pr_trees["Fees"], [(r[0], r[2], bool(r[3]), r[4]) for r in profile["fees"]])
+        replace_rows(self.pr_trees["Performance"], profile["report"])
+
     def add_performance(self):
         try:
             p = Performance(self.p_sid.get(), self.p_subject.get(), self.p_marks.get())
-            school.add_performance(p)
-            messagebox.showinfo("OK", "Performance added")
-            self.view_performance()
         except Exception as e:
             messagebox.showerror("Error", str(e))
+            return
+
+        def done(_):
+            self.saved("Performance added")
+            self.view_performance()
+        self.db.submit(self.writes.add_performance, p, on_done=done)
 
     def view_performance(self):
-        for i in self.tree_perf.get_children():
-            self.tree_perf.delete(i)
-        try:
-            rows = school.view_performance_for_student(self.p_sid.get())
+        def show(rows):
+            values = []
             for r in rows:
                 perf = Performance(r[1], r[2], r[3], perf_id=r[0])
-                self.tree_perf.insert('', tk.END, values=(r[0], r[1], r[2], r[3], perf.calculate_grade()))
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+                values.append((r[0], r[1], r[2], r[3], perf.calculate_grade()))
+            replace_rows(self.tree_perf, values)
+        self.db.submit(school.view_performance_for_student, self.p_sid.get(), on_done=show, key='performance')
 
     def generate_report(self):
+        student_id = self.p_sid.get()
+        self.db.submit(school.generate_performance_report, student_id,
+                       on_done=lambda report: self.show_report(student_id, report), key='report')
+
+    def show_report(self, student_id, report):
         try:
-            student_id = self.p_sid.get()
-            report = school.generate_performance_report(student_id)
             if not report:
                 messagebox.showinfo("Report", "No performance records found")
                 return
@@ -620,6 +4654,8 @@ class App:
                                                     filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
                 if not path:
                     return
+                import csv
+
                 with open(path, 'w', newline='') as f:
                     w = csv.writer(f)
                     w.writerow(["Student ID", student_id])
@@ -634,6 +4670,138 @@ class App:
             messagebox.showerror("Error", str(e))
 
 
+    def fees_dashboard(self):
+        win = tk.Toplevel(self.root)
+        win.title("Fees Dashboard")
+        summary = ttk.Label(win, text="Loading...", anchor='w')
+        summary.pack(fill='x', padx=5, pady=5)
+        cols = ('id', 'student_id', 'name', 'grade', 'amount', 'due_date')
+        tree = ttk.Treeview(win, columns=cols, show='headings', height=20)
+        for c in cols:
+            tree.heading(c, text=c.title())
+        tree.pack(expand=True, fill='both')
+        limit = 1000
+
+        def load():
+            # one aggregate for the totals, one bounded index seek for the list
+            return school.fee_summary(), school.overdue_fees(limit=limit)
+
+        def show(result):
+            if not win.winfo_exists():
+                return
+            totals, rows = result
+            summary.configure(text=(
+                f"Overdue: {totals['overdue']} fees, {totals['overdue_total']:.2f}   |   "
+                f"Unpaid: {totals['unpaid']} fees, {totals['unpaid_total']:.2f} "
+                f"from {totals['students_owing']} students"
+                + (f"   (showing oldest {limit})" if totals['overdue'] > limit else "")))
+            replace_rows(tree, [tuple(r) for r in rows])
+
+        def mark_paid():
+            ids = [tree.item(i)['values'][0] for i in tree.selection()]
+            if not ids:
+                messagebox.showwarning("Select", "Select overdue fees in the table", parent=win)
+                return
+            self.db.submit(self.writes.set_fee_paid_many, ids,
+                           on_done=lambda _: self.db.submit(load, on_done=show, key='fees_dashboard'))
+
+        ttk.Button(win, text="Mark Selected Paid", command=mark_paid).pack(pady=5)
+        self.db.submit(load, on_done=show, key='fees_dashboard')
+
+    def show_analytics(self):
+        def show(result):
+            groups, ranks = result
+            win = tk.Toplevel(self.root)
+            win.title("Class Performance Analytics")
+            letters = DEFAULT_GRADE_SCALE.letters[::-1]
+            cols = ('grade', 'subject', 'count', 'mean', 'median', 'p25', 'p75', 'p90') + tuple(letters)
+            tree = ttk.Treeview(win, columns=cols, show='headings', height=20)
+            for c in cols:
+                tree.heading(c, text=c.title() if c.islower() else c)
+                tree.column(c, width=70, anchor='e')
+            tree.pack(expand=True, fill='both')
+            for (g, subj), st in sorted(groups.items(), key=lambda kv: (str(kv[0][0]), str(kv[0][1]))):
+                tree.insert('', tk.END, values=(g, subj, st["count"], f"{st['mean']:.1f}", f"{st['median']:.1f}",
+                                                f"{st['p25']:.1f}", f"{st['p75']:.1f}", f"{st['p90']:.1f}")
+                            + tuple(st["distribution"][letter] for letter in letters))
+            top = sorted((r for r in ranks.items() if r[1][1] == 1), key=lambda r: str(r[1][0]))
+            summary = ", ".join(f"grade {g}: #{sid} ({avg:.1f})" for sid, (g, _, _, avg) in top)
+            ttk.Label(win, text=f"Top of class - {summary}" if summary else "No performance data",
+                      wraplength=700).pack(fill='x', padx=5, pady=5)
+        self.db.submit(school.performance_analytics, on_done=show, key='analytics')
+
+    def export_all_reports(self):
+        path = filedialog.asksaveasfilename(defaultextension=".csv",
+                                            filetypes=[("CSV files", "*.csv"), ("Compressed CSV", "*.csv.gz"),
+                                                       ("All files", "*.*")])
+        if not path:
+            return
+        shard = messagebox.askyesno("Export", "Write a separate file for each grade?")
+
+        def done(result):
+            rows, files = result
+            where = files[0] if len(files) == 1 else f"{len(files)} files next to {path}"
+            messagebox.showinfo("Saved", f"{rows} performance rows exported to {where}")
+        self.db.submit(school.export_performance_csv, path, shard, path.endswith(".gz"),
+                       on_done=done, key='export')
+
+    def import_csv(self, kind):
+        columns = ", ".join(IMPORT_SPECS[kind][0])
+        path = filedialog.askopenfilename(title=f"Import {kind} ({columns})",
+                                          filetypes=[("CSV files", "*.csv"), ("All files", "*.*")])
+        if not path:
+            return
+
+        win = tk.Toplevel(self.root)
+        win.title(f"Importing {kind}")
+        bar = ttk.Progressbar(win, length=360, maximum=100)
+        bar.pack(padx=10, pady=10)
+        label = ttk.Label(win, text="Starting...")
+        label.pack(padx=10)
+        state = {"fraction": 0.0, "result": None, "done": False}
+
+        def progress(fraction, result):
+            # worker thread: only record the numbers, poll() draws them
+            state["fraction"] = fraction
+            state["result"] = result
+
+        def poll():
+            if not win.winfo_exists():
+                return
+            bar["value"] = state["fraction"] * 100
+            result = state["result"]
+            if result is not None:
+                label.configure(text=f"{result.inserted} imported, {result.failed} rejected")
+            if not state["done"]:
+                win.after(100, poll)
+
+        def done(result):
+            state["done"] = True
+            if not win.winfo_exists():
+                return
+            bar["value"] = 100
+            label.configure(text=result.summary())
+            if result.errors:
+                text = tk.Text(win, width=70, height=12)
+                text.pack(padx=10, pady=5)
+                for line_no, message in result.errors:
+                    text.insert(tk.END, f"line {line_no}: {message}\n")
+                if result.failed > len(result.errors):
+                    text.insert(tk.END, f"... and {result.failed - len(result.errors)} more\n")
+            ttk.Button(win, text="Close", command=win.destroy).pack(pady=5)
+            if kind == "students":
+                self.students_changed(self.students_view.load_new)
+
+        def failed(error):
+            state["done"] = True
+            if win.winfo_exists():
+                win.destroy()
+            messagebox.showerror("Import failed", str(error))
+
+        poll()
+        self.db.submit(school.import_csv, kind, path, 1000, progress, on_done=done, on_error=failed)
+
+
 def login_window():
     win = tk.Toplevel()
     win.title("Login")
@@ -657,51 +4825,478 @@ def login_window():
     win.wait_window()
 
 def main():
-    setup_database()
+    # SCHOOL_JOURNAL=path journals marks, fees and results locally so the terminal
+    # keeps working while the server is slow or away (off unless set)
+    journal_path = os.environ.get("SCHOOL_JOURNAL", "")
+    journal = WriteJournal(journal_path) if journal_path else None
+    startup.mark("imported")
+    # the schema check runs while the login window is up
+    schema = ThreadPoolExecutor(max_workers=1, thread_name_prefix="schema")
+    checked = schema.submit(setup_database)
+    schema.shutdown(wait=False)
     root = tk.Tk()
     root.title("School Management System - Login")
+    startup.mark_drawn(root, "first paint")
     # Show login first
     login_window()
-    app = App(root)
+    startup.mark("login")
+    try:
+        checked.result()
+    except Exception as e:
+        # with a journal the terminal can start while the server is unreachable;
+        # a failed migration or schema error stops it either way
+        if journal is None or not JournalSyncer.is_offline(e):
+            messagebox.showerror("Error", f"Could not prepare the database: {e}")
+            root.destroy()
+            sys.exit(1)
+    app = App(root, journal)
+    OrphanSweeper(school).start()
+    if journal is not None:
+        JournalSyncer(journal, school, on_report=app.sync_reports.put).start()
     root.mainloop()
 
 
-class CoreLogicTests(unittest.TestCase):
-    def test_performance_grade_boundaries(self):
-        # test grade boundaries
-        self.assertEqual(Performance(1, "Math", 95).calculate_grade(), "A+")
-        self.assertEqual(Performance(1, "Math", 85).calculate_grade(), "A")
-        self.assertEqual(Performance(1, "Math", 75).calculate_grade(), "B")
-        self.assertEqual(Performance(1, "Math", 65).calculate_grade(), "C")
-        self.assertEqual(Performance(1, "Math", 55).calculate_grade(), "D")
-        self.assertEqual(Performance(1, "Math", 45).calculate_grade(), "F")
-
-    def test_fee_overdue_logic(self):
-        today = datetime.date.today()
-        past = today - datetime.timedelta(days=10)
-        future = today + datetime.timedelta(days=10)
-        fr1 = FeeRecord(1, 100.0, paid=False, due_date=past)
-        fr2 = FeeRecord(1, 150.0, paid=True, due_date=past)
-        fr3 = FeeRecord(1, 200.0, paid=False, due_date=future)
-        self.assertTrue(fr1.is_overdue())
-        self.assertFalse(fr2.is_overdue())
-        self.assertFalse(fr3.is_overdue())
-
-    def test_attendance_percentage_calculation(self):
-        
-        records = [
-            AttendanceRecord(1, datetime.date(2023,1,1), True),
-            AttendanceRecord(1, datetime.date(2023,1,2), False),
-            AttendanceRecord(1, datetime.date(2023,1,3), True)
-        ]
-        total = len(records)
-        present = sum(1 for r in records if r.present)
-        perc = present / total * 100.0
-        self.assertAlmostEqual(perc, 66.6666666667, places=3)
+def _bench_students(n):
+    # students 1..n, so benchmark child rows satisfy the foreign keys
+    conn = get_connection()
+    conn.begin()
+    conn.cursor().executemany("INSERT INTO students(id, name, age, grade) VALUES(?,?,?,?)",
+                              [(i, f"Student {i}", 10, str(i % 12 + 1)) for i in range(1, n + 1)])
+    conn.commit()
+    conn.close()
+
+
+_FIRST_NAMES = ["Ali", "Sara", "Omar", "Ayesha", "Bilal", "Fatima", "Hamza", "Zainab", "Usman", "Hina"]
+_LAST_NAMES = ["Khan", "Ahmed", "Shah", "Malik", "Butt", "Raza", "Iqbal", "Qureshi", "Sheikh", "Chaudhry"]
+_SUBJECTS = ["Math", "English", "Urdu", "Science", "History"]
+
+
+def generate_school(n_students, days=60, fees_per_student=3, terms=2, start=datetime.date(2024, 1, 1),
+                    seed=1, batch_size=10000):
+    """Fill the configured database with a synthetic school and return the row counts.
+
+    n_students across grades 1-12, one attendance mark per student per school day
+    (weekdays, `days` of them, each student with their own attendance rate),
+    fees_per_student monthly fees (earlier ones mostly paid) and one mark per
+    subject per term. The same seed gives the same school.
+    """
+    import random
+
+    rng = random.Random(seed)
+    school_days = []
+    day = start
+    while len(school_days) < days:
+        if day.weekday() < 5:
+            school_days.append(day)
+        day += datetime.timedelta(days=1)
+    counts = Counter()
+
+    def insert(table, columns, rows):
+        for i in range(0, len(rows), batch_size):
+            c.executemany(f"INSERT INTO {table}({', '.join(columns)}) VALUES({','.join('?' * len(columns))})",
+                          rows[i:i + batch_size])
+        counts[table] += len(rows)
+
+    with transaction() as conn:
+        c = conn.cursor()
+        c.execute("SELECT COALESCE(MAX(id), 0) FROM students")
+        first_id = c.fetchone()[0] + 1
+        ids = range(first_id, first_id + n_students)
+        insert("students", ("id", "name", "age", "grade"),
+               [(sid, f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)} {sid}", sid % 12 + 6, str(sid % 12 + 1))
+                for sid in ids])
+        backend.bump_version(c, "students")
+        rates = {sid: rng.uniform(0.75, 0.99) for sid in ids}
+        for d in school_days:
+            insert("attendance", ("student_id", "date", "present"),
+                   [(sid, d, int(rng.random() < rates[sid])) for sid in ids])
+        fees = []
+        for sid in ids:
+            for k in range(fees_per_student):
+                due = start + datetime.timedelta(days=30 * k + 10)
+                fees.append((sid, 2500.0, int(rng.random() < 0.9 - 0.25 * k / max(1, fees_per_student)), due))
+        insert("fees", ("student_id", "amount", "paid", "due_date"), fees)
+        year = academic_year(start)
+        insert("performance", ("student_id", "subject", "marks", "academic_year"),
+               [(sid, subject, round(min(100.0, max(0.0, rng.gauss(65, 15))), 1), year)
+                for _ in range(terms) for sid in ids for subject in _SUBJECTS])
+        # raw inserts bypass School, so recompute the attendance rollups once at the end
+        backend.rebuild_attendance_rollups(c)
+    return dict(counts)
+
+
+def _timed(fn, repeat, setup=None):
+    # setup, if given, runs untimed before every run
+    timings = []
+    result = None
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        t0 = time.perf_counter()
+        result = fn()
+        timings.append(time.perf_counter() - t0)
+    timings.sort()
+    rows = len(result) if isinstance(result, (list, tuple, dict)) else None
+    return {"runs": repeat, "min_ms": timings[0] * 1000, "median_ms": percentile(timings, 50) * 1000,
+            "p95_ms": percentile(timings, 95) * 1000, "rows": rows}
+
+
+def benchmark_suite(scales=(1000, 10000), days=40, repeat=5, seed=1):
+    """Time every School operation and the App refresh paths at several school sizes.
+
+    Each scale gets a fresh SQLite database filled by generate_school. Reads use
+    an uncached School so they measure the database; "cached." entries repeat the
+    list reads through the write-through cache. App refresh paths are the calls
+    each tab makes, timed without Tk. Returns a JSON-ready dict; compare two runs
+    with compare_benchmarks.
+    """
+    import platform
+    import random
+    import subprocess
+    import tempfile
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5,
+                                cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    report = {"meta": {"commit": commit, "python": platform.python_version(), "platform": platform.platform(),
+                       "time": datetime.datetime.now().isoformat(timespec="seconds"), "days": days,
+                       "repeat": repeat, "seed": seed},
+              "results": []}
+    for n in scales:
+        rng = random.Random(seed)
+        with tempfile.TemporaryDirectory() as tmpdir, scratch_database(os.path.join(tmpdir, "bench.db")):
+            setup_database()
+            t0 = time.perf_counter()
+            counts = generate_school(n, days=days, seed=seed)
+            report["results"].append({"scale": n, "op": "generate_school", "runs": 1,
+                                      "median_ms": (time.perf_counter() - t0) * 1000,
+                                      "rows": sum(counts.values())})
+            plain, cached = School(), School(cache=True)
+            pick = lambda: rng.randint(1, n)
+            fee_ids = list(range(1, min(100, n) + 1))
+            next_day = [datetime.date(2030, 1, 1)]
+
+            def roster():
+                # Attendance tab: submit one grade's roster for a new day
+                next_day[0] += datetime.timedelta(days=1)
+                return plain.add_attendance_bulk(AttendanceRecord(sid, next_day[0], True)
+                                                 for sid, _ in plain.view_students_in_grade("5"))
+            doomed = []
+
+            def reseed():
+                # five new students with a full history before each timed delete
+                generate_school(5, days=days, seed=seed)
+                conn = get_connection()
+                c = conn.cursor()
+                c.execute("SELECT MAX(id) FROM students")
+                last = c.fetchone()[0]
+                conn.close()
+                doomed[:] = range(last - 4, last + 1)
+            setups = {"delete_students": reseed}
+            ops = [
+                ("add_student", lambda: plain.add_student(Student("Bench Student", 12, "7"))),
+                ("enroll_student", lambda: plain.enroll_student(Student("Bench Student", 12, "7"), 2500.0)),
+                ("update_student", lambda: plain.update_student(n, "Bench Renamed", 12, "7")),
+                ("get_student", lambda: plain.get_student(pick())),
+                ("view_students", lambda: plain.view_students()),
+                ("search_students", lambda: plain.search_students(rng.choice(_FIRST_NAMES)[:3], limit=100)),
+                ("view_attendance_for_student", lambda: plain.view_attendance_for_student(pick())),
+                ("attendance_percentage", lambda: plain.attendance_percentage(pick())),
+                ("attendance_stats", lambda: plain.attendance_stats()),
+                ("grade_attendance", lambda: plain.grade_attendance()),
+                ("view_fees_for_student", lambda: plain.view_fees_for_student(pick())),
+                ("set_fee_paid_many", lambda: plain.set_fee_paid_many(fee_ids)),
+                ("overdue_fees", lambda: plain.overdue_fees(as_of=datetime.date(2024, 6, 1))),
+                ("outstanding_balance_by_student", lambda: plain.outstanding_balance_by_student()),
+                ("fee_summary", lambda: plain.fee_summary()),
+                ("view_performance_for_student", lambda: plain.view_performance_for_student(pick())),
+                ("generate_performance_report", lambda: plain.generate_performance_report(pick())),
+                ("performance_analytics", lambda: plain.performance_analytics()),
+                ("student_profile", lambda: plain.student_profile(pick())),
+                ("student_profiles.100", lambda: plain.student_profiles(rng.sample(range(1, n + 1), min(100, n)))),
+                ("cached.view_students", lambda: cached.view_students()),
+                ("cached.get_student", lambda: cached.get_student(pick())),
+                ("app.students_page", lambda: plain.view_students(200, pick())),
+                ("app.students_index", lambda: StudentIndex(plain.view_students())),
+                ("app.roster_load", lambda: plain.view_students_in_grade("5")),
+                ("app.roster_submit", roster),
+                ("app.fees_dashboard", lambda: (plain.fee_summary(), plain.overdue_fees(limit=1000))),
+                ("app.class_analytics", lambda: plain.performance_analytics()),
+                ("app.profile", lambda: plain.student_profile(pick())),
+                ("delete_students", lambda: plain.delete_students(doomed)),
+            ]
+            for name, fn in ops:
+                report["results"].append(dict(_timed(fn, repeat, setups.get(name)), scale=n, op=name))
+    return report
+
+
+def compare_benchmarks(baseline, current, tolerance=0.25, min_ms=1.0):
+    # [(scale, op, baseline median ms, current median ms)] for operations that got
+    # more than `tolerance` slower; timings under min_ms are too noisy to compare
+    before = {(r["scale"], r["op"]): r["median_ms"] for r in baseline["results"]}
+    slower = []
+    for r in current["results"]:
+        old = before.get((r["scale"], r["op"]))
+        if old is not None and max(old, r["median_ms"]) >= min_ms and r["median_ms"] > old * (1 + tolerance):
+            slower.append((r["scale"], r["op"], old, r["median_ms"]))
+    return slower
+
+
+def benchmark_attendance(n_students=40, days=20, path=None):
+    # Compare per-row add_attendance with add_attendance_bulk on the SQLite
+    # backend. Returns rows/second for both paths.
+    import tempfile
+
+    tmpdir = None
+    if path is None:
+        tmpdir = tempfile.TemporaryDirectory()
+        path = os.path.join(tmpdir.name, "bench.db")
+    results = {}
+    try:
+        with scratch_database(path):
+            setup_database()
+            _bench_students(n_students)
+            plain = School()
+            for label, first_day in (("per_row", datetime.date(2024, 1, 1)), ("bulk", datetime.date(2025, 1, 1))):
+                # each path marks days nobody has marked yet
+                records = [AttendanceRecord(sid, first_day + datetime.timedelta(days=d), (sid + d) % 7 != 0)
+                           for d in range(days) for sid in range(1, n_students + 1)]
+                t0 = time.perf_counter()
+                if label == "per_row":
+                    for rec in records:
+                        plain.add_attendance(rec)
+                else:
+                    for d in range(days):
+                        plain.add_attendance_bulk(records[d * n_students:(d + 1) * n_students])
+                elapsed = time.perf_counter() - t0
+                results[label] = {"rows": len(records), "seconds": elapsed,
+                                  "rows_per_sec": len(records) / elapsed if elapsed else float("inf")}
+        results["speedup"] = results["bulk"]["rows_per_sec"] / results["per_row"]["rows_per_sec"]
+    finally:
+        if tmpdir is not None:
+            tmpdir.cleanup()
+    return results
+
+
+def benchmark_search(n_students=100_000, queries=200, seed=7):
+    # Time School.search_students on the SQLite backend and StudentIndex
+    # lookups over the same synthetic roster.
+    import random
+    import tempfile
+
+    rng = random.Random(seed)
+    rows = [(i, f"{rng.choice(_FIRST_NAMES)} {rng.choice(_LAST_NAMES)} {i}", rng.randint(5, 18), str(rng.randint(1, 12)))
+            for i in range(1, n_students + 1)]
+
+    probes = []
+    for _ in range(queries):
+        name = rng.choice(rows)[1]
+        grade = str(rng.randint(1, 12)) if rng.random() < 0.3 else None
+        probes.append((name[:rng.randint(1, len(name))], grade))
+
+    def timed(search):
+        timings = []
+        for text, grade in probes:
+            t0 = time.perf_counter()
+            search(text, grade)
+            timings.append(time.perf_counter() - t0)
+        timings.sort()
+        return {"median_ms": timings[len(timings) // 2] * 1000,
+                "p99_ms": timings[int(len(timings) * 0.99) - 1] * 1000}
+
+    t0 = time.perf_counter()
+    index = StudentIndex(rows)
+    results = {"students": n_students, "index_build_seconds": time.perf_counter() - t0,
+               "index": timed(lambda text, grade: index.search(text, grade=grade, limit=100))}
+
+    with tempfile.TemporaryDirectory() as tmpdir, scratch_database(os.path.join(tmpdir, "bench.db")):
+        setup_database()
+        conn = get_connection()
+        c = conn.cursor()
+        conn.begin()
+        c.executemany("INSERT INTO students(id, name, age, grade) VALUES(?,?,?,?)", rows)
+        conn.commit()
+        c.execute("ANALYZE")
+        conn.close()
+        plain = School()
+        results["sql"] = timed(lambda text, grade: plain.search_students(text, grade=grade, limit=100))
+    return results
+
+
+def benchmark_import(n_rows=200_000, batch_size=1000):
+    # Write a synthetic performance CSV and stream it into the SQLite backend.
+    import csv
+    import tempfile
+
+    subjects = _SUBJECTS
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "performance.csv")
+        with open(path, "w", newline="") as f:
+            w = csv.writer(f)
+            w.writerow(["student_id", "subject", "marks"])
+            for i in range(n_rows):
+                w.writerow([i % 5000 + 1, subjects[i % 5], (i * 37) % 101])
+        with scratch_database(os.path.join(tmpdir, "bench.db")):
+            setup_database()
+            _bench_students(5000)
+            result = School().import_csv("performance", path, batch_size=batch_size)
+    return {"rows": result.inserted, "seconds": result.seconds,
+            "rows_per_sec": result.inserted / result.seconds if result.seconds else float("inf")}
+
+
+def benchmark_api(clients=50, requests_per_client=40, n_students=2000, workers=8, seed=5):
+    # Concurrent keep-alive clients against SchoolApi on a temporary SQLite database:
+    # paged and conditional student lists, per-student fees and attendance writes.
+    import random
+    import tempfile
+
+    rng = random.Random(seed)
+    with tempfile.TemporaryDirectory() as tmpdir, scratch_database(os.path.join(tmpdir, "bench.db"), max_size=workers):
+        setup_database()
+        _bench_students(n_students)
+        api = SchoolApi(School(cache=True), "bench", writes=True, max_workers=workers)
+        latencies = []
+
+        async def client(n):
+            reader, writer = await asyncio.open_connection(*address)
+            etag = None
+            for i in range(requests_per_client):
+                sid = rng.randint(1, n_students)
+                t0 = time.perf_counter()
+                if i % 4 == 0:
+                    _, headers, _ = await api_request(reader, writer, "GET", "/students?limit=100",
+                                                      headers={"If-None-Match": etag} if etag else None,
+                                                      token="bench")
+                    etag = headers.get("etag")
+                elif i % 4 == 1:
+                    await api_request(reader, writer, "GET", f"/students?limit=100&after_id={sid}", token="bench")
+                elif i % 4 == 2:
+                    await api_request(reader, writer, "GET", f"/students/{sid}/fees", token="bench")
+                else:
+                    await api_request(reader, writer, "POST", "/attendance",
+                                      {"student_id": sid, "date": f"2024-01-{n % 28 + 1:02d}", "present": True},
+                                      token="bench")
+                latencies.append(time.perf_counter() - t0)
+            writer.close()
+
+        async def run():
+            nonlocal address
+            server = await api.start("127.0.0.1", 0)
+            address = server.sockets[0].getsockname()[:2]
+            async with server:
+                t0 = time.perf_counter()
+                await asyncio.gather(*(client(n) for n in range(clients)))
+                return time.perf_counter() - t0
+
+        address = None
+        seconds = asyncio.run(run())
+        api.close()
+    latencies.sort()
+    return {"requests": len(latencies), "seconds": seconds, "requests_per_sec": len(latencies) / seconds,
+            "p50_ms": percentile(latencies, 50) * 1000, "p95_ms": percentile(latencies, 95) * 1000,
+            "not_modified": api.not_modified, "coalesced": api.coalesced}
+
+
+def benchmark_records(n_students=5000, days=200):
+    # A school year of attendance (n_students x days marks) as slotted
+    # AttendanceRecords and as an AttendanceBatch: build time and traced memory.
+    import tracemalloc
+
+    start = datetime.date(2024, 1, 1)
+    day_texts = [(start + datetime.timedelta(days=d)).isoformat() for d in range(days)]
+    results = {"marks": n_students * days}
+    for label in ("records", "batch"):
+        tracemalloc.start()
+        t0 = time.perf_counter()
+        if label == "records":
+            data = [AttendanceRecord(sid, text, sid % 9) for text in day_texts for sid in range(1, n_students + 1)]
+        else:
+            data = AttendanceBatch((sid, text, sid % 9) for text in day_texts for sid in range(1, n_students + 1))
+        seconds = time.perf_counter() - t0
+        memory = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        results[label] = {"seconds": seconds, "mb": memory / 2**20}
+        del data
+    t0 = time.perf_counter()
+    for text in day_texts * 1000:
+        datetime.datetime.strptime(text, "%Y-%m-%d").date()
+    strptime = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    for text in day_texts * 1000:
+        parse_date(text)
+    results["date_parse_speedup"] = strptime / (time.perf_counter() - t0)
+    return results
+
+
+def benchmark_analytics(n_rows=1_000_000, seed=11):
+    # Bulk grading and class analytics over in-memory columns.
+    import random
+
+    rng = random.Random(seed)
+    subjects_pool = ["Math", "English", "Urdu", "Science", "History"]
+    n_students = max(1, n_rows // 5)
+    student_ids = array("q", (i % n_students + 1 for i in range(n_rows)))
+    grades = [str(sid % 12 + 1) for sid in student_ids]
+    subjects = [subjects_pool[i % 5] for i in range(n_rows)]
+    marks = array("d", (rng.uniform(20, 100) for _ in range(n_rows)))
+
+    t0 = time.perf_counter()
+    DEFAULT_GRADE_SCALE.grade_many(marks)
+    grading = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    class_performance_analytics(grades, student_ids, subjects, marks)
+    analytics = time.perf_counter() - t0
+    return {"rows": n_rows, "grading_seconds": grading, "analytics_seconds": analytics}
+
 
 if __name__ == "__main__":
-    import sys
     if len(sys.argv) > 1 and sys.argv[1] == "test":
-        unittest.main(argv=[sys.argv[0]])
+        # the tests import this file as school_management; hand them this copy
+        import unittest
+        sys.modules["school_management"] = sys.modules[__name__]
+        unittest.main(module="test_school_management", argv=[sys.argv[0]])
+    elif len(sys.argv) > 2 and sys.argv[1] == "bench" and sys.argv[2] == "micro":
+        for name, value in benchmark_attendance().items():
+            print(name, value)
+        print("search", benchmark_search())
+        print("import", benchmark_import())
+        print("analytics", benchmark_analytics())
+        print("records", benchmark_records())
+        print("api", benchmark_api())
+    elif len(sys.argv) > 1 and sys.argv[1] == "bench":
+        # bench [--scales 1000,10000] [--days 40] [--repeat 5] [--out run.json] [--compare baseline.json]
+        import argparse
+        parser = argparse.ArgumentParser(prog="bench")
+        parser.add_argument("--scales", default="1000,10000")
+        parser.add_argument("--days", type=int, default=40)
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--out")
+        parser.add_argument("--compare")
+        parser.add_argument("--tolerance", type=float, default=0.25)
+        args = parser.parse_args(sys.argv[2:])
+        report = benchmark_suite([int(n) for n in args.scales.split(",")], args.days, args.repeat)
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump(report, f, indent=1)
+        else:
+            json.dump(report, sys.stdout, indent=1)
+            print()
+        if args.compare:
+            with open(args.compare) as f:
+                slower = compare_benchmarks(json.load(f), report, args.tolerance)
+            for scale, op, old, new in slower:
+                print(f"slower: {op} at {scale} students: {old:.2f} ms -> {new:.2f} ms", file=sys.stderr)
+            sys.exit(1 if slower else 0)
+    elif len(sys.argv) > 2 and sys.argv[1] == "archive":
+        # python "School Management.py" archive 2023   (run again to resume)
+        setup_database()
+        print(json.dumps(school.archive_year(int(sys.argv[2])), indent=1))
+    elif len(sys.argv) > 1 and sys.argv[1] == "serve":
+        # python "School Management.py" serve [host:port] [--writes]
+        args = [a for a in sys.argv[2:] if a != "--writes"]
+        host, _, port = (args[0] if args else "127.0.0.1:8080").rpartition(":")
+        serve(host or "127.0.0.1", int(port), writes="--writes" in sys.argv[2:])
     else:
         main()
@@ -0,0 +1,988 @@
+"""Tests for School Management.py.
+
+Run with  python "School Management.py" test  or any unittest/pytest runner from
+this directory. The app's file name has a space in it, so it is loaded by path
+and registered as the module school_management.
+"""
+import asyncio
+import contextlib
+import csv
+import datetime
+import gzip
+import importlib.util
+import io
+import json
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+import tkinter as tk
+import unittest
+
+
+def load_app():
+    if "school_management" not in sys.modules:
+        path = os.path.join(os.path.dirname(os.path.abspath(__file__)), "School Management.py")
+        spec = importlib.util.spec_from_file_location("school_management", path)
+        module = importlib.util.module_from_spec(spec)
+        sys.modules["school_management"] = module
+        spec.loader.exec_module(module)
+    return sys.modules["school_management"]
+
+
+app = load_app()
+from school_management import (
+    AsyncSchool, AttendanceBatch, AttendanceRecord, ConnectionPool, DbExecutor, FeeBatch, FeeRecord,
+    GradeScale, JournalSyncer, JournaledSchool, PagedTreeview, Performance, PoolTimeout, School,
+    SchoolApi, SqliteBackend, StartupTimer, Student, StudentIndex, TableCache, WriteJournal,
+    academic_year, api_request, attendance_stats_from_rows, benchmark_attendance, benchmark_suite,
+    class_performance_analytics, compare_benchmarks, configure_backend, configure_pool, escape_like,
+    generate_school, get_connection, parse_date, query_stats, setup_database,
+)
+
+
+class CoreLogicTests(unittest.TestCase):
+    def test_performance_grade_boundaries(self):
+        # test grade boundaries
+        self.assertEqual(Performance(1, "Math", 95).calculate_grade(), "A+")
+        self.assertEqual(Performance(1, "Math", 85).calculate_grade(), "A")
+        self.assertEqual(Performance(1, "Math", 75).calculate_grade(), "B")
+        self.assertEqual(Performance(1, "Math", 65).calculate_grade(), "C")
+        self.assertEqual(Performance(1, "Math", 55).calculate_grade(), "D")
+        self.assertEqual(Performance(1, "Math", 45).calculate_grade(), "F")
+
+    def test_fee_overdue_logic(self):
+        today = datetime.date.today()
+        past = today - datetime.timedelta(days=10)
+        future = today + datetime.timedelta(days=10)
+        fr1 = FeeRecord(1, 100.0, paid=False, due_date=past)
+        fr2 = FeeRecord(1, 150.0, paid=True, due_date=past)
+        fr3 = FeeRecord(1, 200.0, paid=False, due_date=future)
+        self.assertTrue(fr1.is_overdue())
+        self.assertFalse(fr2.is_overdue())
+        self.assertFalse(fr3.is_overdue())
+
+    def test_attendance_percentage_calculation(self):
+        with tempfile.TemporaryDirectory() as tmpdir:
+            configure_backend(SqliteBackend(os.path.join(tmpdir, "school.db")))
+            try:
+                setup_database()
+                s = School()
+                sid = s.add_student(Student("A", 10, "5"))
+                s.add_attendance_bulk([
+                    AttendanceRecord(sid, datetime.date(2023,1,1), True),
+                    AttendanceRecord(sid, datetime.date(2023,1,2), False),
+                    AttendanceRecord(sid, datetime.date(2023,1,3), True)
+                ])
+                self.assertAlmostEqual(s.attendance_percentage(sid), 66.6666666667, places=3)
+                self.assertEqual(s.attendance_percentage(sid + 1), 0.0)
+            finally:
+                app.pool.close()
+
+    def test_class_performance_analytics(self):
+        scale = GradeScale()
+        self.assertEqual(scale.grade_many([100, 90, 89.9, 50, 49]), ["A+", "A+", "A", "D", "F"])
+        groups, ranks = class_performance_analytics(
+            ["5", "5", "5", "5", "6"], [1, 1, 2, 3, 4], ["Math", "Urdu", "Math", "Math", "Math"],
+            [90, 70, 60, 80, 40])
+        math5 = groups[("5", "Math")]
+        self.assertEqual((math5["count"], math5["mean"], math5["median"]), (3, 230 / 3, 80))
+        self.assertEqual(math5["p25"], 70)
+        self.assertEqual(math5["distribution"], {"F": 0, "D": 0, "C": 1, "B": 0, "A": 1, "A+": 1})
+        self.assertEqual(ranks[1], ("5", 1, 3, 80.0))
+        self.assertEqual(ranks[3][1], 1)   # tie with student 1
+        self.assertEqual(ranks[2][1], 3)
+        self.assertEqual(ranks[4], ("6", 1, 1, 40.0))
+
+    def test_record_slots_dates_and_batches(self):
+        rec = AttendanceRecord("3", "2024-1-5", 1)
+        self.assertEqual((rec.student_id, rec.date, rec.present), (3, datetime.date(2024, 1, 5), True))
+        self.assertIs(parse_date("2024-01-05"), parse_date(" 2024-01-05"))
+        with self.assertRaises(AttributeError):
+            rec.note = "x"
+        with self.assertRaises(ValueError):
+            FeeRecord(1, 10, due_date="05/01/2024")
+        batch = AttendanceBatch([rec, (4, datetime.date(2024, 1, 5), False), (3, "2024-01-06", True)])
+        self.assertEqual(list(batch)[1], (4, datetime.date(2024, 1, 5), 0))
+        self.assertEqual(batch.stats()[3], (2, 2, 100.0))
+        self.assertEqual(batch.nbytes(), 3 * 13)
+        fees = FeeBatch([FeeRecord(1, 10, True, "2024-02-01"), (2, 5, False, "2024-02-01")])
+        self.assertEqual(list(fees), [(1, 10.0, 1, datetime.date(2024, 2, 1)), (2, 5.0, 0, datetime.date(2024, 2, 1))])
+
+    def test_attendance_stats_from_rows(self):
+        stats = attendance_stats_from_rows([(1, True), (1, False), (1, True), (2, False)])
+        self.assertEqual(stats[1][:2], (3, 2))
+        self.assertAlmostEqual(stats[1][2], 66.6666666667, places=3)
+        self.assertEqual(stats[2], (1, 0, 0.0))
+
+
+class StudentIndexTests(unittest.TestCase):
+    def test_prefix_then_substring_with_filters(self):
+        index = StudentIndex([(1, "Sara Khan", 10, "5"), (2, "Ali Sarwar", 11, "5"),
+                              (3, "Sarah Malik", 12, "6"), (4, "Bilal", 9, "5")])
+        self.assertEqual([r[0] for r in index.search("sar")], [1, 3, 2])
+        self.assertEqual([r[0] for r in index.search("sar", grade="5")], [1, 2])
+        self.assertEqual([r[0] for r in index.search("", age_range=(9, 10))], [4, 1])
+        self.assertEqual(index.search("zzz"), [])
+
+    def test_escape_like(self):
+        self.assertEqual(escape_like("50%_[a]"), "50\\%\\_\\[a]")
+
+
+class TableCacheTests(unittest.TestCase):
+    def test_write_through_and_foreign_writes(self):
+        cache = TableCache("students", "SELECT 1")
+        cache.load(3, [(2, "B", 11, "5"), (1, "A", 10, "5")])
+        cache.written(4, lambda c: c.put((5, "C", 12, "6")))
+        self.assertEqual([r[0] for r in cache.page()], [1, 2, 5])
+        self.assertEqual(cache.page(1, after_id=1), [(2, "B", 11, "5")])
+        cache.written(5, lambda c: c.remove(2))
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.version, 5)
+        # version jumped: someone else wrote, so the copy must be reloaded
+        cache.written(7, lambda c: c.remove(1))
+        self.assertIsNone(cache.version)
+
+
+class SqliteSchoolTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        configure_backend(SqliteBackend(os.path.join(self.tmpdir.name, "school.db")))
+        setup_database()
+        self.school = School()
+
+    def tearDown(self):
+        app.pool.close()
+        self.tmpdir.cleanup()
+
+    def test_students_paging_and_search(self):
+        ids = [self.school.add_student(Student(name, 10 + i, "5")) for i, name in
+               enumerate(["Sara", "Ali", "Sarah", "Omar", "50% Sam"])]
+        self.assertEqual([r[0] for r in self.school.view_students(2, after_id=ids[1])], ids[2:4])
+        self.assertEqual(tuple(self.school.get_student(ids[1])), (ids[1], "Ali", 11, "5"))
+        self.assertEqual([r[1] for r in self.school.search_students("sar")], ["Sara", "Sarah"])
+        self.assertEqual([r[1] for r in self.school.search_students("50%")], ["50% Sam"])
+        self.assertEqual(len(self.school.search_students(age_range=(11, 12), limit=1)), 1)
+
+    def test_attendance_bulk_and_stats(self):
+        a = self.school.add_student(Student("A", 10, "5"))
+        b = self.school.add_student(Student("B", 10, "6"))
+        day = datetime.date(2024, 3, 1)
+        self.school.add_attendance_bulk([AttendanceRecord(a, day, True), AttendanceRecord(b, day, False),
+                                         AttendanceRecord(a, "2024-03-02", False)])
+        self.assertAlmostEqual(self.school.attendance_percentage(a), 50.0)
+        stats = self.school.attendance_stats(grade="5", start_date=day, end_date=day)
+        self.assertEqual([tuple(r) for r in stats], [(a, "A", "5", 1, 1, 100.0)])
+        self.assertEqual(self.school.view_attendance_for_student(a)[0][2], day)
+
+    def test_migrations_adopt_legacy_schema(self):
+        # a database created by the old setup_database: bare tables, duplicate attendance
+        path = os.path.join(self.tmpdir.name, "legacy.db")
+        legacy = sqlite3.connect(path)
+        legacy.executescript("""
+            CREATE TABLE students(id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, age INT, grade TEXT);
+            CREATE TABLE attendance(id INTEGER PRIMARY KEY AUTOINCREMENT, student_id INT, date DATE, present BIT);
+            INSERT INTO students(name, age, grade) VALUES('A', 10, '5');
+            INSERT INTO attendance(student_id, date, present) VALUES(1, '2024-01-01', 1);
+            INSERT INTO attendance(student_id, date, present) VALUES(1, '2024-01-01', 0);
+            INSERT INTO attendance(student_id, date, present) VALUES(1, '2024-01-02', 1);
+        """)
+        legacy.close()
+        configure_backend(SqliteBackend(path))
+        latest = app.backend.migrations()[-1][0]
+        self.assertEqual(setup_database(), latest)
+        self.assertEqual(setup_database(), latest)
+        self.assertAlmostEqual(self.school.attendance_percentage(1), 50.0)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.school.add_attendance(AttendanceRecord(1, "2024-01-02", True))
+        self.school.add_attendance_bulk([AttendanceRecord(1, "2024-01-02", False)])
+        self.assertAlmostEqual(self.school.attendance_percentage(1), 0.0)
+        with self.assertRaises(sqlite3.IntegrityError):
+            self.school.add_fee(FeeRecord(99, 10.0))
+
+    def test_transaction_commits_once_and_rolls_back_everything(self):
+        sid = self.school.enroll_student(Student("A", 10, "5"), 500.0, first_day="2024-01-01")
+        self.assertEqual(len(self.school.view_fees_for_student(sid)), 1)
+        with self.assertRaises(sqlite3.IntegrityError):
+            with self.school.transaction():
+                b = self.school.add_student(Student("B", 10, "5"))
+                self.school.add_fee(FeeRecord(b, 100.0))
+                self.school.add_attendance(AttendanceRecord(sid, "2024-01-01", False))
+        self.assertEqual([r[1] for r in self.school.view_students()], ["A"])
+        self.assertEqual(app.pool.stats()["in_use"], 0)
+        # a failing nested block only undoes itself
+        with self.school.transaction():
+            self.school.add_fee(FeeRecord(sid, 1.0))
+            try:
+                with self.school.transaction():
+                    self.school.add_fee(FeeRecord(sid, 2.0))
+                    raise ValueError("undo inner")
+            except ValueError:
+                pass
+        self.assertEqual(sorted(r[2] for r in self.school.view_fees_for_student(sid)), [1.0, 500.0])
+
+    def test_api_pagination_etags_and_batch(self):
+        api = SchoolApi(self.school, "secret", writes=True, max_workers=2, page_size=2)
+
+        async def scenario():
+            server = await api.start("127.0.0.1", 0)
+            async with server:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                call = lambda *args, **kw: api_request(reader, writer, *args, token="secret", **kw)
+                for name in ("Ali", "Sara", "Omar"):
+                    status, _, body = await call("POST", "/students", {"name": name, "age": 10, "grade": "5"})
+                    self.assertEqual(status, 201)
+                status, headers, page = await call("GET", "/students")
+                self.assertEqual([s["name"] for s in page["items"]], ["Ali", "Sara"])
+                _, _, rest = await call("GET", f"/students?after_id={page['next_after_id']}")
+                self.assertEqual(([s["name"] for s in rest["items"]], rest["next_after_id"]), (["Omar"], None))
+                status, _, _ = await call("GET", "/students", headers={"If-None-Match": headers["etag"]})
+                self.assertEqual(status, 304)
+                status, _, result = await call("POST", "/batch", {"atomic": True, "requests": [
+                    {"method": "POST", "path": "/fees", "body": {"student_id": 1, "amount": 50, "due_date": "2020-01-01"}},
+                    {"method": "POST", "path": "/attendance", "body": [
+                        {"student_id": 1, "date": "2024-01-01", "present": False},
+                        {"student_id": 2, "date": "2024-01-01", "present": True}]},
+                    {"method": "PUT", "path": "/students/3", "body": {"name": "Umar", "age": 11, "grade": "6"}}]})
+                self.assertEqual([r["status"] for r in result], [201, 201, 200])
+                status, _, _ = await call("GET", "/students", headers={"If-None-Match": headers["etag"]})
+                self.assertEqual(status, 200)
+                status, headers, fees = await call("GET", "/fees/overdue")
+                self.assertEqual([(f["name"], f["due_date"]) for f in fees["items"]], [("Ali", "2020-01-01")])
+                status, _, _ = await call("GET", "/fees/overdue", headers={"If-None-Match": headers["etag"]})
+                self.assertEqual(status, 304)
+                status, _, error = await call("POST", "/batch", {"atomic": True, "requests": [
+                    {"method": "POST", "path": "/teachers", "body": {"name": "T", "subject": "Math"}},
+                    {"method": "POST", "path": "/fees", "body": {"student_id": 99, "amount": 1}}]})
+                self.assertEqual(status, 409)
+                _, _, teachers = await call("GET", "/teachers")
+                self.assertEqual(teachers["items"], [])
+                status, _, _ = await call("GET", "/students/99")
+                self.assertEqual(status, 404)
+                for path in ("/students/99", "/teachers/99"):
+                    status, _, _ = await call("DELETE", path)
+                    self.assertEqual(status, 404)
+                status, _, deleted = await call("DELETE", "/students/3")
+                self.assertEqual((status, deleted), (200, {"deleted": 1}))
+                writer.close()
+        try:
+            asyncio.run(scenario())
+        finally:
+            api.close()
+
+    def test_api_requires_token_and_is_read_only_by_default(self):
+        sid = self.school.add_student(Student("A", 10, "5"))
+        api = SchoolApi(self.school, "secret", max_workers=2)
+
+        async def request(*args, **kw):
+            reader, writer = await asyncio.open_connection(*address)
+            try:
+                return await api_request(reader, writer, *args, **kw)
+            finally:
+                writer.close()
+
+        async def scenario():
+            nonlocal address
+            server = await api.start("127.0.0.1", 0)
+            address = server.sockets[0].getsockname()[:2]
+            async with server:
+                status, headers, _ = await request("GET", "/students")
+                self.assertEqual((status, headers["www-authenticate"]), (401, "Bearer"))
+                status, _, _ = await request("DELETE", f"/students/{sid}", token="wrong")
+                self.assertEqual(status, 401)
+                status, _, page = await request("GET", "/students", token="secret")
+                self.assertEqual((status, [s["id"] for s in page["items"]]), (200, [sid]))
+                status, _, _ = await request("DELETE", f"/students/{sid}", token="secret")
+                self.assertEqual(status, 403)
+                status, _, _ = await request("POST", "/fees", {"student_id": sid, "amount": 5}, token="secret")
+                self.assertEqual(status, 403)
+                status, _, result = await request("POST", "/batch", {"requests": [
+                    {"method": "GET", "path": f"/students/{sid}"},
+                    {"method": "PUT", "path": f"/students/{sid}", "body": {"name": "B", "age": 1, "grade": "1"}}]},
+                    token="secret")
+                self.assertEqual((status, [r["status"] for r in result]), (200, [200, 403]))
+
+        address = None
+        try:
+            asyncio.run(scenario())
+        finally:
+            api.close()
+        self.assertEqual(tuple(self.school.get_student(sid)), (sid, "A", 10, "5"))
+        self.assertEqual(self.school.view_fees_for_student(sid), [])
+        with self.assertRaises(ValueError):
+            SchoolApi(self.school, "")
+
+    def test_api_shutdown_with_idle_keep_alive_connection(self):
+        api = SchoolApi(self.school, "secret", max_workers=2)
+        errors = []
+
+        async def scenario():
+            asyncio.get_running_loop().set_exception_handler(lambda loop, context: errors.append(context))
+            server = await api.start("127.0.0.1", 0)
+            async with server:
+                reader, writer = await asyncio.open_connection(*server.sockets[0].getsockname()[:2])
+                status, _, _ = await api_request(reader, writer, "GET", "/students", token="secret")
+                self.assertEqual(status, 200)
+            # the handler is still waiting for the next request when the loop shuts down
+            return writer
+        try:
+            asyncio.run(scenario())
+        finally:
+            api.close()
+        self.assertEqual(errors, [])
+
+    def test_api_cancellation_only_ends_an_idle_connection_quietly(self):
+        class StuckApi(SchoolApi):
+            async def respond(self, method, target, headers, raw):
+                await asyncio.sleep(3600)
+
+        class FakeWriter:
+            closed = 0
+
+            def close(self):
+                self.closed += 1
+
+        api = StuckApi(self.school, "secret", max_workers=1)
+        writer = FakeWriter()
+
+        async def scenario():
+            busy, idle = asyncio.StreamReader(), asyncio.StreamReader()
+            busy.feed_data(b"GET /students HTTP/1.1\r\nAuthorization: Bearer secret\r\n\r\n")
+            tasks = [asyncio.ensure_future(api.handle(reader, writer)) for reader in (busy, idle)]
+            await asyncio.sleep(0.01)
+            for task in tasks:
+                task.cancel()
+            return await asyncio.gather(*tasks, return_exceptions=True)
+        try:
+            busy, idle = asyncio.run(scenario())
+        finally:
+            api.close()
+        self.assertIsInstance(busy, asyncio.CancelledError)
+        self.assertIsNone(idle)
+        self.assertEqual(writer.closed, 2)
+
+    def test_async_school_fan_out_and_backpressure(self):
+        sid = self.school.enroll_student(Student("A", 10, "5"), 500.0, first_day="2024-01-01")
+        self.school.add_performance(Performance(sid, "Math", 91))
+        aschool = AsyncSchool(self.school, max_workers=2, max_pending=1, timeout=5)
+
+        async def scenario():
+            overview = await aschool.student_overview(sid)
+            self.assertEqual((overview["attendance_percentage"], overview["report"]), (100.0, [("Math", 91.0, "A+")]))
+            fee = await aschool.in_transaction(lambda s: s.add_fee(FeeRecord(sid, 1.0)))
+            self.assertEqual(len(await aschool.view_fees_for_student(sid)), 2)
+            # the only slot is taken, so the next caller times out while queued
+            slow = asyncio.ensure_future(aschool.call(time.sleep, 0.3))
+            await asyncio.sleep(0.05)
+            with self.assertRaises(asyncio.TimeoutError):
+                await aschool.get_student(sid, timeout=0.05)
+            await slow
+            return fee
+        try:
+            self.assertIsNotNone(asyncio.run(scenario()))
+        finally:
+            aschool.close()
+        self.assertEqual(aschool.stats()["timeouts"], 1)
+        with self.assertRaises(AttributeError):
+            aschool.transaction
+
+    def test_student_profile_and_batch(self):
+        a = self.school.enroll_student(Student("A", 10, "5"), 100.0, "2020-01-01", first_day="2024-01-01")
+        b = self.school.add_student(Student("B", 11, "5"))
+        self.school.add_fee(FeeRecord(a, 50.0, paid=True))
+        self.school.add_attendance(AttendanceRecord(a, "2024-01-02", False))
+        for subject, marks in (("Math", 95), ("Urdu", 75)):
+            self.school.add_performance(Performance(a, subject, marks))
+        profile = self.school.student_profile(a, as_of="2024-01-01")
+        self.assertEqual(profile["student"], (a, "A", 10, "5"))
+        self.assertEqual((profile["attendance_days"], profile["attendance_percentage"]), (2, 50.0))
+        self.assertEqual((profile["fees_total"], profile["fees_unpaid"], profile["fees_overdue"]), (150.0, 100.0, 100.0))
+        self.assertEqual((profile["report"], profile["average_marks"], profile["overall_grade"]),
+                         ([("Math", 95.0, "A+"), ("Urdu", 75.0, "B")], 85.0, "A"))
+        profiles = self.school.student_profiles([a, b, 999], chunk_size=1)
+        self.assertEqual(sorted(profiles), [a, b])
+        self.assertEqual((profiles[b]["attendance"], profiles[b]["average_marks"]), ([], None))
+        self.assertIsNone(self.school.student_profile(999))
+
+    def test_generated_school_and_benchmark_comparison(self):
+        counts = generate_school(24, days=5, fees_per_student=2, terms=1, seed=3)
+        self.assertEqual(counts, {"students": 24, "attendance": 120, "fees": 48, "performance": 120})
+        self.assertEqual(len(self.school.view_students_in_grade("5")), 2)
+        self.assertEqual(self.school.attendance_stats()[0][3], 5)
+        base = {"results": [{"scale": 10, "op": "a", "median_ms": 10.0}, {"scale": 10, "op": "b", "median_ms": 0.1}]}
+        run = {"results": [{"scale": 10, "op": "a", "median_ms": 14.0}, {"scale": 10, "op": "b", "median_ms": 0.3}]}
+        self.assertEqual(compare_benchmarks(base, run), [(10, "a", 10.0, 14.0)])
+
+    def test_benchmarks_leave_the_configured_database_alone(self):
+        sid = self.school.add_student(Student("Kept", 10, "5"))
+        current = app.pool
+        report = benchmark_suite(scales=(12,), days=2, repeat=2)
+        ops = {r["op"]: r for r in report["results"]}
+        self.assertEqual(ops["delete_students"]["runs"], 2)
+        attendance = benchmark_attendance(n_students=3, days=2)
+        self.assertEqual((attendance["per_row"]["rows"], attendance["bulk"]["rows"]), (6, 6))
+        self.assertIs(app.pool, current)
+        self.assertEqual(self.school.get_student(sid)[1], "Kept")
+
+    def test_query_instrumentation(self):
+        sid = self.school.add_student(Student("Secret Name", 10, "5"))
+        query_stats.reset()
+        query_stats.enable(slow_ms=0)
+        try:
+            self.school.view_fees_for_student(sid)
+            self.school.view_students()
+            with self.school.transaction():
+                self.school.add_fee(FeeRecord(sid, 10.0))
+            self.school.search_students("Secret")
+            query_stats.rendered("show", 0.003)
+        finally:
+            query_stats.disable()
+        self.school.view_students()
+        stats = query_stats.snapshot()
+        ops = stats["operations"]
+        self.assertEqual(ops["view_students"]["calls"], 1)
+        self.assertEqual((ops["view_students"]["statements"], ops["view_students"]["rows"]), (1, 1))
+        self.assertEqual(sum(ops["view_fees_for_student"]["histogram"].values()), 1)
+        self.assertEqual(ops["add_fee"]["statements"], 1)
+        self.assertEqual(stats["render"]["show"]["calls"], 1)
+        logged = [entry for entry in stats["slow"] if entry["operation"] == "search_students"]
+        self.assertEqual(logged[0]["params"], ["str", "int"])
+        self.assertNotIn("Secret", str(stats["slow"]))
+        self.assertIn("view_students", query_stats.report())
+        query_stats.reset()
+
+    def test_query_instrumentation_times_transactional_writes(self):
+        school = School(cache=True)
+        sid = school.add_student(Student("A", 10, "5"))
+        query_stats.reset()
+        query_stats.enable()
+        try:
+            school.add_attendance(AttendanceRecord(sid, "2024-01-02", True))
+            school.add_attendance_bulk([AttendanceRecord(sid, "2024-01-03", False)])
+            school.update_student(sid, "A", 11, "6")
+            school.get_student(sid)
+            school.delete_students([sid])
+        finally:
+            query_stats.disable()
+        ops = query_stats.snapshot()["operations"]
+        for op in ("add_attendance", "add_attendance_bulk", "update_student", "delete_students"):
+            self.assertEqual(ops[op]["calls"], 1, op)
+            self.assertEqual(sum(ops[op]["histogram"].values()), 1, op)
+            self.assertGreater(ops[op]["statements"], 1, op)
+        # a cache revalidation is filed under the method that asked for it
+        self.assertEqual(ops["get_student"]["calls"], 1)
+        self.assertNotIn("_cached", ops)
+        query_stats.reset()
+
+    def test_columnar_bulk_paths(self):
+        a = self.school.add_student(Student("A", 10, "5"))
+        b = self.school.add_student(Student("B", 10, "6"))
+        marks = AttendanceBatch((sid, f"2024-01-0{d}", d != 2) for d in (1, 2, 3) for sid in (a, b))
+        self.assertEqual(self.school.add_attendance_bulk(marks), 6)
+        grade5 = self.school.load_attendance("2024-01-02", grade="5")
+        self.assertEqual(sorted(grade5), [(a, datetime.date(2024, 1, 2), 0), (a, datetime.date(2024, 1, 3), 1)])
+        self.assertEqual(len(self.school.load_attendance()), 6)
+        self.assertEqual(self.school.add_fees_bulk(FeeBatch([(a, 100, False, "2024-01-10"), (b, 100, True, "2024-01-10")])), 2)
+        self.assertEqual(self.school.fee_summary(as_of=datetime.date(2024, 2, 1))["overdue_total"], 100.0)
+
+    def test_attendance_rollups_follow_every_write(self):
+        def rollups():
+            c = get_connection()
+            cur = c.cursor()
+            cur.execute("SELECT * FROM attendance_monthly ORDER BY 1, 2")
+            monthly = cur.fetchall()
+            cur.execute("SELECT * FROM attendance_daily_grade ORDER BY 1, 2")
+            daily = cur.fetchall()
+            c.close()
+            return monthly, daily
+
+        a = self.school.add_student(Student("A", 10, "5"))
+        b = self.school.add_student(Student("B", 10, "5"))
+        c = self.school.add_student(Student("C", 11, "6"))
+        # a legacy student without a grade: their marks roll up under ''
+        d = self.school.add_student(Student("D", 12, "7"))
+        conn = get_connection()
+        conn.cursor().execute("UPDATE students SET grade=NULL WHERE id=?", (d,))
+        conn.commit()
+        conn.close()
+        self.school.add_attendance(AttendanceRecord(d, "2024-03-01", False))
+        self.school.add_attendance(AttendanceRecord(a, "2024-01-31", True))
+        self.school.add_attendance_bulk(AttendanceRecord(sid, day, sid != b) for sid in (a, b, c)
+                                        for day in ("2024-02-01", "2024-02-02"))
+        self.school.add_attendance_bulk([AttendanceRecord(a, "2024-02-01", False), AttendanceRecord(b, "2024-02-02", True)])
+        self.assertAlmostEqual(self.school.attendance_percentage(a), 200 / 3)
+        self.assertEqual(self.school.grade_attendance(start_date="2024-02-01"),
+                         [("", 0, 1, 0.0), ("5", 2, 4, 50.0), ("6", 2, 2, 100.0)])
+        self.assertEqual(self.school.grade_attendance("5", daily=True)[0], ("5", datetime.date(2024, 1, 31), 1, 1, 100.0))
+        self.school.update_student(b, "B", 11, "6")
+        self.school.update_student(d, "D", 12, "5")
+        self.school.delete_students([c])
+        incremental = rollups()
+        self.school.rebuild_attendance_rollups()
+        self.assertEqual(rollups(), incremental)
+        self.assertEqual([r[:3] for r in self.school.grade_attendance()], [("5", 2, 4), ("6", 1, 2)])
+        self.assertEqual([r[3:5] for r in self.school.attendance_stats()], [(3, 2), (2, 1), (1, 0)])
+        # unpadded dates are read like everywhere else
+        self.assertEqual([r[3:5] for r in self.school.attendance_stats(start_date="2024-2-1", end_date="2024-2-1")],
+                         [(1, 0), (1, 0), (0, 0)])
+
+    def test_archive_closed_year(self):
+        a = self.school.add_student(Student("A", 10, "5"))
+        b = self.school.add_student(Student("B", 10, "6"))
+        # academic year 2020 (Aug 2020 - Jul 2021) and 2021
+        self.school.add_attendance_bulk(AttendanceRecord(sid, day, day != "2021-03-01")
+                                        for sid in (a, b) for day in ("2021-03-01", "2021-03-02", "2021-09-01"))
+        paid = self.school.add_fee(FeeRecord(a, 100, True, "2021-01-10"))
+        unpaid = self.school.add_fee(FeeRecord(a, 200, False, "2021-01-10"))
+        self.school.add_performance(Performance(a, "Math", 80, academic_year=2020))
+        self.school.add_performance(Performance(a, "Math", 90, academic_year=2021))
+        def rollups():
+            conn = get_connection()
+            c = conn.cursor()
+            c.execute("SELECT * FROM attendance_monthly ORDER BY 1, 2")
+            rows = c.fetchall()
+            conn.close()
+            return rows
+
+        before = rollups()
+
+        first = self.school.archive_year(2020, batch_size=2, pause=0, max_batches=1)
+        self.assertFalse(first["done"])
+        self.assertIsNone(self.school.hot_start())
+        report = self.school.archive_year(2020, batch_size=2, pause=0)
+        self.assertTrue(report["done"])
+        self.assertEqual(first["rows"] + report["rows"], 4 + 1 + 1)
+        self.assertEqual(self.school.archive_year(2020)["rows"], 0)
+        self.assertEqual(self.school.hot_start(), datetime.date(2021, 8, 1))
+
+        history = self.school.with_archive()
+        self.assertEqual([r[2] for r in self.school.view_attendance_for_student(a)], [datetime.date(2021, 9, 1)])
+        self.assertEqual(len(history.view_attendance_for_student(a)), 3)
+        self.assertEqual([r[0] for r in self.school.view_fees_for_student(a)], [unpaid])
+        self.assertEqual(sorted(r[0] for r in history.view_fees_for_student(a)), [paid, unpaid])
+        self.assertEqual([r[3] for r in self.school.view_performance_for_student(a)], [90.0])
+        self.assertEqual(self.school.attendance_percentage(a), 100.0)
+        self.assertAlmostEqual(history.attendance_percentage(a), 200 / 3)
+        self.assertEqual([r[:3] for r in self.school.grade_attendance()], [("5", 1, 1), ("6", 1, 1)])
+        self.assertEqual(len(history.student_profile(a)["attendance"]), 3)
+        self.assertEqual(rollups(), before)
+        with self.assertRaises(ValueError):
+            self.school.add_attendance(AttendanceRecord(a, "2021-03-03", True))
+        with self.assertRaises(ValueError):
+            self.school.add_fee(FeeRecord(a, 50, False, "2021-06-01"))
+        with self.assertRaises(ValueError):
+            self.school.add_fees_bulk([FeeRecord(a, 50, False, "2021-09-01"), FeeRecord(a, 50, False, "2021-06-01")])
+        with self.assertRaises(ValueError):
+            self.school.add_performance(Performance(a, "Math", 70, academic_year=2020))
+        self.assertEqual(len(history.view_fees_for_student(a)), 2)
+        self.assertEqual(len(history.view_performance_for_student(a)), 2)
+        with self.assertRaises(ValueError):
+            self.school.archive_year(academic_year())
+
+        self.school.update_student(b, "B", 10, "5")
+        self.school.delete_students([a])
+        incremental = rollups()
+        self.school.rebuild_attendance_rollups()
+        self.assertEqual(rollups(), incremental)
+        self.assertEqual(history.view_attendance_for_student(a), [])
+        self.assertEqual(history.view_fees_for_student(a), [])
+        self.assertEqual([r[:3] for r in history.grade_attendance()], [("5", 2, 3)])
+
+    def test_archive_copies_before_deleting(self):
+        sid = self.school.add_student(Student("A", 10, "5"))
+        paid = self.school.add_fee(FeeRecord(sid, 100, True, "2021-01-10"))
+        unpaid = self.school.add_fee(FeeRecord(sid, 200, False, "2021-02-10"))
+        self.school.add_attendance(AttendanceRecord(sid, "2021-03-01", True))
+        # as a run interrupted between its copy and its delete leaves things: the paid
+        # fee already copied, and a copy of a fee that was marked unpaid again since
+        conn = get_connection()
+        c = conn.cursor()
+        for fee_id in (paid, unpaid):
+            c.execute("INSERT INTO archive.fees(id, student_id, amount, paid, due_date) "
+                      "SELECT id, student_id, amount, 1, due_date FROM fees WHERE id=?", (fee_id,))
+        conn.close()
+        report = self.school.archive_year(2020, pause=0)
+        self.assertTrue(report["done"])
+        self.assertEqual((report["fees"], report["attendance"]), (1, 1))
+        conn = get_connection()
+        c = conn.cursor()
+        c.execute("SELECT id FROM archive.fees ORDER BY id")
+        self.assertEqual(c.fetchall(), [(paid,)])
+        c.execute("SELECT id FROM fees")
+        self.assertEqual(c.fetchall(), [(unpaid,)])
+        conn.close()
+
+    def test_journal_syncs_once_with_conflicts_and_retries(self):
+        sid = self.school.add_student(Student("A", 10, "5"))
+        journal = WriteJournal(os.path.join(self.tmpdir.name, "journal.db"))
+        writes = JournaledSchool(self.school, journal)
+        syncer = JournalSyncer(journal, self.school, batch_size=2)
+        self.assertEqual(writes.add_attendance_bulk([AttendanceRecord(sid, "2024-03-01", True),
+                                                     AttendanceRecord(sid, "2024-03-01", False)]), 1)
+        writes.add_fee(FeeRecord(sid, 100, False, "2024-03-10"))
+        writes.add_fee(FeeRecord(sid + 1, 100))       # no such student
+        writes.add_performance(Performance(sid, "Math", 75))
+        self.assertEqual(journal.counts(), {"pending": 4, "conflicts": 0})
+
+        # server unreachable: nothing is lost, the batch is retried later
+        configure_pool(lambda: sqlite3.connect(os.path.join(self.tmpdir.name, "missing", "x.db")))
+        report = syncer.sync()
+        self.assertIsNotNone(report["error"])
+        self.assertEqual(report["pending"], 4)
+        configure_pool()
+
+        # a batch committed whose journal update was lost is not applied twice
+        syncer._apply(journal.pending(2))
+        report = syncer.sync()
+        self.assertIsNone(report["error"])
+        self.assertEqual((report["applied"], report["duplicates"], report["conflicts"]), (1, 2, 1))
+        self.assertEqual(journal.counts(), {"pending": 0, "conflicts": 1})
+        self.assertEqual(journal.conflicts()[0][1], "fee")
+        self.assertEqual([r[3] for r in self.school.view_attendance_for_student(sid)], [0])
+        self.assertEqual(len(self.school.view_fees_for_student(sid)), 1)
+        self.assertEqual(self.school.view_performance_for_student(sid)[0][3], 75.0)
+        self.assertEqual(self.school.attendance_percentage(sid), 0.0)
+
+        # a value the driver cannot store is that entry's conflict; later entries still sync
+        writes.add_performance(Performance(sid, ["not", "a", "subject"], 50))
+        writes.add_performance(Performance(sid, "English", 60))
+        report = syncer.sync()
+        self.assertIsNone(report["error"])
+        self.assertEqual((report["applied"], report["conflicts"], report["pending"]), (1, 1, 0))
+        self.assertIn("ProgrammingError", journal.conflicts()[-1][4])
+        self.assertEqual([r[2] for r in self.school.view_performance_for_student(sid)], ["Math", "English"])
+        journal.close()
+
+    def test_startup_report_and_cached_schema_check(self):
+        timer = StartupTimer(time.perf_counter() - 0.1)
+        timer.mark("imported")
+        timer.mark("first paint")
+        path = os.path.join(self.tmpdir.name, "startup.jsonl")
+        with contextlib.redirect_stderr(io.StringIO()) as err:
+            report = timer.log(path)
+            self.assertIsNone(timer.log(path))
+        self.assertIn("first paint +", err.getvalue())
+        self.assertEqual(list(report["steps"]), ["imported", "first paint"])
+        self.assertGreaterEqual(report["first_paint_ms"], 100)
+        self.assertEqual(report["within_budget"], report["first_paint_ms"] <= StartupTimer.FIRST_PAINT_BUDGET_MS)
+        with open(path) as f:
+            self.assertEqual(json.loads(f.read())["steps"], report["steps"])
+
+        # once checked, setup_database does not touch the database again
+        self.assertEqual(app.backend.checked_version, app.backend.migrations()[-1][0])
+        configure_pool(lambda: sqlite3.connect(os.path.join(self.tmpdir.name, "missing", "x.db")))
+        self.assertEqual(setup_database(), app.backend.checked_version)
+
+        # an unreachable server at startup is tolerated with a journal, other errors are not
+        app.backend.checked_version = None
+        with self.assertRaises(Exception) as caught:
+            setup_database()
+        self.assertTrue(JournalSyncer.is_offline(caught.exception))
+        self.assertTrue(JournalSyncer.is_offline(PoolTimeout("no connection")))
+        for error in (sqlite3.IntegrityError("x"), sqlite3.ProgrammingError("x"), KeyError("x")):
+            self.assertFalse(JournalSyncer.is_offline(error))
+        configure_pool()
+        self.assertEqual(setup_database(), app.backend.migrations()[-1][0])
+
+    def test_delete_cascades_and_sweeper_removes_orphans(self):
+        a = self.school.add_student(Student("A", 10, "5"))
+        b = self.school.add_student(Student("B", 10, "5"))
+        for sid in (a, b):
+            self.school.add_attendance(AttendanceRecord(sid, "2024-01-01", True))
+            self.school.add_fee(FeeRecord(sid, 10.0))
+            self.school.add_performance(Performance(sid, "Math", 80))
+        self.assertEqual(self.school.delete_students([a, a, 999]), 1)
+        self.assertEqual(self.school.delete_students([a]), 0)
+        self.assertEqual(self.school.view_fees_for_student(a), [])
+        self.assertEqual(len(self.school.view_fees_for_student(b)), 1)
+
+        # rows orphaned before foreign keys existed (raw connection: enforcement off)
+        raw = sqlite3.connect(app.backend.path)
+        raw.executemany("INSERT INTO attendance(student_id, date, present) VALUES(?,?,1)",
+                        [(999, f"2024-02-{d:02d}") for d in range(1, 26)])
+        raw.execute("INSERT INTO fees(student_id, amount, paid, due_date) VALUES(999, 5, 0, '2024-01-01')")
+        raw.executemany("INSERT INTO attendance_monthly(student_id, month, present, total) VALUES(999, ?, 1, 1)",
+                        [(202401,), (202402,)])
+        raw.commit()
+        raw.close()
+        raw = sqlite3.connect(app.backend.archive_path)
+        raw.execute("INSERT INTO performance(student_id, subject, marks, academic_year) VALUES(999, 'Math', 50, 2020)")
+        raw.commit()
+        raw.close()
+        report = self.school.sweep_orphans(batch_size=10, pause=0)
+        self.assertEqual((report["attendance"], report["fees"], report["performance"]), (25, 1, 0))
+        self.assertEqual((report["archive.performance"], report["attendance_monthly"], report["rows"]), (1, 2, 29))
+        self.assertEqual(self.school.sweep_orphans(pause=0)["rows"], 0)
+        self.assertEqual(len(self.school.view_attendance_for_student(b)), 1)
+
+    def test_import_csv_reports_bad_rows_and_keeps_going(self):
+        path = os.path.join(self.tmpdir.name, "students.csv")
+        with open(path, "w", newline="") as f:
+            f.write("name,age,grade\n")
+            for i in range(25):
+                f.write(f"S{i},{'x' if i in (3, 17) else 10 + i % 5},{i % 3}\n")
+        seen = []
+        result = self.school.import_csv("students", path, batch_size=10,
+                                        progress=lambda fraction, r: seen.append(fraction))
+        self.assertEqual((result.rows_read, result.inserted, result.failed), (25, 23, 2))
+        self.assertEqual([line for line, _ in result.errors], [5, 19])
+        self.assertEqual(len(self.school.view_students()), 23)
+        self.assertEqual(seen[-1], 1.0)
+
+        bad = os.path.join(self.tmpdir.name, "fees.csv")
+        with open(bad, "w", newline="") as f:
+            f.write("student_id,amount\n1,10\n")
+        with self.assertRaises(ValueError):
+            self.school.import_csv("fees", bad)
+
+    def test_export_performance_sharded_and_compressed(self):
+        a = self.school.add_student(Student("A", 10, "5"))
+        b = self.school.add_student(Student("B", 11, "6"))
+        for sid, subject, marks in [(a, "Math", 95), (a, "Urdu", 49), (b, "Math", 72)]:
+            self.school.add_performance(Performance(sid, subject, marks))
+        base = os.path.join(self.tmpdir.name, "report.csv")
+        rows, files = self.school.export_performance_csv(base, shard_by_grade=True, compress=True, batch_size=2)
+        self.assertEqual(rows, 3)
+        self.assertEqual([os.path.basename(f) for f in files], ["report_grade-5.csv.gz", "report_grade-6.csv.gz"])
+        with gzip.open(files[0], "rt", newline="") as f:
+            lines = list(csv.reader(f))
+        self.assertEqual(lines[1:], [[str(a), "A", "5", "Math", "95.0", "A+"], [str(a), "A", "5", "Urdu", "49.0", "F"]])
+
+        # grades that would sanitize alike, or differ only in case, or are missing, get their own files
+        for grade in ("5/A", "5_A", "6a", "6A", "7"):
+            self.school.add_performance(Performance(self.school.add_student(Student(grade, 10, grade)), "Math", 50))
+        conn = get_connection()
+        conn.cursor().execute("UPDATE students SET grade=NULL WHERE grade='7'")
+        conn.commit()
+        conn.close()
+        rows, files = self.school.export_performance_csv(base, shard_by_grade=True)
+        names = [os.path.basename(f) for f in files]
+        self.assertEqual((rows, len({name.lower() for name in names})), (8, 7))
+        self.assertEqual(names[:5], ["report_ungraded.csv", "report_grade-5.csv", "report_grade-5_2FA.csv",
+                                     "report_grade-5_5FA.csv", "report_grade-6.csv"])
+        self.assertTrue(names[6].startswith("report_grade-6a-"))
+
+    def test_fee_ledger_queries(self):
+        a = self.school.add_student(Student("A", 10, "5"))
+        b = self.school.add_student(Student("B", 11, "6"))
+        as_of = datetime.date(2024, 6, 1)
+        for sid, amount, paid, due in [(a, 100, False, "2024-05-01"), (a, 50, False, "2024-07-01"),
+                                       (b, 70, False, "2024-04-01"), (b, 30, True, "2024-04-01")]:
+            self.school.add_fee(FeeRecord(sid, amount, paid, due))
+        overdue = self.school.overdue_fees(as_of)
+        self.assertEqual([(r[1], r[4]) for r in overdue], [(b, 70.0), (a, 100.0)])
+        self.assertEqual([r[1] for r in self.school.overdue_fees(as_of, grade="5")], [a])
+        self.assertEqual([tuple(r[:3]) for r in self.school.outstanding_balance_by_student()],
+                         [(a, 150.0, 2), (b, 70.0, 1)])
+        self.assertEqual(self.school.set_fee_paid_many([r[0] for r in overdue] + [12345]), 2)
+        self.assertEqual(self.school.set_fee_paid_many([12345]), 0)
+        summary = self.school.fee_summary(as_of)
+        self.assertEqual((summary["overdue"], summary["unpaid_total"]), (0, 50.0))
+
+    def test_cache_sees_writes_from_another_client(self):
+        cached = School(cache=True, cache_ttl=0)
+        sid = cached.add_student(Student("A", 10, "5"))
+        self.assertEqual(len(cached.view_students()), 1)
+        self.school.update_student(sid, "A2", 11, "5")
+        self.assertEqual(cached.get_student(sid)[1], "A2")
+        stats = cached.cache_stats()["students"]
+        self.assertEqual(stats["misses"], 2)
+
+
+class ConnectionPoolTests(unittest.TestCase):
+    def make_pool(self, **options):
+        return ConnectionPool(lambda: sqlite3.connect(":memory:", check_same_thread=False), **options)
+
+    def test_connections_are_reused(self):
+        p = self.make_pool(max_size=2)
+        c1 = p.acquire()
+        raw = c1._conn
+        c1.close()
+        c2 = p.acquire()
+        self.assertIs(c2._conn, raw)
+        c2.close()
+        self.assertEqual(p.stats()["created"], 1)
+        p.close()
+
+    def test_checkout_waits_and_times_out_when_exhausted(self):
+        p = self.make_pool(max_size=1)
+        c1 = p.acquire()
+        with self.assertRaises(PoolTimeout):
+            p.acquire(timeout=0.05)
+        threading.Timer(0.05, c1.close).start()
+        c2 = p.acquire(timeout=2)
+        c2.close()
+        stats = p.stats()
+        self.assertEqual(stats["waits"], 1)
+        self.assertEqual(stats["timeouts"], 1)
+        self.assertGreater(stats["max_wait"], 0)
+        p.close()
+
+    def test_release_rolls_back_open_transaction(self):
+        with tempfile.TemporaryDirectory() as d:
+            path = os.path.join(d, "t.db")
+            p = ConnectionPool(lambda: sqlite3.connect(path, isolation_level=None), max_size=1)
+            c = p.acquire()
+            c.cursor().execute("CREATE TABLE t(x INT)")
+            c.begin()
+            c.cursor().execute("INSERT INTO t VALUES(1)")
+            c.close()
+            c = p.acquire()
+            self.assertEqual(c.cursor().execute("SELECT COUNT(*) FROM t").fetchone()[0], 0)
+            c.close()
+            p.close()
+
+    def test_broken_connection_is_replaced_on_checkout(self):
+        p = self.make_pool(max_size=1, health_check_after=0)
+        c1 = p.acquire()
+        c1._conn.close()
+        c1.close()
+        c2 = p.acquire()
+        c2.cursor().execute("SELECT 1")
+        c2.close()
+        self.assertEqual(p.stats()["discarded"], 1)
+        p.close()
+
+
+class DbExecutorTests(unittest.TestCase):
+    class FakeRoot:
+        # stands in for tk.Tk: after() callbacks are run by pump()
+        def __init__(self):
+            self.pending = []
+
+        def after(self, ms, fn):
+            self.pending.append(fn)
+
+        def pump(self, executor, timeout=2.0):
+            deadline = time.monotonic() + timeout
+            while (executor.in_flight or self.pending) and time.monotonic() < deadline:
+                pending, self.pending = self.pending, []
+                for fn in pending:
+                    fn()
+                time.sleep(0.005)
+
+    def test_monitor_stalls_records_late_heartbeats(self):
+        root = self.FakeRoot()
+        stalls = []
+        db = DbExecutor(root, stall_hook=lambda label, secs: stalls.append((label, secs)))
+        db.monitor_stalls(interval_ms=10)
+        time.sleep(0.05)
+        beat, = root.pending
+        root.pending = []
+        beat()
+        db.shutdown()
+        self.assertEqual([label for label, _ in stalls], ["event-loop"])
+        self.assertGreater(stalls[0][1], 0.005)
+        self.assertEqual(len(root.pending), 1)   # the heartbeat re-arms itself
+
+    def test_superseded_and_coalesced_requests(self):
+        root = self.FakeRoot()
+        stalls = []
+        db = DbExecutor(root, max_workers=1, stall_hook=lambda label, secs: stalls.append(label))
+        gate = threading.Event()
+        results = []
+        db.submit(gate.wait, 1.0)
+        db.submit(str, 1, on_done=results.append, key="refresh")
+        db.submit(str, 2, on_done=results.append, key="refresh")
+        db.submit(str, 2, on_done=results.append, key="refresh")
+        gate.set()
+        root.pump(db)
+        db.shutdown()
+        self.assertEqual(results, ["2"])
+        self.assertEqual(db.stats["superseded"], 1)
+        self.assertEqual(db.stats["coalesced"], 1)
+        self.assertEqual(db.in_flight, 0)
+        self.assertIn("str", stalls)
+
+
+class PagedTreeviewTests(unittest.TestCase):
+    class FakeTree:
+        # stands in for ttk.Treeview: keeps rows in order and counts inserts
+        def __init__(self):
+            self.rows = {}
+            self.order = []
+            self.inserts = 0
+            self.idle = []
+
+        def configure(self, **options):
+            pass
+
+        def after_idle(self, fn):
+            self.idle.append(fn)
+
+        def get_children(self):
+            return tuple(self.order)
+
+        def insert(self, parent, index, values):
+            self.inserts += 1
+            item = f"I{self.inserts}"
+            self.rows[item] = values
+            self.order.insert(len(self.order) if index == tk.END else index, item)
+            return item
+
+        def item(self, item, values):
+            self.rows[item] = values
+
+        def delete(self, *items):
+            for item in items:
+                del self.rows[item]
+                self.order.remove(item)
+
+        def values(self):
+            return [self.rows[item] for item in self.order]
+
+    def setUp(self):
+        self.data = {i: (i, f"S{i}") for i in range(1, 8)}
+        self.after_ids = []
+        self.tree = self.FakeTree()
+        self.paged = PagedTreeview(self.tree, self.fetch_page, self.data.get, page_size=3,
+                                   on_error=self.fail)
+
+    def fetch_page(self, limit, after_id):
+        self.after_ids.append(after_id)
+        return [self.data[k] for k in sorted(self.data) if k > after_id][:limit]
+
+    def test_pages_stop_at_the_last_short_page(self):
+        self.paged.reload()
+        self.assertEqual([v[0] for v in self.tree.values()], [1, 2, 3])
+        self.paged._on_scroll("0.5", "0.95")
+        self.assertEqual(len(self.tree.idle), 1)
+        # a second scroll event while the page is pending does not queue another
+        self.paged._on_scroll("0.5", "0.97")
+        self.tree.idle.pop()()
+        self.paged.load_next_page()
+        self.assertEqual([v[0] for v in self.tree.values()], list(range(1, 8)))
+        self.assertEqual(self.after_ids, [0, 3, 6])
+        self.assertTrue(self.paged._exhausted)
+        self.paged.load_next_page()
+        self.paged._on_scroll("0.9", "1.0")
+        self.assertEqual((self.after_ids, self.tree.idle), ([0, 3, 6], []))
+        # a new row past the end is picked up by load_new
+        self.data[8] = (8, "S8")
+        self.paged.load_new()
+        self.assertEqual((self.after_ids[-1], self.paged.last_id), (7, 8))
+
+    def test_unchanged_rows_are_not_reinserted(self):
+        self.paged.reload()
+        self.paged.load_next_page()
+        self.assertEqual(self.tree.inserts, 6)
+        # overlapping page and refreshes of loaded rows update in place
+        self.paged._apply_page([self.data[5], self.data[6], self.data[7]], reset=False)
+        self.assertEqual(self.tree.inserts, 7)
+        self.data[2] = (2, "Renamed")
+        self.paged.refresh_row(2)
+        self.paged.upsert(self.data[3])
+        self.assertEqual(self.tree.inserts, 7)
+        self.assertEqual(self.tree.values()[1], (2, "Renamed"))
+        # a deleted row goes, and a row before the loaded end is slotted in by id
+        del self.data[4]
+        self.paged.refresh_row(4)
+        self.paged.upsert((0, "S0"))
+        self.assertEqual([v[0] for v in self.tree.values()], [0, 1, 2, 3, 5, 6, 7])
+        self.assertEqual(self.tree.inserts, 8)
+
+
+if __name__ == "__main__":
+    unittest.main()